@@ -5,39 +5,17 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from utils.logger import UILogger, LogLevel, CriticalError
-from utils.channel_monitor import check_for_new_videos
-from utils.downloader import download_audio
-from utils.transcriber import transcribe_audio
-from utils.summarizer import summarize_transcript
-
-# Initialize Logger
-if "logger" not in st.session_state:
-    st.session_state.logger = UILogger()
-
-logger = st.session_state.logger
+from utils.pipeline import run_batch, is_finished_state
+from utils.jobs import JobManager
+from utils.journal import find_unfinished_runs
+from utils.search_index import SearchIndex
+from utils.segments import format_timestamp
+from utils.config import load_config, save_config, parse_api_keys
 
 st.set_page_config(page_title="YouTube Video Analysis", layout="wide")
 
 st.title("YouTube Video Analysis App")
 
-import json
-
-CONFIG_FILE = "config.json"
-
-def load_config():
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                return json.load(f)
-        except:
-            pass
-    return {}
-
-def save_config(config):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f)
-
 config = load_config()
 
 # Layout: Inputs
@@ -63,6 +41,10 @@ with col1:
     start_datetime = datetime.datetime.combine(start_date, start_time)
     end_datetime = datetime.datetime.combine(end_date, end_time)
 
+    # Incremental mode: ignore the window and pick up whatever was uploaded since the last run.
+    # The window is only used for channels that have never been polled before.
+    since_last_run = st.checkbox("Only new videos since last run", value=config.get("since_last_run", False))
+
     # 3. Output Directory
     st.markdown("### Output")
     default_out_dir = config.get("output_dir", os.path.join(os.getcwd(), "output"))
@@ -79,6 +61,15 @@ with col1:
             
     model_name = st.selectbox("Whisper Model", model_options, index=default_model_index)
 
+    # auto: mlx-whisper on Apple Silicon, CTranslate2 (faster-whisper, int8 on CPU) elsewhere
+    backend_options = ["auto", "mlx", "ctranslate2"]
+    saved_backend = config.get("transcription_backend", "auto")
+    transcription_backend = st.selectbox(
+        "Transcription Backend",
+        backend_options,
+        index=backend_options.index(saved_backend) if saved_backend in backend_options else 0
+    )
+
     # Gemini Model
     gemini_models = [
         "models/gemini-3.1-flash-lite-preview",
@@ -107,35 +98,43 @@ with col1:
     gemini_abstract_model = st.selectbox("Abstract Generation Model", gemini_models, index=idx_abstract)
     gemini_summary_model = st.selectbox("Summary Generation Model", gemini_models, index=idx_summary)
 
-# ... (previous code)
+    # Long transcripts are split into chunks summarized by the abstract model, then merged by the summary model
+    summarize_modes = ["auto", "single", "map_reduce"]
+    saved_summarize_mode = config.get("summarize_mode", "auto")
+    summarize_mode = st.selectbox(
+        "Summarization Mode",
+        summarize_modes,
+        index=summarize_modes.index(saved_summarize_mode) if saved_summarize_mode in summarize_modes else 0,
+        help="auto: chunked map-reduce only for transcripts longer than 80k characters"
+    )
+
+    # 5. Pipeline concurrency
+    with st.expander("Performance"):
+        p1, p2 = st.columns(2)
+        with p1:
+            download_workers = st.number_input("Download Workers", min_value=1, max_value=16, value=int(config.get("download_workers", 2)))
+            transcribe_workers = st.number_input("Transcribe Workers", min_value=1, max_value=8, value=int(config.get("transcribe_workers", 1)))
+            chunk_workers = st.number_input("Chunk Workers (audio > 20 min)", min_value=1, max_value=16, value=int(config.get("chunk_workers", 2)))
+        with p2:
+            summarize_workers = st.number_input("Summarize Workers", min_value=1, max_value=16, value=int(config.get("summarize_workers", 2)))
+            queue_size = st.number_input("Queue Size (per stage)", min_value=1, max_value=64, value=int(config.get("queue_size", 4)))
+        audio_formats = ["speech", "best"]
+        saved_audio_format = config.get("audio_format", "speech")
+        audio_format = st.selectbox(
+            "Audio Download Format",
+            audio_formats,
+            index=audio_formats.index(saved_audio_format) if saved_audio_format in audio_formats else 0,
+            help="speech: smallest audio stream that is good enough for Whisper (≤96 kbps)"
+        )
+        transcode_audio = st.checkbox("Re-encode downloads to m4a", value=config.get("transcode_audio", False),
+                                      help="Off: keep the downloaded container (m4a/webm); Whisper reads it directly")
+        live_retry_minutes = st.number_input("Live Event Retry Window (minutes)", min_value=0, max_value=240, value=int(config.get("live_retry_minutes", 10)),
+                                             help="Upcoming live events are retried in the background with growing delays for this long; 0 skips them right away")
+        transcript_cache_mb = st.number_input("Transcript Cache Size (MB)", min_value=0, max_value=100000, value=int(config.get("transcript_cache_mb", 2048)))
+        response_cache_mb = st.number_input("Gemini Response Cache Size (MB)", min_value=0, max_value=100000, value=int(config.get("response_cache_mb", 256)))
+        gemini_rate_limits = st.text_input("Gemini Rate Limits (per key)", value=config.get("gemini_rate_limits", ""),
+                                           help="Empty: free-tier limits. Paid keys, e.g. 'flash=1000/4000000, pro=150' (requests/tokens per minute), or 'off'")
 
-with col2:
-    st.subheader("Console Log")
-    
-    # Log Container with Fixed Height for Stability
-    console_container = st.container(height=400)
-    
-    # Place log output inside the fixed container
-    log_output = console_container.empty()
-    
-    # Always set the logger container so updates work on every rerun
-    # We need a wrapper to ensure .code() is called on the empty placeholder within the container
-    class ContainerWrapper:
-        def __init__(self, placeholder):
-            self.placeholder = placeholder
-        def code(self, text, language="text"):
-            self.placeholder.code(text, language=language)
-        def empty(self):
-            self.placeholder.empty()
-
-    logger.set_container(ContainerWrapper(log_output))
-    
-    # Render logs on load/rerun
-    log_output.code(logger.get_logs(), language="text")
-    
-    if st.button("Clear Logs", disabled=st.session_state.get("is_processing", False)):
-        logger.clear()
-        st.rerun()
 
 # Processing Logic
 with st.sidebar:
@@ -144,12 +143,8 @@ with st.sidebar:
     default_api_keys = os.getenv("GEMINI_API_KEY", "")
     api_key_input = st.text_input("Gemini API Keys (one per line or comma-separated)", value=default_api_keys, type="password")
     
-    # Parse keys
-    api_keys = []
-    if api_key_input:
-        # Split by newline or comma
-        raw_keys = api_key_input.replace(",", "\n").split("\n")
-        api_keys = [k.strip() for k in raw_keys if k.strip()]
+    # Parse keys (split by newline or comma)
+    api_keys = parse_api_keys(api_key_input)
     
     if api_keys:
         st.caption(f"Loaded {len(api_keys)} API Key(s)")
@@ -160,162 +155,167 @@ with st.sidebar:
     else:
         st.warning("No API Keys provided.")
 
-# Initialize processing state
-if "is_processing" not in st.session_state:
-    st.session_state.is_processing = False
 
-# Start Button with State Management
-# Note: Streamlit buttons return True *only* on the click event.
-# To disable it *while* the logic runs within that same click event, we rely on the fact that
-# the UI won't update *until* the script finishes anyway, effectively blocking interaction.
-# However, to explicitly show a "Disabled" state, we need to rerun.
-# Since we can't rerun *inside* the button processing without interrupting it, we use a flag.
+# Runs are executed by a process-wide JobManager on background threads, so they
+# keep going when the page is refreshed and several batches can run at once.
+@st.cache_resource
+def get_job_manager():
+    return JobManager(run_batch)
 
-start_button = st.button("Start Processing", type="primary", disabled=st.session_state.is_processing)
+job_manager = get_job_manager()
+
+start_button = st.button("Start Processing", type="primary")
 
 if start_button:
-    st.session_state.is_processing = True
-    # We force a rerun to update the UI state (disable button) immediately? 
-    # No, that would reset the button click. 
-    # Streamlit executes the block below. The UI is locked (running) for the user anyway.
-    # The 'disabled' prop above is useful if we trigger processing via another thread or async, 
-    # but here it's synchronous. The main benefit is preventing double-clicks if we yielded.
-    # For now, relying on 'running' state is standard for sync scripts. 
-    # But user asked for GRAY button.
-    # To truly gray it out, we'd need to set state -> rerun -> run logic -> set state -> rerun.
-    # Standard pattern:
-    
-    # 1. Set processing flag
-    # 2. Rerun
-    # 3. On next run, if flag is true -> disable button & run logic -> set flag false -> rerun
-    
-    # Let's try the direct execution first, usually sufficient. 
-    # Use st.spinner for visual feedback.
-    
     # Save Config
     new_config = {
         "channels": channels_input,
+        "since_last_run": since_last_run,
         "output_dir": output_dir,
         "model_name": model_name,
+        "transcription_backend": transcription_backend,
+        "audio_format": audio_format,
+        "transcode_audio": transcode_audio,
+        "live_retry_minutes": live_retry_minutes,
         "gemini_abstract_model": gemini_abstract_model,
-        "gemini_summary_model": gemini_summary_model
+        "gemini_summary_model": gemini_summary_model,
+        "gemini_rate_limits": gemini_rate_limits,
+        "summarize_mode": summarize_mode,
+        "download_workers": download_workers,
+        "transcribe_workers": transcribe_workers,
+        "chunk_workers": chunk_workers,
+        "summarize_workers": summarize_workers,
+        "queue_size": queue_size,
+        "transcript_cache_mb": transcript_cache_mb,
+        "response_cache_mb": response_cache_mb
     }
     save_config(new_config)
-    
+
     if not api_keys:
-        logger.critical("Please provide at least one Gemini API Key.")
-        # No need to stop() here as critical will raise exception now
-        
-    try:
-        with st.spinner('Processing...'):
-            logger.info("Starting processing...")
-            logger.info(f"Time Period: {start_datetime} - {end_datetime}")
-            logger.info(f"Model: {model_name}")
-            
-            # Create Trigger Time Folder
-            trigger_time_str = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            start_str = start_datetime.strftime("%Y-%m-%d_%H-%M-%S")
-            end_str = end_datetime.strftime("%Y-%m-%d_%H-%M-%S")
-            
-            folder_name = f"Trigger_{trigger_time_str}_From_{start_str}_{end_str}"
-            current_output_dir = os.path.join(output_dir, folder_name)
-            if not os.path.exists(current_output_dir):
-                os.makedirs(current_output_dir)
-                
-            logger.info(f"Output Directory: {current_output_dir}")
-            
-            if not channels_input.strip():
-                logger.warning("No channels provided.")
+        st.error("Please provide at least one Gemini API Key.")
+    else:
+        channel_list = [url.strip() for url in channels_input.split('\n') if url.strip()]
+        settings = dict(new_config, channels=channel_list, start=start_datetime.isoformat(), end=end_datetime.isoformat())
+        if since_last_run:
+            label = f"{len(channel_list)} channels, new since last run"
+        else:
+            label = f"{len(channel_list)} channels, {start_datetime:%Y-%m-%d %H:%M} - {end_datetime:%Y-%m-%d %H:%M}"
+        st.session_state.selected_job = job_manager.submit(settings, api_keys, label=label)
+
+# Runs cut short by a restart, a cancel or failed videos continue from their journal
+unfinished_runs = dict(find_unfinished_runs(output_dir))
+if unfinished_runs:
+    with st.expander(f"Resume an unfinished run ({len(unfinished_runs)})"):
+        resume_dir = st.selectbox(
+            "Unfinished run",
+            list(unfinished_runs),
+            format_func=lambda path: f"{os.path.basename(path)} ({unfinished_runs[path]} videos left)"
+        )
+        if st.button("Resume Run"):
+            if not api_keys:
+                st.error("Please provide at least one Gemini API Key.")
             else:
-                channel_list = [url.strip() for url in channels_input.split('\n') if url.strip()]
-                logger.info(f"Processing {len(channel_list)} channels.")
-                
-                # 1. Check for videos
-                videos = check_for_new_videos(channel_list, start_datetime, end_datetime, logger)
-                
-                if not videos:
-                    logger.info("No videos found in the specified time period.")
-                else:
-                    failed_live_videos = []
-                    for video in videos:
-                        video_title = video.get('title', 'Unknown_Title')
-                        channel_name = video.get('channel_name', 'Unknown_Channel')
-                        upload_time = video.get('published') # datetime object
-                        
-                        # Format for filename: <upload_time>_<YouTube_Channel_Name>_<Video_Title>
-                        # Sanitize filename
-                        def sanitize(name):
-                            return "".join([c for c in name if c.isalpha() or c.isdigit() or c in (' ', '-', '_')]).rstrip()
-                        
-                        upload_time_str = upload_time.strftime("%Y-%m-%d_%H-%M-%S") if upload_time else "UnknownTime"
-                        safe_title = sanitize(video_title)
-                        safe_channel = sanitize(channel_name)
-                        
-                        # Truncate if too long to avoid FS errors
-                        filename_base = f"{upload_time_str}_{safe_channel}_{safe_title}"[:200]
-                        
-                        logger.info(f"Processing video: {video_title}")
-                        
-                        # 2. Download
-                        audio_path = download_audio(video.get('link'), current_output_dir, logger)
-                        
-                        if audio_path == "LIVE_EVENT_UPCOMING":
-                            logger.info(f"The audio {video.get('link')} cannot be downloaded in the moment, skip to the next audio")
-                            failed_live_videos.append(video.get('link'))
-                            continue
-
-                        if audio_path:
-                            # 3. Transcribe
-                            transcript = transcribe_audio(audio_path, model_name, logger)
-                            
-                            if transcript:
-                                # 4. Summarize
-                                summary_data = summarize_transcript(
-                                    transcript, 
-                                    video.get('link'), 
-                                    logger, 
-                                    api_keys=api_keys, 
-                                    abstract_model=gemini_abstract_model,
-                                    summary_model=gemini_summary_model
-                                )
-                                
-                                if summary_data:
-                                    # 5. Save Report
-                                    report_filename = f"{filename_base}.md"
-                                    report_path = os.path.join(current_output_dir, report_filename)
-                                    
-                                    with open(report_path, "w", encoding="utf-8") as f:
-                                        f.write(f"# {video_title}\n\n")
-                                        f.write(f"**Channel:** {channel_name}\n")
-                                        f.write(f"**Upload Time:** {upload_time}\n")
-                                        f.write(f"**Link:** {video.get('link')}\n\n")
-                                        f.write("## Summary & Outline\n\n")
-                                        f.write(summary_data['summary_content'])
-                                        f.write("\n\n## Detailed Transcript\n\n")
-                                        f.write(summary_data['detailed_transcript'])
-                                        
-                                    logger.info(f"Report saved to: {report_path}")
-                                    
-                            # Optional: Cleanup audio file
-                            try:
-                                os.remove(audio_path)
-                                logger.info(f"Removed temp audio: {audio_path}")
-                            except:
-                                pass
-                        
-                        logger.info(f"Finished processing {video_title}")
-
-                    if failed_live_videos:
-                        urls_str = "\n\t".join(failed_live_videos)
-                        logger.info(f"Here is the video cannot process at the moment, please retry later: \n\t{urls_str}")
-
-            logger.info("All processing complete.")
-            
-    except CriticalError as e:
-        st.error(f"Processing stopped due to critical error: {e}")
-    except Exception as e:
-        logger.critical(f"An unexpected error occurred: {e}")
-        st.error(f"An unexpected error occurred: {e}")
-    finally:
-        st.session_state.is_processing = False
-        # Optional: st.rerun() if we were doing the async state pattern
+                st.session_state.selected_job = job_manager.submit(
+                    {"resume_dir": resume_dir}, api_keys, label=f"Resume {os.path.basename(resume_dir)}"
+                )
+
+# One index per output folder, shared by all sessions; runs add their reports to it as they are written
+@st.cache_resource
+def get_search_index(output_dir):
+    return SearchIndex.for_output(output_dir)
+
+with st.expander("Search reports"):
+    search_index = get_search_index(output_dir)
+    search_col1, search_col2 = st.columns([2, 1])
+    with search_col1:
+        search_query = st.text_input("Search titles, summaries and transcripts", help="Every word must match; a trailing * matches a prefix")
+    with search_col2:
+        search_channels = st.multiselect("Channels", search_index.channels())
+    search_dates = st.date_input("Uploaded between (optional)", value=(), format="YYYY-MM-DD")
+
+    if search_query:
+        # Picks up reports from before the index existed
+        search_index.sync()
+        search_start = search_end = None
+        if len(search_dates) == 2:
+            search_start = datetime.datetime.combine(search_dates[0], datetime.time(0, 0))
+            search_end = datetime.datetime.combine(search_dates[1], datetime.time(23, 59, 59))
+        hits = search_index.search(search_query, start=search_start, end=search_end, channels=search_channels,
+                                   limit=50, markers=("**", "**"))
+        st.caption(f"{len(hits)} matches")
+        for hit in hits:
+            where = f"[{format_timestamp(hit['start'])}]({hit['link']})" if hit["start"] is not None else hit["kind"]
+            st.markdown(f"**{hit['title']}** · {hit['channel']} · {hit['published'] or 'UnknownTime'} · {where}")
+            st.caption(f"{' '.join(hit['snippet'].split())}  \n{hit['report_path']}")
+
+with col2:
+    st.subheader("Console Log")
+
+    @st.fragment(run_every=1.0)
+    def job_panel():
+        # Polls the selected job; only this fragment reruns, not the whole page
+        jobs = job_manager.list_jobs()
+        if not jobs:
+            st.container(height=400).code("No runs yet.", language="text")
+            return
+
+        job_ids = [job.id for job in jobs]
+        selected = st.session_state.get("selected_job")
+        job_id = st.selectbox(
+            "Run",
+            job_ids,
+            index=job_ids.index(selected) if selected in job_ids else 0,
+            # Label only: a label that changed with the status would reset the selection
+            format_func=lambda job_id: f"{job_id[:15]} {job_manager.get(job_id).label}"
+        )
+        st.session_state.selected_job = job_id
+        job = job_manager.get(job_id)
+        st.caption(f"Status: {job.status}")
+
+        record = job.to_record()
+        videos = record["videos"]
+        finished = sum(is_finished_state(video.get("state", "queued")) for video in videos)
+        if videos:
+            st.progress(finished / len(videos), text=f"{finished}/{len(videos)} videos finished")
+        if record["result"] and record["result"]["output_dir"]:
+            st.caption(f"Output Directory: {record['result']['output_dir']}")
+        if record["error"]:
+            st.error(f"Processing stopped due to critical error: {record['error']}")
+
+        console_container = st.container(height=400)
+        # Jobs loaded from disk after a restart have no log in memory
+        console_container.code(job.logger.get_tail() or f"Full log: {job.logger.log_file or 'not available'}", language="text")
+
+        stage_summary = (record["result"] or {}).get("stage_summary")
+        if stage_summary:
+            with st.expander("Stage timings"):
+                st.dataframe(
+                    [{
+                        "Stage": row["span"],
+                        "Count": row["count"],
+                        "Errors": row["errors"],
+                        "Wall (s)": round(row["wall_total"], 1),
+                        "p50 (s)": round(row["wall_p50"], 2),
+                        "p95 (s)": round(row["wall_p95"], 2),
+                        "CPU (s)": round(row["cpu_total"], 1),
+                        "Downloaded (MB)": round(row["bytes"] / 1e6, 1),
+                        "Audio (min)": round(row["audio_seconds"] / 60, 1),
+                        "RTF": round(row["rtf"], 3) if row["rtf"] is not None else None,
+                        "Prompt tokens": row["prompt_tokens"],
+                        "Response tokens": row["response_tokens"],
+                        "Retries": row["retries"],
+                    } for row in stage_summary],
+                    hide_index=True
+                )
+
+        if videos:
+            with st.expander("Videos", expanded=not job.finished):
+                st.dataframe(
+                    [{"#": video["index"] + 1, "Title": video.get("title"), "State": video.get("state")} for video in videos],
+                    hide_index=True
+                )
+
+        if not job.finished and st.button("Cancel Run"):
+            job_manager.cancel(job.id)
+
+    job_panel()
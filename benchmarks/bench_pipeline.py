@@ -0,0 +1,270 @@
+"""
+End-to-end benchmark of a run against local stand-ins (see benchmarks/fakes.py),
+so it needs no network, API key or Whisper model:
+
+    python benchmarks/bench_pipeline.py --channels 8 --videos 5 --gemini-latency 0.2 --rate-limit 0.1
+
+First each step is timed on its own (check_for_new_videos, download_audio,
+transcribe_audio, summarize_transcript), then all of them together through
+process_videos. Reports per-stage throughput and p50/p95 latency, the peak RSS
+of the process and the number of HTTP, Gemini and Whisper calls.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeYouTubeServer, FakeGeminiClient, decode_wav
+
+_run_ids = itertools.count()
+
+class QuietLogger:
+    """
+    Pipeline logger that keeps counts instead of printing.
+    """
+    def __init__(self):
+        self.counts = {"info": 0, "warning": 0, "critical": 0}
+        self.last_warning = None
+
+    def info(self, message):
+        self.counts["info"] += 1
+
+    def warning(self, message):
+        self.counts["warning"] += 1
+        self.last_warning = message
+
+    def critical(self, message):
+        self.counts["critical"] += 1
+        self.last_warning = message
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize_latencies(latencies, wall):
+    return {
+        "count": len(latencies),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "throughput": len(latencies) / wall if wall > 0 else None,
+    }
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_parallel(func, items, workers):
+    """
+    Runs func over items on `workers` threads; returns (results, latencies, wall time).
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        outcomes = list(executor.map(lambda item: timed(func, item), items))
+    wall = time.perf_counter() - started
+    return [result for result, _ in outcomes], [latency for _, latency in outcomes], wall
+
+def bench_discovery(server, window, repeat):
+    from utils.channel_monitor import check_for_new_videos
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        videos, latency = timed(check_for_new_videos, server.channel_urls, *window, QuietLogger())
+        latencies.append(latency)
+    return videos, summarize_latencies(latencies, time.perf_counter() - started)
+
+def bench_download(videos, output_dir, workers):
+    from utils.downloader import download_audio, get_download_manager
+
+    # download_audio goes through the shared DownloadManager; size its pool first
+    get_download_manager(workers)
+    results, latencies, wall = run_parallel(lambda video: download_audio(video["link"], output_dir, QuietLogger()), videos, workers)
+    paths = [result.path for result in results if result.ok]
+    return paths, summarize_latencies(latencies, wall)
+
+def bench_transcribe(paths, decoder, backend, workers):
+    from utils.transcriber import transcribe_audio
+
+    def transcribe_one(path):
+        # Decoding is part of the step, as in the pipeline's decode stage
+        return transcribe_audio(decoder(path), backend.model_name, QuietLogger(), backend=backend)
+
+    transcripts, latencies, wall = run_parallel(transcribe_one, paths, workers)
+    return transcripts, summarize_latencies(latencies, wall)
+
+def bench_summarize(transcripts, api_keys, models, workers):
+    from utils.summarizer import summarize_transcript
+
+    def summarize_one(job):
+        index, text = job
+        return summarize_transcript(text, f"https://bench.invalid/{index}", QuietLogger(), api_keys=api_keys,
+                                    abstract_model=models[0], summary_model=models[1], mode="single")
+
+    summaries, latencies, wall = run_parallel(summarize_one, list(enumerate(transcripts)), workers)
+    return summaries, summarize_latencies(latencies, wall)
+
+PIPELINE_STATES = ["queued", "download", "decode", "transcribe", "summarize", "done"]
+
+def bench_end_to_end(server, window, output_dir, api_keys, models, backend, decoder, args):
+    """
+    One process_videos run over the discover_videos generator. A stage's latency
+    is the time from a video entering it to entering the next one, so it includes
+    the wait in front of the next stage.
+    """
+    from utils.channel_monitor import discover_videos
+    from utils.pipeline import process_videos
+
+    entered = {}
+    statuses = {}
+
+    def on_progress(index, video, state):
+        entered.setdefault(index, {})[state] = time.perf_counter()
+        statuses[index] = state
+
+    logger = QuietLogger()
+    started = time.perf_counter()
+    process_videos(
+        discover_videos(server.channel_urls, *window, logger), output_dir, logger,
+        model_name=backend.model_name, api_keys=api_keys, abstract_model=models[0], summary_model=models[1],
+        download_workers=args.download_workers, transcribe_workers=args.transcribe_workers,
+        summarize_workers=args.summarize_workers, summarize_mode="single", backend="fake",
+        on_progress=on_progress, audio_decoder=decoder,
+    )
+    wall = time.perf_counter() - started
+
+    stages = {}
+    for state, next_state in zip(PIPELINE_STATES, PIPELINE_STATES[1:]):
+        latencies = [times[next_state] - times[state] for times in entered.values() if state in times and next_state in times]
+        stages[state] = summarize_latencies(latencies, wall)
+    totals = [times["done"] - times["queued"] for times in entered.values() if "done" in times]
+    return {
+        "videos": len(entered),
+        "completed": sum(1 for state in statuses.values() if state == "done"),
+        "wall": wall,
+        "throughput": len(totals) / wall if wall > 0 else None,
+        "latency": summarize_latencies(totals, wall),
+        "stages": stages,
+        "warnings": logger.counts["warning"] + logger.counts["critical"],
+    }
+
+def run_benchmark(args):
+    from utils.audio import load_audio
+    from utils.gemini_pool import get_pool
+    from utils.transcription_backends import get_backend
+
+    # Decode with ffmpeg like a real run when it is installed; the served files are plain WAV either way
+    decoder = load_audio if shutil.which("ffmpeg") else decode_wav
+    backend = get_backend("fake", f"bench-rtf{args.rtf}", seconds_per_audio_second=args.rtf)
+    models = ("bench-abstract", "bench-summary")
+    gemini = FakeGeminiClient(latency=args.gemini_latency, rate_limit_rate=args.rate_limit, seed=args.seed)
+    # Fresh keys per run, so every run gets its own pool around this client
+    run_id = next(_run_ids)
+    api_keys = [f"bench-key-{os.getpid()}-{run_id}-{n}" for n in range(args.keys)]
+    # Only the fake 429s should throttle, not the real per-key quotas
+    get_pool(api_keys, client_factory=lambda key: gemini, model_limits=[("bench", (10 ** 6, 10 ** 9))],
+             max_delay=1.0)
+
+    day = datetime.date(2026, 2, 15)
+    window = (datetime.datetime.combine(day, datetime.time(0, 0)), datetime.datetime.combine(day, datetime.time(23, 59, 59)))
+    results = {"config": vars(args), "decoder": "ffmpeg" if decoder is load_audio else "wave", "stages": {}}
+
+    with FakeYouTubeServer(args.channels, args.videos, audio_seconds=args.audio_seconds, latency=args.http_latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        videos, results["stages"]["check_for_new_videos"] = bench_discovery(server, window, args.repeat)
+        paths, results["stages"]["download_audio"] = bench_download(videos, os.path.join(tmp, "downloads"), args.download_workers)
+        transcripts, results["stages"]["transcribe_audio"] = bench_transcribe(paths, decoder, backend, args.transcribe_workers)
+        _, results["stages"]["summarize_transcript"] = bench_summarize(transcripts, api_keys, models, args.summarize_workers)
+        micro_calls = gemini.calls
+
+        run_dir = os.path.join(tmp, "run")
+        os.makedirs(run_dir)
+        results["end_to_end"] = bench_end_to_end(server, window, run_dir, api_keys, models, backend, decoder, args)
+
+        results["calls"] = {
+            "http": dict(server.requests),
+            "audio_bytes": server.audio_bytes,
+            "gemini": {"calls": gemini.calls, "rate_limited": gemini.rate_limited,
+                       "end_to_end": gemini.calls - micro_calls, "prompt_chars": gemini.prompt_chars},
+            "transcriptions": backend.calls,
+        }
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value * 1000:9.1f} ms"
+
+def _format_rate(value):
+    return "-" if value is None else f"{value:8.2f}/s"
+
+def print_report(results):
+    config = results["config"]
+    print(f"{config['channels']} channels x {config['videos']} videos, {config['audio_seconds']:g} s audio, "
+          f"Gemini latency {config['gemini_latency']:g} s, 429 rate {config['rate_limit']:g}, RTF {config['rtf']:g}, "
+          f"decoder {results['decoder']}")
+    print()
+    print(f"{'step':<24}{'count':>7}{'p50':>14}{'p95':>14}{'throughput':>12}")
+    rows = list(results["stages"].items())
+    rows += [(f"pipeline:{name}", stats) for name, stats in results["end_to_end"]["stages"].items()]
+    rows.append(("pipeline:total", results["end_to_end"]["latency"]))
+    for name, stats in rows:
+        print(f"{name:<24}{stats['count']:>7}{_format_seconds(stats['p50']):>14}{_format_seconds(stats['p95']):>14}{_format_rate(stats['throughput']):>12}")
+    print()
+    end_to_end = results["end_to_end"]
+    print(f"End to end: {end_to_end['completed']}/{end_to_end['videos']} videos in {end_to_end['wall']:.2f} s "
+          f"({_format_rate(end_to_end['throughput']).strip()}), {end_to_end['warnings']} warnings")
+    calls = results["calls"]
+    print(f"HTTP requests: {calls['http']}, audio {calls['audio_bytes'] / 1e6:.1f} MB")
+    print(f"Gemini calls: {calls['gemini']['calls']} ({calls['gemini']['rate_limited']} rate limited, "
+          f"{calls['gemini']['end_to_end']} end to end), Whisper calls: {calls['transcriptions']}")
+    if results["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the summarizer pipeline.")
+    parser.add_argument("--channels", type=int, default=4, help="Number of fake channels (default: 4)")
+    parser.add_argument("--videos", type=int, default=3, help="Videos per channel (default: 3)")
+    parser.add_argument("--audio-seconds", type=float, default=60.0, help="Length of every video's audio (default: 60)")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="Delay of every fake HTTP response in seconds")
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="Delay of every fake Gemini call in seconds (default: 0.05)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Share of Gemini calls answered with a 429 (0-1)")
+    parser.add_argument("--keys", type=int, default=2, help="Number of fake API keys (default: 2)")
+    parser.add_argument("--rtf", type=float, default=0.0, help="Fake Whisper seconds per audio second (default: 0)")
+    parser.add_argument("--download-workers", type=int, default=2)
+    parser.add_argument("--transcribe-workers", type=int, default=1)
+    parser.add_argument("--summarize-workers", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3, help="Discovery passes to time (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the fake 429s")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON to PATH")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Local stand-ins for the services a run talks to, so benchmarks need no network:
+a YouTube-like HTTP server (channel pages, RSS feeds and synthetic audio files
+that yt-dlp downloads through its generic extractor), a Gemini client with
+configurable latency and 429 rate, and a WAV decoder for machines without ffmpeg.
+The transcription stand-in is transcription_backends.FakeBackend.
+"""
+import asyncio
+import datetime
+import io
+import random
+import threading
+import time
+import wave
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from utils.audio import SAMPLE_RATE
+
+CHANNEL_PAGE = """<html><head>
+<link rel="alternate" type="application/rss+xml" title="RSS" href="{base}/feeds/videos.xml?channel_id={channel_id}">
+</head><body></body></html>"""
+
+FEED_ENTRY = """<entry>
+  <id>yt:video:{video_id}</id>
+  <yt:videoId>{video_id}</yt:videoId>
+  <title>{title}</title>
+  <link rel="alternate" href="{base}/audio/{video_id}.wav"/>
+  <published>{published}</published>
+</entry>"""
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+  <title>{title}</title>
+  {entries}
+</feed>"""
+
+def synthetic_speech(seconds, sample_rate=SAMPLE_RATE, seed=0):
+    """
+    Noise bursts standing in for speech, with a short pause every 7 seconds.
+    """
+    rng = np.random.default_rng(seed)
+    audio = rng.standard_normal(int(seconds * sample_rate)).astype(np.float32) * 0.3
+    for start in range(7, int(seconds), 7):
+        audio[int((start - 0.5) * sample_rate):start * sample_rate] *= 0.001
+    return audio
+
+def wav_bytes(audio, sample_rate=SAMPLE_RATE):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+def decode_wav(path):
+    """
+    Stand-in for audio.load_audio when the ffmpeg binary is missing: reads the
+    16 kHz mono WAV files served by FakeYouTubeServer.
+    """
+    with wave.open(path, "rb") as f:
+        frames = f.readframes(f.getnframes())
+    return np.frombuffer(frames, "<i2").astype(np.float32) / 32768.0
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # yt-dlp closes its probe request early; a reset connection is expected
+        pass
+
+class FakeYouTubeServer:
+    """
+    Serves `channels` channels of `videos` uploads each:
+    /@bench<c> (channel page), /feeds/videos.xml?channel_id=<id> (Atom feed) and
+    /audio/<video id>.wav (`audio_seconds` of synthetic speech).
+    Every response waits `latency` seconds. `requests` counts hits per kind.
+    All uploads are published on `day`, one second apart.
+    """
+    def __init__(self, channels, videos, audio_seconds=30.0, latency=0.0, day=datetime.date(2026, 2, 15)):
+        self.channels = channels
+        self.videos = videos
+        self.latency = latency
+        self.day = day
+        self.requests = {"channel": 0, "feed": 0, "audio": 0, "other": 0}
+        self.audio_bytes = 0
+        self._lock = threading.Lock()
+        self._audio = wav_bytes(synthetic_speech(audio_seconds))
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                kind, status, body, content_type = server.respond(urlparse(self.path))
+                with server._lock:
+                    server.requests[kind] += 1
+                    if kind == "audio" and self.command == "GET":
+                        server.audio_bytes += len(body)
+                self._send(status, body, content_type)
+
+        self.server = _QuietServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def channel_urls(self):
+        return [f"{self.base}/@bench{c}" for c in range(self.channels)]
+
+    def video_ids(self, channel):
+        return [f"bench{channel:03d}v{n:03d}" for n in range(self.videos)]
+
+    def respond(self, url):
+        if url.path.startswith("/@bench"):
+            channel_id = f"UCbench{url.path[len('/@bench'):]}"
+            return "channel", 200, CHANNEL_PAGE.format(base=self.base, channel_id=channel_id).encode(), "text/html"
+        if url.path == "/feeds/videos.xml":
+            channel = int(parse_qs(url.query)["channel_id"][0][len("UCbench"):])
+            midnight = datetime.datetime.combine(self.day, datetime.time(0, 0), tzinfo=datetime.timezone.utc)
+            entries = "\n".join(
+                FEED_ENTRY.format(
+                    base=self.base, video_id=video_id, title=f"Channel {channel} video {n}",
+                    published=(midnight + datetime.timedelta(seconds=channel * self.videos + n + 1)).isoformat(),
+                )
+                for n, video_id in enumerate(self.video_ids(channel))
+            )
+            feed = FEED.format(title=f"Bench channel {channel}", entries=entries)
+            return "feed", 200, feed.encode(), "application/atom+xml"
+        if url.path.startswith("/audio/"):
+            return "audio", 200, self._audio, "audio/wav"
+        return "other", 404, b"not found", "text/plain"
+
+class FakeQuotaError(Exception):
+    code = 429
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiClient:
+    """
+    Gemini client stand-in for GeminiPool(client_factory=...): answers after
+    `latency` seconds and fails a `rate_limit_rate` share of calls with a 429
+    carrying a `retry_delay` hint. Counts calls, 429s and prompt characters.
+    """
+    def __init__(self, latency=0.0, rate_limit_rate=0.0, retry_delay=0.05, seed=0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_delay = retry_delay
+        self.calls = 0
+        self.rate_limited = 0
+        self.prompt_chars = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.aio = self
+        self.models = self
+
+    async def generate_content(self, model, contents):
+        prompt = contents[0]
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+            limited = self._random.random() < self.rate_limit_rate
+            if limited:
+                self.rate_limited += 1
+        await asyncio.sleep(self.latency)
+        if limited:
+            raise FakeQuotaError(f"429 RESOURCE_EXHAUSTED. Please retry in {self.retry_delay}s.")
+        return FakeResponse(f"## {model}\n\nSummary of a {len(prompt)} character prompt.")
@@ -0,0 +1,257 @@
+"""
+Headless entry point sharing the Streamlit app's pipeline, for cron jobs and servers.
+
+    python cli.py run --channels-file channels.txt --since-last-run
+    python cli.py run --channel https://www.youtube.com/@Example --start 2026-02-15 --end 2026-02-19T23:59
+    python cli.py daemon --channels-file channels.txt --interval 60 --metrics-port 9464
+    python cli.py resume output/Trigger_2026-02-19_08-00-00_SinceLastRun
+    python cli.py search "量子計算" --channel "Example" --start 2026-02-01
+
+Settings not given on the command line come from config.json (the app's last-used
+settings). search needs no API key. Gemini API keys come from --api-keys or GEMINI_API_KEY (.env is loaded).
+Nothing here imports Streamlit.
+"""
+import argparse
+import datetime
+import os
+import signal
+import sys
+import threading
+
+from dotenv import load_dotenv
+
+from utils.config import CONFIG_FILE, DEFAULT_SETTINGS, load_config, parse_api_keys
+from utils.logger import ConsoleLogger, CriticalError, LOG_FILE
+
+DEFAULT_DAEMON_INTERVAL = 60  # minutes between polls
+DEFAULT_DAEMON_LOOKBACK = 24  # hours; window for channels the daemon has never polled
+
+def read_channels(args):
+    channels = list(args.channel or [])
+    if args.channels_file:
+        with open(args.channels_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    channels.append(line)
+    return channels
+
+def parse_datetime(value):
+    return datetime.datetime.fromisoformat(value)
+
+def build_settings(args, config):
+    """
+    Merges DEFAULT_SETTINGS, config.json and the command line into run_batch() settings.
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({key: value for key, value in config.items() if key in DEFAULT_SETTINGS})
+
+    overrides = {
+        "output_dir": args.output_dir,
+        "model_name": args.model,
+        "transcription_backend": args.backend,
+        "gemini_abstract_model": args.abstract_model,
+        "gemini_summary_model": args.summary_model,
+        "gemini_rate_limits": args.gemini_rate_limits,
+        "summarize_mode": args.summarize_mode,
+        "audio_format": args.audio_format,
+        "transcode_audio": args.transcode_audio,
+        "live_retry_minutes": args.live_retry_minutes,
+        "download_workers": args.download_workers,
+        "transcribe_workers": args.transcribe_workers,
+        "chunk_workers": args.chunk_workers,
+        "summarize_workers": args.summarize_workers,
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+
+    channels = read_channels(args)
+    if not channels and config.get("channels"):
+        channels = [url.strip() for url in config["channels"].split("\n") if url.strip()]
+    settings["channels"] = channels
+
+    today = datetime.date.today()
+    # Only the run command has these; the daemon sets its own window on every poll
+    settings["start"] = getattr(args, "start", None) or datetime.datetime.combine(today, datetime.time(0, 0))
+    settings["end"] = getattr(args, "end", None) or datetime.datetime.combine(today, datetime.time(23, 59))
+    settings["since_last_run"] = getattr(args, "since_last_run", False)
+    return settings
+
+def add_common_arguments(parser):
+    parser.add_argument("--channels-file", help="File with one channel URL per line ('#' starts a comment)")
+    parser.add_argument("--channel", action="append", help="Channel URL (repeatable)")
+    parser.add_argument("--output-dir", help="Where the Trigger_* report folders are created")
+    parser.add_argument("--model", help="Whisper model, e.g. mlx-community/whisper-large-v3-turbo")
+    parser.add_argument("--backend", choices=["auto", "mlx", "ctranslate2"], help="Transcription backend")
+    parser.add_argument("--abstract-model", help="Gemini model for abstracts and chunk summaries")
+    parser.add_argument("--summary-model", help="Gemini model for the final summary")
+    parser.add_argument("--gemini-rate-limits",
+                        help="Per-key limits, e.g. 'flash=1000/4000000,pro=150' (RPM/TPM) or 'off' (default: free-tier limits)")
+    parser.add_argument("--summarize-mode", choices=["auto", "single", "map_reduce"])
+    parser.add_argument("--audio-format", choices=["speech", "best"],
+                        help="speech: smallest audio stream good enough for Whisper; best: highest bitrate")
+    parser.add_argument("--transcode-audio", action="store_true", default=None,
+                        help="Re-encode downloads to m4a instead of keeping the native container")
+    parser.add_argument("--live-retry-minutes", type=float,
+                        help="How long upcoming live events are retried (with backoff) before they are skipped")
+    parser.add_argument("--download-workers", type=int)
+    parser.add_argument("--transcribe-workers", type=int)
+    parser.add_argument("--chunk-workers", type=int)
+    parser.add_argument("--summarize-workers", type=int)
+    parser.add_argument("--api-keys", help="Gemini API keys, comma-separated (default: GEMINI_API_KEY)")
+    parser.add_argument("--config", default=CONFIG_FILE, help="Settings file shared with the app")
+    parser.add_argument("--log-file", default=LOG_FILE)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Summarize new YouTube videos without the Streamlit UI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Process one time window (or everything new since the last run) and exit")
+    add_common_arguments(run_parser)
+    run_parser.add_argument("--start", type=parse_datetime, help="Window start, ISO format (default: today 00:00)")
+    run_parser.add_argument("--end", type=parse_datetime, help="Window end, ISO format (default: today 23:59)")
+    run_parser.add_argument("--since-last-run", action="store_true", help="Only videos not seen by a previous run")
+
+    daemon_parser = subparsers.add_parser("daemon", help="Poll the channels on a schedule, keeping the model and connections warm")
+    add_common_arguments(daemon_parser)
+    daemon_parser.add_argument("--interval", type=float, default=DEFAULT_DAEMON_INTERVAL, help="Minutes between polls")
+    daemon_parser.add_argument("--lookback", type=float, default=DEFAULT_DAEMON_LOOKBACK,
+                               help="Hours to look back for channels that were never polled before")
+    daemon_parser.add_argument("--metrics-port", type=int,
+                               help="Serve Prometheus metrics of all polls at http://127.0.0.1:PORT/metrics")
+
+    resume_parser = subparsers.add_parser("resume", help="Continue an interrupted run from its journal, redoing only unfinished steps")
+    resume_parser.add_argument("run_dir", nargs="?",
+                               help="Trigger_* folder of the run (default: the newest unfinished run under --output-dir)")
+    resume_parser.add_argument("--output-dir", help="Where the Trigger_* report folders are")
+    resume_parser.add_argument("--api-keys", help="Gemini API keys, comma-separated (default: GEMINI_API_KEY)")
+    resume_parser.add_argument("--config", default=CONFIG_FILE, help="Settings file shared with the app")
+    resume_parser.add_argument("--log-file", default=LOG_FILE)
+
+    search_parser = subparsers.add_parser("search", help="Search the titles, summaries and transcripts of all reports")
+    search_parser.add_argument("query", help="Words to find; every word must match, a trailing '*' matches a prefix")
+    search_parser.add_argument("--output-dir", help="Where the Trigger_* report folders are")
+    search_parser.add_argument("--channel", action="append", help="Only reports of this channel name (repeatable)")
+    search_parser.add_argument("--start", type=parse_datetime, help="Only videos uploaded at or after this time, ISO format")
+    search_parser.add_argument("--end", type=parse_datetime, help="Only videos uploaded at or before this time, ISO format")
+    search_parser.add_argument("--limit", type=int, default=20)
+    search_parser.add_argument("--config", default=CONFIG_FILE, help="Settings file shared with the app")
+    return parser
+
+def command_run(args, settings, api_keys, logger):
+    from utils.pipeline import run_batch
+    result = run_batch(settings, api_keys, logger)
+    if result["output_dir"]:
+        logger.info(f"All processing complete. Reports are in {result['output_dir']}")
+    return 0
+
+def command_resume(args, config, api_keys, logger):
+    from utils.pipeline import run_batch
+    from utils.journal import find_unfinished_runs
+
+    run_dir = args.run_dir
+    if not run_dir:
+        output_root = args.output_dir or config.get("output_dir", DEFAULT_SETTINGS["output_dir"])
+        runs = find_unfinished_runs(output_root, limit=1)
+        if not runs:
+            logger.info(f"No unfinished runs under {output_root}.")
+            return 0
+        run_dir = runs[0][0]
+    result = run_batch({"resume_dir": run_dir}, api_keys, logger)
+    logger.info(f"All processing complete. Reports are in {result['output_dir']}")
+    return 1 if result["unfinished_videos"] else 0
+
+def command_search(args, config):
+    from utils.search_index import SearchIndex
+    from utils.segments import format_timestamp
+
+    output_root = args.output_dir or config.get("output_dir", DEFAULT_SETTINGS["output_dir"])
+    index = SearchIndex.for_output(output_root)
+    try:
+        # Picks up reports written by older versions or edited by hand
+        index.sync()
+        hits = index.search(args.query, start=args.start, end=args.end, channels=args.channel, limit=args.limit)
+    finally:
+        index.close()
+
+    if not hits:
+        print("No matches.")
+        return 1
+    for hit in hits:
+        where = f"[{format_timestamp(hit['start'])}]" if hit["start"] is not None else f"({hit['kind']})"
+        print(f"{hit['published'] or 'UnknownTime'}  {hit['channel']} - {hit['title']}")
+        print(f"    {where} {' '.join(hit['snippet'].split())}")
+        print(f"    {hit['link'] or ''}")
+        print(f"    {hit['report_path']}")
+    return 0
+
+def command_daemon(args, settings, api_keys, logger):
+    from utils.pipeline import run_batch
+    from utils.channel_monitor import RSSUrlCache, RSS_CACHE_FILE, FeedStateStore, FEED_STATE_FILE
+    from utils.transcription_backends import get_backend
+
+    stop = threading.Event()
+    def request_stop(signum, frame):
+        logger.warning("Stop requested, finishing the steps in progress...")
+        stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    # Loaded once and reused by every poll; the HTTP session and Gemini clients are process-wide too
+    backend = get_backend(settings["transcription_backend"], settings["model_name"])
+    logger.info(f"Loading {backend.name} model {settings['model_name']}...")
+    backend.load()
+    rss_cache = RSSUrlCache(RSS_CACHE_FILE)
+    feed_state = FeedStateStore(FEED_STATE_FILE)
+    if args.metrics_port:
+        from utils.metrics import serve_metrics
+        serve_metrics(args.metrics_port)
+        logger.info(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+
+    # Every poll only picks up what the previous one has not seen
+    settings["since_last_run"] = True
+    interval = max(1.0, args.interval * 60)
+    logger.info(f"Polling {len(settings['channels'])} channels every {args.interval:g} minutes.")
+    while not stop.is_set():
+        started = datetime.datetime.now()
+        settings["start"] = started - datetime.timedelta(hours=args.lookback)
+        settings["end"] = started
+        try:
+            run_batch(settings, api_keys, logger, rss_cache=rss_cache, feed_state=feed_state, cancel_event=stop)
+        except CriticalError:
+            # Already logged; try again on the next poll
+            pass
+        except Exception as e:
+            logger.warning(f"Poll failed: {e}")
+        next_poll = started + datetime.timedelta(seconds=interval)
+        if not stop.is_set():
+            logger.info(f"Next poll at {next_poll:%Y-%m-%d %H:%M:%S}")
+        stop.wait(max(0.0, (next_poll - datetime.datetime.now()).total_seconds()))
+    logger.info("Daemon stopped.")
+    return 0
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    if args.command == "search":
+        return command_search(args, load_config(args.config))
+    logger = ConsoleLogger(log_file=args.log_file)
+    config = load_config(args.config)
+    api_keys = parse_api_keys(args.api_keys or os.getenv("GEMINI_API_KEY", ""))
+
+    try:
+        if not api_keys:
+            logger.critical("Please provide at least one Gemini API Key (--api-keys or GEMINI_API_KEY).")
+        if args.command == "resume":
+            # The run's own settings come from its journal
+            return command_resume(args, config, api_keys, logger)
+        settings = build_settings(args, config)
+        if not settings["channels"]:
+            logger.critical("No channels provided (--channel or --channels-file).")
+        if args.command == "daemon":
+            return command_daemon(args, settings, api_keys, logger)
+        return command_run(args, settings, api_keys, logger)
+    except CriticalError:
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
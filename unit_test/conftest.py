@@ -0,0 +1,69 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gemini_pool import get_pool
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiClient:
+    """
+    Stand-in for genai.Client(api_key=...).aio.models.generate_content.
+    Records every call as (model, prompt) in `prompts` and (time, model) in `calls`,
+    and the most calls in flight at once in `max_in_flight`. `failures` are raised by
+    the next calls, in order; prompts containing one of the `slow` markers take 0.3 s
+    and those containing a `broken` one fail. The response text is
+    reply(client, model, prompt), by default "<model> answer <call number>".
+    """
+    def __init__(self, api_key=None, failures=None, latency=0.001, reply=None):
+        self.api_key = api_key
+        self.failures = list(failures or [])
+        self.latency = latency
+        self.reply = reply or (lambda client, model, prompt: f"{model} answer {len(client.prompts)}")
+        self.prompts = []
+        self.calls = []
+        self.broken = set()
+        self.slow = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.aio = self
+        self.models = self
+
+    async def generate_content(self, model, contents):
+        prompt = contents[0]
+        with self.lock:
+            self.prompts.append((model, prompt))
+            self.calls.append((time.monotonic(), model))
+            failure = self.failures.pop(0) if self.failures else None
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            text = self.reply(self, model, prompt)
+        try:
+            await asyncio.sleep(0.3 if any(marker in prompt for marker in self.slow) else self.latency)
+            if failure is not None:
+                raise failure
+            if any(marker in prompt for marker in self.broken):
+                raise ValueError("malformed request")
+            return FakeResponse(text)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+def fake_keys(name, count=1, **client_options):
+    """
+    Registers the shared pool for `count` keys unique to `name`, all answered by one
+    FakeGeminiClient, so call_gemini_with_retry never hits the network.
+    Returns (keys, client).
+    """
+    client = FakeGeminiClient(**client_options)
+    keys = [f"test-key-{name}"] if count == 1 else [f"test-key-{name}-{n}" for n in range(count)]
+    get_pool(keys, client_factory=lambda key: client)
+    return keys, client
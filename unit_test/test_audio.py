@@ -0,0 +1,76 @@
+import sys
+import os
+import shutil
+import tempfile
+import wave
+import numpy as np
+import pytest
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.audio import find_split_points, load_audio, split_audio, SAMPLE_RATE
+
+def make_speech_like(seconds, silences, seed=0):
+    """
+    Noise bursts standing in for speech, with quiet gaps at the given
+    (start, end) second ranges.
+    """
+    rng = np.random.default_rng(seed)
+    audio = (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 0.3).astype(np.float32)
+    for start, end in silences:
+        audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] *= 0.001
+    return audio
+
+def test_short_audio_is_not_split():
+    audio = make_speech_like(30, [])
+    assert find_split_points(audio, chunk_seconds=20) == []
+    chunks = split_audio(audio, chunk_seconds=20)
+    assert len(chunks) == 1
+    assert chunks[0]["start"] == 0 and chunks[0]["end"] == 30
+
+def test_cuts_land_in_silences():
+    silences = [(17.0, 18.0), (41.0, 42.0), (58.5, 59.5)]
+    audio = make_speech_like(80, silences)
+    points = [p / SAMPLE_RATE for p in find_split_points(audio, chunk_seconds=20, search_seconds=5, min_silence_seconds=0.5)]
+
+    assert len(points) >= 2
+    for point in points:
+        assert any(start <= point <= end for start, end in silences), point
+
+def test_chunks_cover_timeline_with_overlap():
+    audio = make_speech_like(80, [(17.0, 18.0), (41.0, 42.0), (58.5, 59.5)])
+    chunks = split_audio(audio, chunk_seconds=20, overlap_seconds=1.0, search_seconds=5)
+
+    assert chunks[0]["start"] == 0
+    assert chunks[-1]["end"] == 80
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous["end"] == current["start"]
+        # Each chunk includes one second of its neighbours
+        assert abs(current["offset"] - (current["start"] - 1.0)) < 1e-6
+    for chunk in chunks:
+        assert len(chunk["audio"]) == int(round((min(80, chunk["end"] + 1.0) - chunk["offset"]) * SAMPLE_RATE))
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs the ffmpeg binary")
+def test_load_audio_decodes_in_one_pass():
+    # 3 s of 8 kHz stereo 16-bit PCM; load_audio resamples to 16 kHz mono float32
+    seconds, rate = 3, 8000
+    tone = (np.sin(np.arange(seconds * rate) * 2 * np.pi * 440 / rate) * 16000).astype("<i2")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tone.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(rate)
+            f.writeframes(np.repeat(tone, 2).tobytes())
+
+        audio = load_audio(path)
+
+    assert audio.dtype == np.float32
+    # The duration comes from the sample count, no probe needed
+    assert abs(len(audio) / SAMPLE_RATE - seconds) < 0.05
+    assert 0.4 < np.abs(audio).max() <= 0.5
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
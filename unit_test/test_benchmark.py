@@ -0,0 +1,35 @@
+import sys
+import os
+import json
+import tempfile
+
+# Add parent directory to path to import utils and benchmarks
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import bench_pipeline
+
+def test_benchmark_runs_offline_end_to_end():
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "results.json")
+        results = bench_pipeline.main([
+            "--channels", "2", "--videos", "2", "--audio-seconds", "3", "--gemini-latency", "0.01",
+            "--rate-limit", "0.3", "--repeat", "1", "--json", json_path,
+        ])
+        with open(json_path) as f:
+            assert json.load(f)["end_to_end"]["completed"] == 4
+
+    assert set(results["stages"]) == {"check_for_new_videos", "download_audio", "transcribe_audio", "summarize_transcript"}
+    assert all(stats["count"] for stats in results["stages"].values())
+    end_to_end = results["end_to_end"]
+    assert (end_to_end["videos"], end_to_end["completed"]) == (4, 4)
+    assert end_to_end["latency"]["p50"] <= end_to_end["latency"]["p95"]
+    # One abstract and one summary per video in each half; 429s are retried on top
+    gemini = results["calls"]["gemini"]
+    assert gemini["calls"] == 16 + gemini["rate_limited"]
+    assert gemini["end_to_end"] >= 8
+    assert results["calls"]["http"]["feed"] == 4
+    assert results["calls"]["transcriptions"] == 8
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,298 @@
+import sys
+import os
+import datetime
+import hashlib
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.channel_monitor import check_for_new_videos, discover_videos, get_channel_rss_url, RSSUrlCache, FeedStateStore
+
+class DummyLogger:
+    def __init__(self):
+        self.lines = []
+    def info(self, msg):
+        self.lines.append(f"[INFO] {msg}")
+    def warning(self, msg):
+        self.lines.append(f"[WARNING] {msg}")
+    def critical(self, msg):
+        self.lines.append(f"[CRITICAL] {msg}")
+    def error(self, msg):
+        self.lines.append(f"[ERROR] {msg}")
+
+CHANNEL_PAGE = """<html><head>
+<link rel="alternate" type="application/rss+xml" title="RSS" href="{base}/feeds/videos.xml?channel_id={channel_id}">
+</head><body>{padding}</body></html>"""
+
+FEED_ENTRY = """<entry>
+  <id>yt:video:{video_id}</id>
+  <yt:videoId>{video_id}</yt:videoId>
+  <title>{title}</title>
+  <link rel="alternate" href="https://www.youtube.com/watch?v={video_id}"/>
+  <published>{published}</published>
+</entry>"""
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+  <title>{title}</title>
+  {entries}
+</feed>"""
+
+class FakeYouTube:
+    """
+    Local stand-in for youtube.com: serves /@<handle> channel pages and
+    /feeds/videos.xml?channel_id=<id> Atom feeds from canned data.
+    `channels` maps handle -> list of (video_id, title, published ISO string).
+    """
+    def __init__(self, channels, delay=0.0):
+        self.channels = channels
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests.append(self.path)
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(fake.delay)
+                    status, body, content_type = fake.respond(self)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+                data = body.encode("utf-8")
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    with fake._lock:
+                        fake.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def channel_url(self, handle):
+        return f"{self.base}/@{handle}"
+
+    def respond(self, handler):
+        parsed = urlparse(handler.path)
+        if parsed.path.startswith("/@"):
+            handle = parsed.path[2:]
+            if handle not in self.channels:
+                return 404, "not found", "text/html"
+            page = CHANNEL_PAGE.format(base=self.base, channel_id=f"UC{handle}", padding="x" * 2048)
+            return 200, page, "text/html"
+        if parsed.path == "/feeds/videos.xml":
+            handle = parse_qs(parsed.query)["channel_id"][0][2:]
+            entries = "\n".join(
+                FEED_ENTRY.format(video_id=video_id, title=title, published=published)
+                for video_id, title, published in self.channels[handle]
+            )
+            return 200, FEED.format(title=f"Channel {handle}", entries=entries), "application/atom+xml"
+        return 404, "not found", "text/plain"
+
+START = datetime.datetime(2026, 2, 15, 0, 0)
+END = datetime.datetime(2026, 2, 15, 23, 59)
+
+def make_channels(count, videos_per_channel=3):
+    channels = {}
+    for c in range(count):
+        channels[f"chan{c}"] = [
+            (f"vid{c}x{v}", f"Video {c}-{v}", f"2026-02-{14 + v:02d}T08:00:00+00:00")
+            for v in range(videos_per_channel)
+        ]
+    return channels
+
+def test_get_channel_rss_url_from_page():
+    with FakeYouTube(make_channels(1)) as yt:
+        rss_url = get_channel_rss_url(yt.channel_url("chan0"))
+        assert rss_url == f"{yt.base}/feeds/videos.xml?channel_id=UCchan0"
+
+def test_check_for_new_videos_filters_and_orders():
+    with FakeYouTube(make_channels(5)) as yt:
+        urls = [yt.channel_url(f"chan{c}") for c in range(5)] + [yt.channel_url("missing")]
+        logger = DummyLogger()
+        videos = check_for_new_videos(urls, START, END, logger)
+
+    # Only the 2026-02-15 upload of each channel is inside the window
+    assert [v['video_id'] for v in videos] == [f"vid{c}x1" for c in range(5)]
+    assert videos[0]['channel_name'] == "Channel chan0"
+    assert any("Could not find RSS feed" in line for line in logger.lines)
+
+def test_discover_videos_is_concurrent_with_host_limit():
+    with FakeYouTube(make_channels(12), delay=0.1) as yt:
+        urls = [yt.channel_url(f"chan{c}") for c in range(12)]
+        started = time.time()
+        videos = list(discover_videos(urls, START, END, DummyLogger(), max_workers=12, per_host_limit=4))
+        elapsed = time.time() - started
+
+        assert len(videos) == 12
+        assert yt.max_in_flight <= 4
+        # 24 requests of 0.1s each; serially this would take 2.4s
+        assert elapsed < 1.5
+
+def test_discover_videos_streams_results():
+    with FakeYouTube(make_channels(4), delay=0.05) as yt:
+        urls = [yt.channel_url(f"chan{c}") for c in range(4)]
+        stream = discover_videos(urls, START, END, DummyLogger(), max_workers=1)
+        first = next(stream)
+        # The first video arrives before the remaining channels have been fetched
+        assert len(yt.requests) < 8
+        rest = list(stream)
+        assert len(rest) == 3
+        assert first['video_id'] == "vid0x1"
+
+def test_rss_cache_skips_channel_pages(tmp_path):
+    cache_path = str(tmp_path / "rss_cache.json")
+    with FakeYouTube(make_channels(3)) as yt:
+        urls = [yt.channel_url(f"chan{c}") for c in range(3)] + [yt.channel_url("missing")]
+        first = check_for_new_videos(urls, START, END, DummyLogger(), rss_cache=RSSUrlCache(cache_path))
+        page_requests = [p for p in yt.requests if p.startswith("/@")]
+        assert len(page_requests) == 4
+
+        # A fresh cache object reads the file written by the first run
+        second = check_for_new_videos(urls, START, END, DummyLogger(), rss_cache=RSSUrlCache(cache_path))
+        page_requests = [p for p in yt.requests if p.startswith("/@")]
+        assert len(page_requests) == 4
+        assert [v['video_id'] for v in first] == [v['video_id'] for v in second]
+
+def test_rss_cache_expiry(tmp_path):
+    cache = RSSUrlCache(str(tmp_path / "rss_cache.json"), ttl=0.05, negative_ttl=0.0)
+    cache.set("https://www.youtube.com/@a", "https://feed/a")
+    cache.set("https://www.youtube.com/@b", None)
+    assert cache.get("https://www.youtube.com/@a") == (True, "https://feed/a")
+    time.sleep(0.06)
+    assert cache.get("https://www.youtube.com/@a") == (False, None)
+    assert cache.get("https://www.youtube.com/@b") == (False, None)
+
+def test_channel_id_url_needs_no_request():
+    rss_url = get_channel_rss_url("https://www.youtube.com/channel/UC0123456789abcdefghijkl")
+    assert rss_url == "https://www.youtube.com/feeds/videos.xml?channel_id=UC0123456789abcdefghijkl"
+
+class ChunkedSession:
+    """
+    Session stand-in whose page arrives in the given byte chunks, or fails with `error`.
+    """
+    def __init__(self, chunks=(), error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def get(self, url, timeout=None, stream=False):
+        if self.error:
+            raise self.error
+        session = self
+
+        class Response:
+            status_code = 200
+            encoding = "utf-8"
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc):
+                pass
+            def iter_content(self, chunk_size):
+                return iter(session.chunks)
+        return Response()
+
+def test_page_decoding_keeps_characters_split_across_chunks():
+    page = '<link rel="alternate" type="application/rss+xml" href="https://feeds.example/量子">'.encode("utf-8")
+    split = page.index("量".encode("utf-8")) + 1
+    rss_url = get_channel_rss_url("https://www.youtube.com/@a", session=ChunkedSession([page[:split], page[split:]]))
+    assert rss_url == "https://feeds.example/量子"
+
+def test_other_channels_ids_on_the_page_are_ignored():
+    foreign = '{"channelId":"UCforeignforeignforeign1","title":"Featured"}'
+    own = '{"metadata":{"externalId":"UC0123456789abcdefghijkl"}}'
+    session = ChunkedSession([foreign.encode("utf-8"), own.encode("utf-8")])
+    rss_url = get_channel_rss_url("https://www.youtube.com/@a", session=session)
+    assert rss_url == "https://www.youtube.com/feeds/videos.xml?channel_id=UC0123456789abcdefghijkl"
+
+    meta = '<meta itemprop="channelId" content="UC0123456789abcdefghijkl">'
+    session = ChunkedSession([foreign.encode("utf-8"), meta.encode("utf-8")])
+    assert get_channel_rss_url("https://www.youtube.com/@b", session=session) == rss_url
+
+    # A page with only other channels' IDs has no feed of its own
+    assert get_channel_rss_url("https://www.youtube.com/@c", session=ChunkedSession([foreign.encode("utf-8")])) is None
+
+def test_page_errors_go_to_the_logger():
+    logger = DummyLogger()
+    rss_url = get_channel_rss_url("https://www.youtube.com/@a", session=ChunkedSession(error=OSError("connection reset")),
+                                  logger=logger)
+    assert rss_url is None
+    assert logger.lines == ["[WARNING] Error fetching RSS URL for https://www.youtube.com/@a: connection reset"]
+
+def test_since_last_run_only_yields_unseen_videos(tmp_path):
+    state_path = str(tmp_path / "feed_state.json")
+    channels = make_channels(2)
+    with FakeYouTube(channels) as yt:
+        urls = [yt.channel_url(f"chan{c}") for c in range(2)]
+
+        # First poll without a window only records the baseline
+        videos = check_for_new_videos(urls, None, None, DummyLogger(), feed_state=FeedStateStore(state_path), since_last_run=True)
+        assert videos == []
+
+        # Nothing changed: both feeds answer 304 and are skipped
+        videos = check_for_new_videos(urls, None, None, DummyLogger(), feed_state=FeedStateStore(state_path), since_last_run=True)
+        assert videos == []
+        assert yt.not_modified == 2
+
+        # A new upload on one channel is the only thing reported
+        channels["chan1"].insert(0, ("fresh1", "Fresh upload", "2026-03-01T08:00:00+00:00"))
+        videos = check_for_new_videos(urls, None, None, DummyLogger(), feed_state=FeedStateStore(state_path), since_last_run=True)
+        assert [v['video_id'] for v in videos] == ["fresh1"]
+        assert yt.not_modified == 3
+
+        # Not processed yet (e.g. the download failed): handed out again, with a full fetch of its feed
+        videos = check_for_new_videos(urls, None, None, DummyLogger(), feed_state=FeedStateStore(state_path), since_last_run=True)
+        assert [v['video_id'] for v in videos] == ["fresh1"]
+        assert yt.not_modified == 4
+
+        # Once reported it is done with
+        feed_state = FeedStateStore(state_path)
+        feed_state.mark_seen(videos[0]['rss_url'], "fresh1")
+        feed_state.save()
+        videos = check_for_new_videos(urls, None, None, DummyLogger(), feed_state=FeedStateStore(state_path), since_last_run=True)
+        assert videos == []
+
+def test_since_last_run_first_poll_uses_window(tmp_path):
+    with FakeYouTube(make_channels(1)) as yt:
+        videos = check_for_new_videos([yt.channel_url("chan0")], START, END, DummyLogger(),
+                                      feed_state=FeedStateStore(str(tmp_path / "feed_state.json")), since_last_run=True)
+        assert [v['video_id'] for v in videos] == ["vid0x1"]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
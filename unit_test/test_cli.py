@@ -0,0 +1,87 @@
+import sys
+import os
+import datetime
+import subprocess
+import tempfile
+
+# Add parent directory to path to import utils
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from cli import build_parser, build_settings, main
+
+def test_startup_does_not_import_streamlit():
+    code = "import sys, cli; cli.build_parser(); assert 'streamlit' not in sys.modules, 'streamlit imported'"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+
+def test_settings_merge_config_and_arguments():
+    with tempfile.TemporaryDirectory() as tmp:
+        channels_file = os.path.join(tmp, "channels.txt")
+        with open(channels_file, "w", encoding="utf-8") as f:
+            f.write("# news\nhttps://www.youtube.com/@A\n\nhttps://www.youtube.com/@B\n")
+        args = build_parser().parse_args([
+            "run", "--channels-file", channels_file, "--channel", "https://www.youtube.com/@C",
+            "--backend", "ctranslate2", "--start", "2026-02-15", "--end", "2026-02-19T23:59",
+        ])
+        settings = build_settings(args, {"model_name": "mlx-community/whisper-tiny-mlp", "download_workers": 5, "unrelated": 1})
+
+    assert settings["channels"] == ["https://www.youtube.com/@C", "https://www.youtube.com/@A", "https://www.youtube.com/@B"]
+    assert settings["model_name"] == "mlx-community/whisper-tiny-mlp"
+    assert settings["download_workers"] == 5
+    assert settings["transcription_backend"] == "ctranslate2"
+    assert settings["start"] == datetime.datetime(2026, 2, 15)
+    assert settings["end"] == datetime.datetime(2026, 2, 19, 23, 59)
+    assert "unrelated" not in settings
+
+def test_missing_api_key_fails_fast():
+    with tempfile.TemporaryDirectory() as tmp:
+        old_key = os.environ.pop("GEMINI_API_KEY", None)
+        try:
+            code = main(["run", "--channel", "https://www.youtube.com/@A", "--config", os.path.join(tmp, "none.json"),
+                         "--log-file", os.path.join(tmp, "cli.log")])
+        finally:
+            if old_key is not None:
+                os.environ["GEMINI_API_KEY"] = old_key
+    assert code == 1
+
+def test_daemon_polls_with_its_own_window(tmp_path, monkeypatch):
+    import cli
+    import utils.pipeline
+    import utils.transcription_backends
+    from utils.transcription_backends import FakeBackend
+
+    polls = []
+    def fake_run_batch(settings, api_keys, logger, rss_cache=None, feed_state=None, cancel_event=None):
+        polls.append(dict(settings))
+        # Stop after the first poll
+        cancel_event.set()
+        return {"output_dir": None, "failed_live_videos": [], "unfinished_videos": 0}
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils.pipeline, "run_batch", fake_run_batch)
+    monkeypatch.setattr(utils.transcription_backends, "get_backend", lambda name, model_name: FakeBackend(model_name))
+    monkeypatch.setattr(cli.signal, "signal", lambda signum, handler: None)
+    code = main(["daemon", "--channel", "https://www.youtube.com/@A", "--api-keys", "k", "--lookback", "2",
+                 "--config", str(tmp_path / "none.json"), "--log-file", str(tmp_path / "cli.log")])
+
+    assert code == 0
+    assert len(polls) == 1
+    assert polls[0]["since_last_run"] is True
+    assert polls[0]["end"] - polls[0]["start"] == datetime.timedelta(hours=2)
+
+def test_run_without_videos_leaves_no_folder(tmp_path, monkeypatch):
+    import utils.channel_monitor
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils.channel_monitor, "discover_videos", lambda *args, **kwargs: iter([]))
+    output_dir = tmp_path / "output"
+    code = main(["run", "--channel", "https://www.youtube.com/@A", "--api-keys", "k", "--backend", "ctranslate2",
+                 "--output-dir", str(output_dir), "--config", str(tmp_path / "none.json"),
+                 "--log-file", str(tmp_path / "cli.log")])
+
+    assert code == 0
+    assert not [name for name in os.listdir(output_dir) if name.startswith("Trigger_")]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,195 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import CriticalError
+from utils.downloader import AUDIO_FORMATS, DownloadManager, DownloadResult, RetryQueue, get_download_manager
+from utils.pipeline import Pipeline, Stage
+
+class DummyLogger:
+    def __init__(self):
+        self.lines = []
+    def info(self, msg):
+        self.lines.append(f"[INFO] {msg}")
+    def warning(self, msg):
+        self.lines.append(f"[WARNING] {msg}")
+    def critical(self, msg):
+        # Like ConsoleLogger and UILogger, which stop the run
+        self.lines.append(f"[CRITICAL] {msg}")
+        raise CriticalError(msg)
+
+class AudioServer:
+    """
+    Serves /<name>.mp3 as a small audio/mpeg body, which yt-dlp's generic
+    extractor downloads as a direct file (no ffmpeg needed). Names starting
+    with "missing" are a 404.
+    """
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _headers(self, body):
+                self.send_response(404 if self.path.startswith("/missing") else 200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+            def do_HEAD(self):
+                self._headers(b"\0" * 4096)
+
+            def do_GET(self):
+                with server._lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    body = b"\0" * 4096
+                    self._headers(body)
+                    self.wfile.write(body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def test_download_keeps_native_container_and_reuses_ydl():
+    with AudioServer() as server, tempfile.TemporaryDirectory() as output_dir:
+        manager = DownloadManager(max_workers=1)
+        logger = DummyLogger()
+
+        first = manager.download(f"{server.base}/first.mp3", output_dir, logger)
+        ydl = manager._local.ydl
+        second = manager.download(f"{server.base}/second.mp3", output_dir, logger)
+
+        assert first.ok and second.ok
+        assert first.path == os.path.join(output_dir, "first.mp3")
+        assert second.path == os.path.join(output_dir, "second.mp3")
+        assert os.path.getsize(first.path) == 4096
+        # Same thread and output directory: the YoutubeDL instance is reused
+        assert manager._local.ydl is ydl
+        assert not any("[CRITICAL]" in line for line in logger.lines)
+
+def test_download_many_respects_max_workers():
+    with AudioServer(delay=0.2) as server, tempfile.TemporaryDirectory() as output_dir:
+        manager = DownloadManager(max_workers=2)
+        urls = [f"{server.base}/video{i}.mp3" for i in range(5)]
+
+        results = manager.download_many(urls, output_dir, DummyLogger())
+
+        assert [result.path for result in results] == [os.path.join(output_dir, f"video{i}.mp3") for i in range(5)]
+        assert server.max_in_flight == 2
+
+def test_failed_download_does_not_stop_the_others():
+    with AudioServer() as server, tempfile.TemporaryDirectory() as output_dir:
+        manager = DownloadManager(max_workers=2)
+        logger = DummyLogger()
+        urls = [f"{server.base}/first.mp3", f"{server.base}/missing.mp3", f"{server.base}/third.mp3"]
+
+        results = manager.download_many(urls, output_dir, logger)
+
+        assert [result.status for result in results] == [DownloadResult.OK, DownloadResult.FAILED, DownloadResult.OK]
+        assert "404" in results[1].error
+        assert any(line.startswith("[WARNING] Error downloading") for line in logger.lines)
+
+def test_audio_format_presets():
+    assert DownloadManager(audio_format="speech").audio_format == AUDIO_FORMATS["speech"]
+    assert DownloadManager(audio_format="best").audio_format == "bestaudio/best"
+    # Anything else is passed to yt-dlp as a raw format selector
+    assert DownloadManager(audio_format="140").audio_format == "140"
+    assert get_download_manager(2, "speech") is get_download_manager(2, "speech")
+
+def test_upcoming_live_event_returns_without_sleeping():
+    class UpcomingYDL:
+        def extract_info(self, url, download=True):
+            raise Exception("ERROR: [youtube] abc: This live event will begin in a few moments.")
+
+    manager = DownloadManager()
+    manager._get_ydl = lambda output_dir: UpcomingYDL()
+    with tempfile.TemporaryDirectory() as output_dir:
+        started = time.monotonic()
+        result = manager.download("https://www.youtube.com/watch?v=abc", output_dir, DummyLogger())
+
+    assert result.status == DownloadResult.LIVE_UPCOMING
+    assert "live event" in result.error
+    assert time.monotonic() - started < 1.0
+
+def test_retry_queue_backoff_and_horizon():
+    now = [100.0]
+    retries = RetryQueue(initial_delay=15, max_delay=60, horizon=120, clock=lambda: now[0])
+
+    assert [retries.delay(attempt) for attempt in range(1, 6)] == [15, 30, 60, 60, 60]
+    assert retries.schedule("a", 1, since=100.0) == 15
+    # 100 + 60 would be 160 s after the first failure at 0 s: beyond the horizon
+    assert retries.schedule("b", 4, since=0.0) is None
+    assert len(retries) == 1
+
+    now[0] = 115.0
+    drain = retries.drain()
+    assert next(drain) == "a"
+    # "a" is in flight again, so draining goes on until done() is called
+    retries.done()
+    assert list(drain) == []
+
+def test_deferred_items_do_not_block_the_pipeline():
+    retries = RetryQueue(initial_delay=0.05, max_delay=0.1, horizon=5)
+    attempts = {}
+    finished_at = {}
+    started = time.monotonic()
+
+    def download(item):
+        try:
+            name = item["name"]
+            attempts[name] = attempts.get(name, 0) + 1
+            # "live" only starts on its third attempt
+            if name == "live" and attempts[name] < 3:
+                retries.schedule({"name": name, "attempt": attempts[name]}, attempts[name], since=started)
+                item["status"] = "live_deferred"
+            return item
+        finally:
+            retries.done()
+
+    def work(item):
+        time.sleep(0.05)
+        finished_at[item["name"]] = time.monotonic() - started
+        return item
+
+    pipeline = Pipeline([Stage("download", download, 2), Stage("work", work, 2)], DummyLogger())
+
+    def items():
+        for name in ["live", "a", "b", "c"]:
+            retries.track()
+            yield {"name": name}
+        yield from retries.drain(stop=lambda: pipeline.stopping)
+
+    results = [(item["name"], item["status"]) for item in pipeline.run(items())]
+
+    assert results == [("live", "live_deferred"), ("a", "ok"), ("b", "ok"), ("c", "ok"),
+                       ("live", "live_deferred"), ("live", "ok")]
+    assert attempts["live"] == 3
+    # The other videos finished before the live event's retries did
+    assert max(finished_at[name] for name in "abc") < finished_at["live"]
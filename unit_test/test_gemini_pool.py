@@ -0,0 +1,180 @@
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import FakeGeminiClient
+from utils.gemini_pool import (GeminiPool, RetriesExhausted, TokenBucket, retry_after, classify_error,
+                               parse_model_limits, limits_for_model, DEFAULT_MODEL_LIMITS)
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+def fake_client(api_key, failures=None, latency=0.01):
+    """
+    A FakeGeminiClient that answers "<key>:<prompt>", so tests can see which key served a call.
+    """
+    return FakeGeminiClient(api_key, failures=failures, latency=latency,
+                            reply=lambda client, model, prompt: f"{client.api_key}:{prompt}")
+
+class DummyLogger:
+    def __init__(self):
+        self.lines = []
+    def info(self, msg):
+        self.lines.append(msg)
+    def warning(self, msg):
+        self.lines.append(msg)
+
+def make_pool(clients, **kwargs):
+    kwargs.setdefault("base_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.05)
+    return GeminiPool(list(clients), client_factory=lambda key: clients[key], **kwargs)
+
+def test_one_client_per_key_is_reused():
+    created = []
+    def factory(key):
+        created.append(key)
+        return fake_client(key)
+    pool = GeminiPool(["k0", "k1"], client_factory=factory)
+    for _ in range(4):
+        pool.generate_sync("models/gemini-2.5-flash-lite", "hi")
+    assert created == ["k0", "k1"]
+    pool.close()
+
+def test_429_moves_request_to_another_key():
+    clients = {
+        "k0": fake_client("k0", failures=[FakeAPIError(429, "RESOURCE_EXHAUSTED. Please retry in 30s.")]),
+        "k1": fake_client("k1"),
+    }
+    pool = make_pool(clients)
+    logger = DummyLogger()
+    info = {}
+    response = pool.generate_sync("models/gemini-2.5-flash", "hello", key_hint=0, logger=logger, info=info)
+
+    assert response.text == "k1:hello"
+    assert info == {"key_index": 1, "retries": 1}
+    assert any("429" in line for line in logger.lines)
+    # k0 is cooling down for the 30s the server asked for, so the next request skips it
+    assert pool.generate_sync("models/gemini-2.5-flash", "again", key_hint=0).text == "k1:again"
+    assert len(clients["k0"].calls) == 1
+    pool.close()
+
+def test_503_is_retried_with_backoff():
+    clients = {"k0": fake_client("k0", failures=[FakeAPIError(503, "UNAVAILABLE")] * 2)}
+    pool = make_pool(clients)
+    logger = DummyLogger()
+    info = {}
+    response = pool.generate_sync("models/gemini-2.5-pro", "x", logger=logger, info=info)
+    assert response.text == "k0:x"
+    assert info["retries"] == 2
+    assert sum("503" in line for line in logger.lines) == 2
+    pool.close()
+
+def test_retry_after_hint_is_honoured():
+    clients = {"k0": fake_client("k0", failures=[FakeAPIError(429, "{'retryDelay': '0.3s'}")])}
+    pool = make_pool(clients)
+    pool.generate_sync("models/gemini-2.5-flash", "x")
+    first, second = clients["k0"].calls
+    assert second[0] - first[0] >= 0.3
+    pool.close()
+
+def test_retries_exhausted():
+    clients = {"k0": fake_client("k0", failures=[FakeAPIError(503, "UNAVAILABLE")] * 10)}
+    pool = make_pool(clients, max_retries=3)
+    try:
+        pool.generate_sync("models/gemini-2.5-flash", "x")
+        assert False, "expected RetriesExhausted"
+    except RetriesExhausted:
+        pass
+    assert len(clients["k0"].calls) == 4
+    pool.close()
+
+def test_non_retryable_errors_are_raised():
+    clients = {"k0": fake_client("k0", failures=[FakeAPIError(400, "INVALID_ARGUMENT")])}
+    pool = make_pool(clients)
+    try:
+        pool.generate_sync("models/gemini-2.5-flash", "x")
+        assert False, "expected FakeAPIError"
+    except FakeAPIError:
+        pass
+    pool.close()
+
+def test_requests_spread_over_keys_by_capacity():
+    # 2 requests per minute per key: 6 requests only fit if all three keys are used
+    clients = {f"k{i}": fake_client(f"k{i}", latency=0.05) for i in range(3)}
+    pool = make_pool(clients, model_limits=[("flash", (2, 1000000))])
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        responses = list(executor.map(lambda n: pool.generate_sync("models/gemini-2.5-flash", f"p{n}"), range(6)))
+    elapsed = time.monotonic() - started
+
+    assert len(responses) == 6
+    assert [len(client.calls) for client in clients.values()] == [2, 2, 2]
+    # All six ran concurrently instead of one after another
+    assert elapsed < 0.25
+    pool.close()
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(60)  # one per second
+    now = time.monotonic()
+    for _ in range(60):
+        assert bucket.wait_time(1, now) == 0
+        bucket.consume(1, now)
+    assert 0.9 < bucket.wait_time(1, now) <= 1.0
+    assert bucket.wait_time(1, now + 1.0) == 0
+
+def test_errors_are_classified_by_status_code():
+    assert classify_error(FakeAPIError(429, "RESOURCE_EXHAUSTED")) == "quota"
+    assert classify_error(FakeAPIError(503, "UNAVAILABLE")) == "unavailable"
+    # The message alone decides nothing: a 400 mentioning quota is not retried
+    assert classify_error(FakeAPIError(400, "Invalid quota project in request 429")) is None
+    assert classify_error(ValueError("429 quota")) is None
+
+def test_rate_limits_are_configurable():
+    assert parse_model_limits("") is None
+    assert parse_model_limits("off") == [("", None)]
+    limits = parse_model_limits("flash=1000/4000000, pro=off")
+    assert limits_for_model("models/gemini-2.5-flash", limits) == (1000, 4000000)
+    assert limits_for_model("models/gemini-2.5-pro", limits) is None
+    # Patterns not mentioned keep their defaults
+    assert limits_for_model("models/gemini-2.5-flash-lite", parse_model_limits("pro=150")) == (15, 250000)
+    for bad in ("flash", "flash=fast", "flash=0"):
+        try:
+            parse_model_limits(bad)
+            assert False, f"expected ValueError for {bad!r}"
+        except ValueError:
+            pass
+
+def test_limits_are_per_request():
+    clients = {"k0": fake_client("k0", latency=0.0)}
+    pool = make_pool(clients)
+    try:
+        # Free tier: 10 RPM for flash, so without this run's own limits the 11th request would wait for minutes
+        unlimited = parse_model_limits("flash=off")
+        started = time.monotonic()
+        for n in range(12):
+            pool.generate_sync("models/gemini-2.5-flash", f"p{n}", model_limits=unlimited)
+        assert time.monotonic() - started < 3.0
+
+        # Another run sharing the keys keeps the default limits
+        pool.generate_sync("models/gemini-2.5-flash", "default")
+        limits = dict(DEFAULT_MODEL_LIMITS)["flash"]
+        requests_bucket, _ = pool.slots[0].buckets[("models/gemini-2.5-flash", limits)]
+        assert requests_bucket.tokens < requests_bucket.capacity
+        assert list(pool.slots[0].buckets) == [("models/gemini-2.5-flash", limits)]
+    finally:
+        pool.close()
+
+def test_retry_after_parsing():
+    assert retry_after(Exception("429 ... 'retryDelay': '17s'")) == 17.0
+    assert retry_after(Exception("Please retry in 2.5s.")) == 2.5
+    assert retry_after(Exception("503 UNAVAILABLE")) is None
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,54 @@
+import sys
+import os
+import subprocess
+
+# Add parent directory to path to import utils
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# What app.py and cli.py import on every Streamlit rerun / CLI start
+STARTUP_MODULES = ["utils.pipeline", "utils.jobs", "utils.config", "utils.logger", "cli"]
+
+# Must only be imported once a stage actually runs
+HEAVY_MODULES = ["yt_dlp", "numpy", "ffmpeg", "feedparser", "bs4", "requests", "dateutil",
+                 "google.genai", "mlx", "mlx_whisper", "faster_whisper", "streamlit"]
+
+# Cumulative import time of the startup modules, in microseconds. They take a few
+# tens of milliseconds today; eager heavy imports would cost several hundred.
+STARTUP_BUDGET_US = 250000
+
+def import_times(modules):
+    """
+    Runs a fresh interpreter with -X importtime and returns {module: cumulative microseconds}
+    for every module it imported, plus under None the total time of the top-level
+    imports of `modules` (interpreter startup such as site is left out).
+    """
+    code = "import " + ", ".join(modules)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+        # Nested imports are indented; their time is already in their importer's
+        if not name[1:].startswith(" ") and name.strip() in modules:
+            times[None] = times.get(None, 0) + int(cumulative)
+    return times
+
+def test_startup_does_not_import_heavy_dependencies():
+    times = import_times(STARTUP_MODULES)
+    loaded = [name for name in HEAVY_MODULES if name in times]
+    assert not loaded, f"imported at startup: {loaded}"
+
+def test_startup_import_time_budget():
+    # Best of three, to keep a busy machine from failing the test
+    best = min(import_times(STARTUP_MODULES)[None] for _ in range(3))
+    assert best < STARTUP_BUDGET_US, f"startup imports took {best / 1000:.0f} ms"
+
+if __name__ == "__main__":
+    times = import_times(STARTUP_MODULES)
+    print(f"{times.pop(None) / 1000:8.1f} ms  total")
+    for name, cumulative in sorted(times.items(), key=lambda entry: -entry[1])[:20]:
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
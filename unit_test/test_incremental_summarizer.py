@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import fake_keys
+from utils.summarizer import (IncrementalSummarizer, TranscriptSplitter, map_reduce_summary, split_transcript, summarize_transcript,
+                              prompt_transcript, resolve_mode, SINGLE_PROMPT_CHAR_LIMIT)
+
+class DummyLogger:
+    def __init__(self):
+        self.lines = []
+    def info(self, msg):
+        self.lines.append(msg)
+    warning = critical = info
+
+def make_segments(count, text="這是一段測試逐字稿。" * 50):
+    return [{"id": n, "start": n * 10.0, "end": n * 10.0 + 10.0, "text": text} for n in range(count)]
+
+def test_online_splitter_matches_split_transcript():
+    segments = make_segments(40)
+    splitter = TranscriptSplitter(2000)
+    chunks = []
+    for segment in segments:
+        chunks.extend(splitter.add(segment["text"], segment["start"], segment["end"]))
+    chunks.extend(splitter.finish())
+    assert chunks == split_transcript("", segments, 2000)
+    assert len(chunks) > 1
+
+def test_windows_start_before_finish_and_match_map_reduce():
+    segments = make_segments(40)
+    transcript = "".join(segment["text"] for segment in segments)
+
+    keys, client = fake_keys("incremental")
+    summarizer = IncrementalSummarizer(DummyLogger(), keys, mode="map_reduce", chunk_tokens=2000)
+    for segment in segments:
+        summarizer.add_segment(segment)
+    # All full windows were sent while "transcription" was still running
+    assert summarizer.started == len(split_transcript(transcript, segments, 2000)) - 1
+    result = summarizer.finish(transcript, "https://youtu.be/x", segments)
+    assert result["summary_content"]
+    assert result["detailed_transcript"] == transcript
+
+    reference_keys, reference_client = fake_keys("reference")
+    map_reduce_summary(transcript, DummyLogger(), reference_keys, "models/gemini-2.5-flash-lite", "models/gemini-2.5-pro",
+                       segments=segments, chunk_tokens=2000)
+    # Same windows, same prompts, so cached responses are shared between both paths
+    assert sorted(prompt for _, prompt in client.prompts[:-1]) == sorted(prompt for _, prompt in reference_client.prompts[:-1])
+
+def test_auto_mode_waits_for_long_transcripts():
+    segments = make_segments(3)
+    transcript = "".join(segment["text"] for segment in segments)
+    keys, client = fake_keys("short")
+    summarizer = IncrementalSummarizer(DummyLogger(), keys, mode="auto", chunk_tokens=200)
+    for segment in segments:
+        summarizer.add_segment(segment)
+    assert summarizer.started == 0
+    summarizer.finish(transcript, "https://youtu.be/x", segments)
+    # Short transcript: the usual abstract + summary calls only
+    assert len(client.prompts) == 2
+
+def test_auto_mode_measures_the_timestamped_prompt():
+    # Fits one prompt as plain text, but not once every line has its timestamp
+    segments = make_segments(160, text="這是一段測試逐字稿。" * 50)
+    segments[-1]["text"] = segments[-1]["text"][:400]
+    transcript = "".join(segment["text"] for segment in segments)
+    prompt_text = prompt_transcript(transcript, segments)[0]
+    assert len(transcript) <= SINGLE_PROMPT_CHAR_LIMIT < len(prompt_text)
+    assert resolve_mode(prompt_text, "auto") == "map_reduce"
+
+    keys, client = fake_keys("timestamped")
+    result = summarize_transcript(transcript, "https://youtu.be/x", DummyLogger(), api_keys=keys, segments=segments, mode="auto")
+    assert result["detailed_transcript"] == transcript
+    # Chunk notes and a reduce call, not one summary prompt with its end cut off
+    assert len(client.prompts) > 2
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
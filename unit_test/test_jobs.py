@@ -0,0 +1,116 @@
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.jobs import JobManager, DONE, FAILED, CANCELLED, INTERRUPTED
+from utils.channel_monitor import RSSUrlCache, FeedStateStore
+from utils.pipeline import Pipeline, Stage
+
+def make_manager(root, runner, **kwargs):
+    return JobManager(runner, root=root, rss_cache=RSSUrlCache(os.path.join(root, "rss.json")),
+                      feed_state=FeedStateStore(os.path.join(root, "feeds.json")), **kwargs)
+
+def wait_for(manager, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not manager.get(job_id).finished:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+def fake_run(settings, api_keys, logger, rss_cache=None, feed_state=None, cancel_event=None, on_progress=None):
+    for index in range(settings["videos"]):
+        if cancel_event.is_set():
+            break
+        video = {"title": f"video {index}", "link": f"https://youtu.be/{index}"}
+        on_progress(index, video, "download")
+        time.sleep(settings.get("delay", 0))
+        on_progress(index, video, "done")
+        logger.info(f"finished {index}")
+    return {"output_dir": settings["output_dir"], "failed_live_videos": []}
+
+def test_job_runs_in_background_and_is_persisted():
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = make_manager(tmp, fake_run)
+        job_id = manager.submit({"videos": 3, "output_dir": "out"}, ["secret-key"], label="three videos")
+        job = wait_for(manager, job_id)
+
+        assert job.status == DONE
+        assert [video["state"] for video in job.to_record()["videos"]] == ["done"] * 3
+        assert "finished 2" in job.logger.get_logs()
+        with open(os.path.join(tmp, f"{job_id}.json"), encoding="utf-8") as f:
+            record = json.load(f)
+        assert record["status"] == DONE
+        assert record["result"]["output_dir"] == "out"
+        # API keys stay in memory only
+        assert "secret-key" not in json.dumps(record)
+        manager.shutdown(wait=True)
+
+def test_cancel_stops_a_running_job():
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = make_manager(tmp, fake_run)
+        job_id = manager.submit({"videos": 100, "delay": 0.02, "output_dir": "out"}, ["k"])
+        while not manager.get(job_id).videos:
+            time.sleep(0.01)
+        assert manager.cancel(job_id)
+        job = wait_for(manager, job_id)
+        assert job.status == CANCELLED
+        assert len(job.videos) < 100
+        assert not manager.cancel(job_id)
+        manager.shutdown(wait=True)
+
+def test_runs_execute_concurrently():
+    with tempfile.TemporaryDirectory() as tmp:
+        barrier = threading.Barrier(2, timeout=2)
+        def runner(settings, api_keys, logger, **kwargs):
+            # Both runs must be active at the same time to get through the barrier
+            barrier.wait()
+            return {"output_dir": settings["output_dir"], "failed_live_videos": []}
+        manager = make_manager(tmp, runner, max_jobs=2)
+        first = manager.submit({"output_dir": "a"}, ["k"])
+        second = manager.submit({"output_dir": "b"}, ["k"])
+        assert wait_for(manager, first).status == DONE
+        assert wait_for(manager, second).status == DONE
+        manager.shutdown(wait=True)
+
+def test_failures_are_recorded():
+    with tempfile.TemporaryDirectory() as tmp:
+        def runner(settings, api_keys, logger, **kwargs):
+            logger.critical("Gemini API Key is missing.")
+        manager = make_manager(tmp, runner)
+        job = wait_for(manager, manager.submit({}, []))
+        assert job.status == FAILED
+        assert job.error == "Gemini API Key is missing."
+        manager.shutdown(wait=True)
+
+def test_unfinished_jobs_are_interrupted_after_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "old.json"), "w", encoding="utf-8") as f:
+            json.dump({"id": "old", "label": "old run", "status": "running", "videos": [{"index": 0, "title": "t", "state": "transcribe"}]}, f)
+        manager = make_manager(tmp, fake_run)
+        job = manager.get("old")
+        assert job.status == INTERRUPTED
+        assert job.videos[0]["state"] == "transcribe"
+        manager.shutdown(wait=True)
+
+def test_pipeline_cancel_drops_remaining_items():
+    cancel = threading.Event()
+    seen = []
+    def work(item):
+        seen.append(item["value"])
+        if item["value"] == 2:
+            cancel.set()
+        return item
+    pipeline = Pipeline([Stage("work", work)], logger=None, queue_size=1, cancel_event=cancel)
+    results = list(pipeline.run({"value": n} for n in range(50)))
+    assert [item["value"] for item in results] == [0, 1, 2]
+    assert len(seen) < 50
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,252 @@
+import sys
+import os
+import datetime
+import tempfile
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import fake_keys
+from utils.channel_monitor import FeedStateStore
+from utils.journal import RunJournal, find_unfinished_runs, DISCOVERED, DOWNLOADED, TRANSCRIBED, ABSTRACTED, SUMMARIZED, REPORTED
+from utils.logger import UILogger
+from utils.pipeline import process_videos
+from utils.transcriber import DECODE_OPTIONS
+from utils.transcript_store import TranscriptStore
+
+MODEL = "fake-whisper"
+
+def make_video(n):
+    return {
+        "video_id": f"vid{n}",
+        "title": f"Video {n}",
+        "channel_name": "Channel",
+        "link": f"https://www.youtube.com/watch?v=vid{n}",
+        "published": datetime.datetime(2026, 2, 15, 8, n),
+    }
+
+def cache_transcripts(store, videos):
+    # Cached transcripts stand in for download + Whisper
+    for video in videos:
+        store.put(video["video_id"], MODEL, dict(DECODE_OPTIONS, backend="fake"),
+                  {"text": f"transcript of {video['title']}", "segments": [{"start": 0.0, "end": 5.0, "text": video["title"]}]})
+
+def run(videos, output_dir, keys, journal, transcript_store=None, feed_state=None, ordered=True, logger=None):
+    return process_videos(
+        videos, output_dir, logger or UILogger(log_file=None), model_name=MODEL, api_keys=keys,
+        abstract_model="abstract-model", summary_model="summary-model",
+        transcript_store=transcript_store,
+        summarize_mode="single", backend="fake", journal=journal, feed_state=feed_state, ordered=ordered,
+    )
+
+def test_checkpoints_only_move_forward():
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = RunJournal.for_run(tmp)
+        video = make_video(1)
+        journal.start({"model_name": MODEL})
+        journal.add_video(video)
+        journal.add_video(video)
+        assert journal.state(video)["stage"] == DISCOVERED
+
+        journal.checkpoint(video, TRANSCRIBED, transcript={"text": "hi", "segments": []})
+        journal.checkpoint(video, ABSTRACTED, abstract="abstract")
+        # A late, older checkpoint keeps both the newer stage and the stored artifacts
+        journal.checkpoint(video, TRANSCRIBED)
+        state = journal.state(video)
+        assert state["stage"] == ABSTRACTED
+        assert state["transcript"] == {"text": "hi", "segments": []}
+        assert state["abstract"] == "abstract"
+        assert journal.videos()[0]["published"] == video["published"]
+        journal.close()
+
+        # Reopened as after a crash: the settings and entries are still there
+        journal = RunJournal.for_run(tmp)
+        assert journal.settings == {"model_name": MODEL}
+        assert journal.counts()[ABSTRACTED] == 1
+        journal.close()
+
+def test_failures_are_isolated_and_resume_skips_finished_work():
+    keys, client = fake_keys("journal-resume")
+    videos = [make_video(n) for n in range(3)]
+    client.broken.add(videos[1]["link"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TranscriptStore(os.path.join(tmp, "transcripts"))
+        cache_transcripts(store, videos)
+        run_dir = os.path.join(tmp, "Trigger_2026-02-15_08-00-00_SinceLastRun")
+        journal = RunJournal.for_run(run_dir)
+        journal.start({"model_name": MODEL})
+        # Discovery is journaled by run_batch; here the video list is complete up front
+        journal.discovery_done()
+
+        run(videos, run_dir, keys, journal, store)
+
+        # The failing summary only cost its own video
+        assert [journal.state(video)["stage"] for video in videos] == [REPORTED, TRANSCRIBED, REPORTED]
+        assert "malformed request" in journal.state(videos[1])["error"]
+        assert len([name for name in os.listdir(run_dir) if name.endswith(".md")]) == 2
+        assert find_unfinished_runs(tmp) == [(run_dir, 1)]
+
+        client.broken.clear()
+        calls_before = len(client.prompts)
+        run(journal.videos(), run_dir, keys, journal, store)
+
+        assert [journal.state(video)["stage"] for video in videos] == [REPORTED] * 3
+        # Only the unfinished video went back to Gemini (abstract + summary)
+        assert len(client.prompts) - calls_before == 2
+        assert find_unfinished_runs(tmp) == []
+
+        # Resuming a finished run says so instead of reporting an empty time period
+        logger = UILogger(log_file=None)
+        run(journal.videos(), run_dir, keys, journal, store, logger=logger)
+        assert "All 3 videos of this run were already reported." in logger.get_tail()
+        assert "No videos found" not in logger.get_tail()
+        journal.close()
+
+def test_only_reported_videos_are_marked_seen():
+    keys, client = fake_keys("journal-seen")
+    videos = [dict(make_video(n), rss_url="https://feed") for n in range(3)]
+    client.broken.add(videos[1]["link"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TranscriptStore(os.path.join(tmp, "transcripts"))
+        cache_transcripts(store, videos)
+        feed_state = FeedStateStore(os.path.join(tmp, "feed_state.json"))
+        feed_state.update("https://feed", pending_ids=[video["video_id"] for video in videos])
+
+        run(videos, tmp, keys, None, store, feed_state=feed_state)
+
+        # The failed video stays pending for the next poll, also for a fresh store reading the file
+        state = FeedStateStore(os.path.join(tmp, "feed_state.json")).get("https://feed")
+        assert state["seen"] == ["vid0", "vid2"]
+        assert state["pending"] == ["vid1"]
+
+def test_reports_follow_the_video_order_unless_asked_otherwise():
+    videos = [dict(make_video(n), rss_url="https://feed") for n in range(2)]
+
+    for ordered, expected in ((True, ["vid0", "vid1"]), (False, ["vid1", "vid0"])):
+        keys, client = fake_keys(f"journal-order-{ordered}")
+        # The first video's summary takes longest
+        client.slow.add(videos[0]["link"])
+        with tempfile.TemporaryDirectory() as tmp:
+            store = TranscriptStore(os.path.join(tmp, "transcripts"))
+            cache_transcripts(store, videos)
+            feed_state = FeedStateStore(os.path.join(tmp, "feed_state.json"))
+            feed_state.update("https://feed", pending_ids=[video["video_id"] for video in videos])
+
+            run(videos, tmp, keys, None, store, feed_state=feed_state, ordered=ordered)
+
+            assert feed_state.get("https://feed")["seen"] == expected
+
+def test_report_failure_only_affects_its_video(monkeypatch):
+    import utils.pipeline
+    keys, client = fake_keys("journal-report")
+    videos = [make_video(n) for n in range(3)]
+    write_report = utils.pipeline.write_report
+
+    def flaky_write_report(video, *args, **kwargs):
+        if video["video_id"] == "vid1":
+            raise OSError("disk full")
+        return write_report(video, *args, **kwargs)
+    monkeypatch.setattr(utils.pipeline, "write_report", flaky_write_report)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TranscriptStore(os.path.join(tmp, "transcripts"))
+        cache_transcripts(store, videos)
+        journal = RunJournal.for_run(tmp)
+        for video in videos:
+            journal.add_video(video)
+        journal.discovery_done()
+        run(videos, tmp, keys, journal, store)
+
+        states = [journal.state(video) for video in videos]
+        assert [state["stage"] for state in states] == [REPORTED, SUMMARIZED, REPORTED]
+        assert states[1]["error"] == "disk full"
+        assert journal.unfinished == 1
+        journal.close()
+
+def test_a_video_failing_after_transcription_closes_its_summarizer(monkeypatch):
+    import numpy as np
+    from utils.summarizer import IncrementalSummarizer
+    keys, client = fake_keys("journal-summarizer")
+    video = make_video(3)
+    closed = []
+    close = IncrementalSummarizer.close
+    def recording_close(self):
+        closed.append(self)
+        close(self)
+    monkeypatch.setattr(IncrementalSummarizer, "close", recording_close)
+
+    class FullStore:
+        def get(self, *args):
+            return None
+        def put(self, *args):
+            raise OSError("disk full")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = os.path.join(tmp, "vid3.m4a")
+        open(audio_path, "wb").close()
+        journal = RunJournal.for_run(tmp)
+        journal.add_video(video)
+        journal.checkpoint(video, DOWNLOADED, audio_path=audio_path)
+
+        process_videos(
+            [video], tmp, UILogger(log_file=None), model_name=MODEL, api_keys=keys,
+            abstract_model="abstract-model", summary_model="summary-model", transcript_store=FullStore(),
+            summarize_mode="auto", backend="fake", journal=journal,
+            audio_decoder=lambda path: np.ones(16000 * 20, dtype=np.float32),
+        )
+
+        assert journal.state(video)["error"] == "disk full"
+        assert len(closed) == 1
+        assert client.prompts == []
+        journal.close()
+
+def test_unchanged_journals_are_not_reopened(monkeypatch):
+    import utils.journal
+    opened = []
+
+    class CountingJournal(RunJournal):
+        def __init__(self, path, read_only=False):
+            opened.append(path)
+            super().__init__(path, read_only=read_only)
+    monkeypatch.setattr(utils.journal, "RunJournal", CountingJournal)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = os.path.join(tmp, "Trigger_a"), os.path.join(tmp, "Trigger_b")
+        journals = [RunJournal.for_run(path) for path in (first, second)]
+        for journal in journals:
+            journal.add_video(make_video(1))
+        assert find_unfinished_runs(tmp) == [(second, 1), (first, 1)]
+        opened.clear()
+
+        journals[0].add_video(make_video(2))
+        assert find_unfinished_runs(tmp) == [(second, 1), (first, 2)]
+        # Only the journal that changed was read again
+        assert [os.path.dirname(path) for path in opened] == [first]
+        for journal in journals:
+            journal.close()
+
+def test_resume_reuses_the_journaled_abstract():
+    keys, client = fake_keys("journal-abstract")
+    video = make_video(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = RunJournal.for_run(tmp)
+        journal.add_video(video)
+        journal.checkpoint(video, TRANSCRIBED, transcript={"text": "saved transcript", "segments": []})
+        journal.checkpoint(video, ABSTRACTED, abstract="saved abstract")
+
+        run([video], tmp, keys, journal)
+
+        assert [model for model, _ in client.prompts] == ["summary-model"]
+        assert "saved abstract" in client.prompts[0][1]
+        assert "saved transcript" in client.prompts[0][1]
+        state = journal.state(video)
+        assert state["stage"] == REPORTED
+        assert os.path.exists(state["report_path"])
+        journal.close()
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,72 @@
+import sys
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import UILogger, CriticalError, stop_file_sinks
+
+class FakeContainer:
+    def __init__(self):
+        self.renders = []
+    def code(self, text, language="text"):
+        self.renders.append(text)
+    def empty(self):
+        self.renders.append("")
+
+def test_console_updates_are_coalesced():
+    logger = UILogger(flush_interval=60.0, log_file=None)
+    container = FakeContainer()
+    logger.set_container(container)
+    for n in range(1000):
+        logger.info(f"line {n}")
+    # One update for the first line, the rest waits for the next interval
+    assert len(container.renders) == 1
+    logger.flush(force=True)
+    assert len(container.renders) == 2
+    assert container.renders[-1].endswith("line 999")
+
+def test_buffer_and_render_window_are_bounded():
+    logger = UILogger(max_lines=50, render_lines=10, flush_interval=0.0, log_file=None)
+    container = FakeContainer()
+    logger.set_container(container)
+    for n in range(200):
+        logger.info(f"line {n}")
+    assert len(logger.get_logs().splitlines()) == 50
+    shown = container.renders[-1].splitlines()
+    assert len(shown) == 11
+    assert shown[0].startswith("... 190 earlier lines")
+    assert shown[-1].endswith("line 199")
+
+def test_concurrent_logging_keeps_every_line():
+    logger = UILogger(flush_interval=0.0, log_file=None)
+    logger.set_container(FakeContainer())
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda n: logger.info(f"line {n}"), range(800)))
+    assert len(logger.get_logs().splitlines()) == 800
+
+def test_full_log_goes_to_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "logs", "app.log")
+        logger = UILogger(render_lines=5, log_file=path)
+        for n in range(20):
+            logger.warning(f"line {n}")
+        try:
+            logger.critical("stop")
+            assert False, "expected CriticalError"
+        except CriticalError:
+            pass
+        # Stopping the listener drains its queue
+        stop_file_sinks()
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    assert len(lines) == 21
+    assert "[WARNING] line 0" in lines[0]
+    assert "[CRITICAL] stop" in lines[-1]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
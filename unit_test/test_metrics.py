@@ -0,0 +1,89 @@
+import sys
+import os
+import tempfile
+import urllib.request
+
+import pytest
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import fake_keys
+from utils.metrics import MetricsRegistry, Tracer, load_trace, serve_metrics, summarize_spans, TRACE_FILE
+from utils.summarizer import call_gemini_with_retry
+
+class DummyLogger:
+    def __init__(self):
+        self.lines = []
+    def info(self, msg):
+        self.lines.append(f"[INFO] {msg}")
+    def warning(self, msg):
+        self.lines.append(f"[WARNING] {msg}")
+    def critical(self, msg):
+        self.lines.append(f"[CRITICAL] {msg}")
+
+class QuotaError(Exception):
+    code = 429
+
+def test_spans_nest_record_errors_and_export():
+    registry = MetricsRegistry()
+    with tempfile.TemporaryDirectory() as tmp:
+        tracer = Tracer.for_run(tmp, registry=registry)
+        with tracer.span("download", video_id="a") as download:
+            tracer.annotate(bytes=2048)
+        with tracer.span("transcribe", video_id="a") as transcribe:
+            with tracer.span("gemini", model="flash", prompt_tokens=10) as gemini:
+                gemini.set(response_tokens=5, key_index=1, retries=2)
+            transcribe.set(audio_seconds=60.0)
+        with pytest.raises(ValueError):
+            with tracer.span("download", video_id="b"):
+                raise ValueError("boom")
+        tracer.close()
+
+        records = load_trace(os.path.join(tmp, TRACE_FILE))
+
+    assert [record["name"] for record in records] == ["download", "gemini", "transcribe", "download"]
+    assert records[1]["parent"] == transcribe.id
+    assert records[0]["attrs"]["bytes"] == 2048
+    assert records[3]["attrs"]["error"] == "ValueError: boom"
+    assert all(record["wall"] >= 0 and record["cpu"] >= 0 for record in records)
+
+    rows = {row["span"]: row for row in summarize_spans(records)}
+    assert list(rows) == ["download", "gemini", "transcribe"]
+    assert (rows["download"]["count"], rows["download"]["errors"], rows["download"]["bytes"]) == (2, 1, 2048)
+    assert rows["transcribe"]["rtf"] == pytest.approx(transcribe.wall / 60.0)
+    assert rows["download"]["rtf"] is None
+
+    text = registry.render()
+    assert 'ytsummarizer_spans_total{span="download"} 2' in text
+    assert 'ytsummarizer_span_errors_total{span="download"} 1' in text
+    assert 'ytsummarizer_retries_total{span="gemini"} 2' in text
+    assert 'ytsummarizer_gemini_calls_total{model="flash",key_index="1"} 1' in text
+
+    server = serve_metrics(0, registry=registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.read().decode() == registry.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_gemini_calls_record_key_retries_and_tokens():
+    # Every call gets a 429 until the failures run out
+    quota_error = QuotaError("429 RESOURCE_EXHAUSTED. Please retry in 0.01s.")
+    keys, client = fake_keys("metrics", count=2, failures=[quota_error] * 2, reply=lambda client, model, prompt: "回應內容")
+    tracer = Tracer(registry=MetricsRegistry())
+
+    with tracer.span("summarize"):
+        response = call_gemini_with_retry(keys, "models/gemini-2.5-flash", "請摘要", DummyLogger(), tracer=tracer)
+
+    assert response.text == "回應內容"
+    summarize, gemini = sorted(tracer.records(), key=lambda record: record["id"])
+    assert gemini["parent"] == summarize["id"]
+    assert gemini["attrs"]["retries"] == 2
+    assert gemini["attrs"]["key_index"] in (0, 1)
+    # No usage metadata on the fake response: both counts are estimates (one token per CJK character)
+    assert (gemini["attrs"]["prompt_tokens"], gemini["attrs"]["response_tokens"]) == (3, 4)
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
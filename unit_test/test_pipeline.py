@@ -0,0 +1,142 @@
+import sys
+import os
+import threading
+import time
+
+import pytest
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.pipeline import Pipeline, Stage, is_finished_state
+
+def make_items(count):
+    return [{"n": n} for n in range(count)]
+
+def test_results_come_out_in_input_order():
+    def work(item):
+        # Later items finish first
+        time.sleep(0.02 * (5 - item["n"]))
+        item["done"] = True
+        return item
+
+    pipeline = Pipeline([Stage("work", work, workers=5)], logger=None)
+    results = list(pipeline.run(make_items(5)))
+
+    assert [item["n"] for item in results] == [0, 1, 2, 3, 4]
+    assert all(item["done"] for item in results)
+
+def test_unordered_results_follow_the_stage_priority():
+    busy = threading.Event()
+    gate = threading.Event()
+
+    def second(item):
+        if item["n"] == 0:
+            # Busy with the first item while the others queue up
+            busy.set()
+            gate.wait(5)
+        return item
+
+    def first(item):
+        if item["n"] > 0:
+            busy.wait(5)
+        return item
+
+    items = [{"n": n, "length": length} for n, length in enumerate([50, 900, 10, 300])]
+    stages = [Stage("first", first), Stage("second", second, priority=lambda item: item["length"])]
+    pipeline = Pipeline(stages, logger=None, queue_size=4, ordered=False)
+    results = []
+    consumer = threading.Thread(target=lambda: results.extend(pipeline.run(items)))
+    consumer.start()
+    deadline = time.monotonic() + 5
+    while pipeline._queues[1].qsize() < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    consumer.join(5)
+
+    # Shortest first among the waiting ones, each yielded as soon as it is done
+    assert [item["n"] for item in results] == [0, 2, 3, 1]
+
+def test_bounded_queues_hold_back_the_source():
+    release = threading.Event()
+    pulled = []
+
+    def source():
+        for item in make_items(20):
+            pulled.append(item["n"])
+            yield item
+
+    def work(item):
+        release.wait(5)
+        return item
+
+    pipeline = Pipeline([Stage("work", work, workers=1)], logger=None, queue_size=2)
+    results = []
+    consumer = threading.Thread(target=lambda: results.extend(pipeline.run(source())))
+    consumer.start()
+    time.sleep(0.3)
+    # One item in the worker, two in the queue and one waiting in the feeder's put
+    assert len(pulled) <= 4
+    release.set()
+    consumer.join(5)
+    assert len(results) == 20
+
+def test_stages_overlap():
+    second_item_started = threading.Event()
+
+    def first(item):
+        if item["n"] == 1:
+            second_item_started.set()
+        return item
+
+    def second(item):
+        if item["n"] == 0:
+            # Only returns in time if the first stage keeps going meanwhile
+            item["overlapped"] = second_item_started.wait(5)
+        return item
+
+    pipeline = Pipeline([Stage("first", first), Stage("second", second)], logger=None)
+    results = list(pipeline.run(make_items(3)))
+
+    assert results[0]["overlapped"] is True
+
+def test_dropped_items_skip_later_stages():
+    def first(item):
+        if item["n"] == 1:
+            item["status"] = "skipped"
+        return item
+
+    def second(item):
+        item["second"] = True
+        return item
+
+    results = list(Pipeline([Stage("first", first), Stage("second", second)], logger=None).run(make_items(3)))
+
+    assert [item["status"] for item in results] == ["ok", "skipped", "ok"]
+    assert "second" not in results[1] and results[2]["second"]
+
+def test_stage_error_stops_the_run_and_is_raised():
+    started = []
+
+    def work(item):
+        started.append(item["n"])
+        if item["n"] == 2:
+            raise ValueError("broken item")
+        return item
+
+    pipeline = Pipeline([Stage("work", work)], logger=None, queue_size=1)
+    with pytest.raises(ValueError, match="broken item"):
+        list(pipeline.run(make_items(100)))
+
+    # Nothing after the failure is started, and no thread is left behind
+    assert len(started) < 10
+    assert not any(thread.is_alive() for thread in pipeline._threads)
+
+def test_only_terminal_progress_states_count_as_finished():
+    in_progress = ["queued", "download", "decode", "transcribe", "summarize", "live_deferred"]
+    finished = ["done", "download_failed", "decode_failed", "summarize_failed", "report_failed", "live_upcoming"]
+    assert not any(is_finished_state(state) for state in in_progress)
+    assert all(is_finished_state(state) for state in finished)
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import fake_keys
+from utils.logger import UILogger
+from utils.summarizer import ResponseCache, call_gemini_with_retry, summarize_transcript
+
+def test_round_trip_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get("model-a", "prompt") is None
+
+    cache.put("model-a", "prompt", "answer")
+    # Another instance on the same folder, as in the next run
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get("model-a", "prompt").text == "answer"
+    # The model is part of the key
+    assert cache.get("model-b", "prompt") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_hit_skips_the_network(tmp_path):
+    keys, client = fake_keys("response-cache-hit")
+    cache = ResponseCache(str(tmp_path))
+    logger = UILogger(log_file=None)
+
+    first = call_gemini_with_retry(keys, "model-a", "summarize this", logger, cache=cache)
+    second = call_gemini_with_retry(keys, "model-a", "summarize this", logger, cache=cache)
+
+    assert len(client.prompts) == 1
+    assert second.text == first.text == "model-a answer 1"
+    # A different prompt is a miss and goes out
+    call_gemini_with_retry(keys, "model-a", "summarize that", logger, cache=cache)
+    assert len(client.prompts) == 2
+
+def test_rerun_costs_no_api_calls(tmp_path):
+    keys, client = fake_keys("response-cache-rerun")
+    transcript = "今天我們來談談量子計算的最新進展。" * 20
+
+    def summarize():
+        return summarize_transcript(transcript, "https://www.youtube.com/watch?v=x", UILogger(log_file=None),
+                                    api_keys=keys, abstract_model="abstract-model", summary_model="summary-model",
+                                    cache=ResponseCache(str(tmp_path)), mode="single")
+
+    first = summarize()
+    calls = len(client.prompts)
+    assert calls > 0
+
+    second = summarize()
+    assert len(client.prompts) == calls
+    assert second["summary_content"] == first["summary_content"]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+import sys
+import os
+import datetime
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cli import main
+from utils.pipeline import write_report
+from utils.search_index import SearchIndex, build_query
+from utils.segments import SegmentStore
+
+SEGMENTS = [
+    {"start": 0.0, "end": 8.0, "text": "大家好，歡迎收看本週的科技新聞。"},
+    {"start": 8.0, "end": 17.0, "text": "今天我們來談談量子計算的最新進展。"},
+    {"start": 17.0, "end": 29.0, "text": "另外 Python 3.14 也正式發布了。"},
+    {"start": 41.0, "end": 50.0, "text": "最後是半導體產業的消息。"},
+]
+
+def make_report(output_root, run, title, channel, published, segments=SEGMENTS, summary="本集重點：量子計算與半導體。"):
+    run_dir = os.path.join(output_root, run)
+    os.makedirs(run_dir, exist_ok=True)
+    video = {"title": title, "channel_name": channel, "published": published, "link": f"https://www.youtube.com/watch?v={title}"}
+    store = SegmentStore.from_segments(segments)
+    report_path = write_report(video, {"summary_content": summary, "detailed_transcript": store.text}, run_dir, segments=store)
+    return report_path, video, summary, store
+
+def test_cjk_terms_hit_the_segment_they_were_said_in(tmp_path):
+    index = SearchIndex.for_output(str(tmp_path))
+    report_path, video, summary, store = make_report(str(tmp_path), "Trigger_a", "v1", "科技頻道", datetime.datetime(2026, 2, 15, 8, 0))
+    index.add_report(report_path, video, summary, segments=store)
+
+    assert build_query('量子 "py*') == '"量  子" "py"*'
+    hits = index.search("量子計算")
+    transcript_hit = [hit for hit in hits if hit["kind"] == "transcript"][0]
+    # The first paragraph holds three segments; the match is in the second one
+    assert transcript_hit["start"] == 8.0
+    assert transcript_hit["link"] == "https://www.youtube.com/watch?v=v1&t=8s"
+    assert "[量子計算]" in transcript_hit["snippet"]
+    assert {hit["kind"] for hit in hits} == {"summary", "transcript"}
+
+    # Words must appear as written: characters of a term have to be adjacent
+    assert index.search("量計") == []
+    assert index.search("半導體")[0]["channel"] == "科技頻道"
+    assert index.search("pyth*")[0]["start"] == 17.0
+    assert [hit["start"] for hit in index.search("產業")] == [41.0]
+
+def test_time_and_channel_filters(tmp_path):
+    index = SearchIndex.for_output(str(tmp_path))
+    for title, channel, day in (("a", "Alpha", 14), ("b", "Beta", 15), ("c", "Alpha", 16)):
+        index.add_report(*make_report(str(tmp_path), "Trigger_a", title, channel, datetime.datetime(2026, 2, day, 8, 0)))
+
+    def titles(**filters):
+        return sorted({hit["title"] for hit in index.search("半導體", **filters)})
+
+    assert titles() == ["a", "b", "c"]
+    assert titles(channels=["Alpha"]) == ["a", "c"]
+    assert titles(start=datetime.datetime(2026, 2, 15), end="2026-02-15T23:59:59") == ["b"]
+    # Time zones are dropped, as in the reports' upload times
+    assert titles(start=datetime.datetime(2026, 2, 16, tzinfo=datetime.timezone.utc)) == ["c"]
+    assert index.channels() == ["Alpha", "Beta"]
+
+def test_sync_backfills_updates_and_drops_reports(tmp_path):
+    output_root = str(tmp_path)
+    first_path, _, _, _ = make_report(output_root, "Trigger_a", "v1", "Alpha", datetime.datetime(2026, 2, 15, 8, 0))
+    # A report from before segment files existed: indexed from its markdown
+    second_path, video, summary, _ = make_report(output_root, "Trigger_b", "v2", "Beta", datetime.datetime(2026, 2, 16, 8, 0))
+    os.remove(os.path.splitext(second_path)[0] + ".segments")
+
+    index = SearchIndex.for_output(output_root)
+    assert index.sync() == 2
+    assert index.sync() == 0
+    assert len(index) == 2
+    hit = [hit for hit in index.search("量子計算", channels=["Beta"]) if hit["kind"] == "transcript"][0]
+    assert hit["start"] == 0.0 and hit["published"] == "2026-02-16 08:00:00"
+    assert index.search("科技新聞", channels=["Alpha"])[0]["start"] == 0.0
+
+    # Indexing a report again replaces its entries
+    make_report(output_root, "Trigger_a", "v1", "Alpha", datetime.datetime(2026, 2, 15, 8, 0), summary="改談電動車。")
+    os.utime(first_path, (0, 1))
+    assert index.sync() == 1
+    assert index.search("電動車")[0]["report_path"] == first_path
+    assert [hit["title"] for hit in index.search("重點")] == ["v2"]
+
+    os.remove(second_path)
+    index.sync()
+    assert len(index) == 1 and index.search("v2") == []
+    index.close()
+
+def test_cli_search(tmp_path, capsys):
+    make_report(str(tmp_path), "Trigger_a", "v1", "Alpha", datetime.datetime(2026, 2, 15, 8, 0))
+
+    code = main(["search", "產業", "--output-dir", str(tmp_path), "--config", str(tmp_path / "none.json")])
+    output = capsys.readouterr().out
+    assert code == 0
+    assert "Alpha - v1" in output and "[00:41]" in output and "t=41s" in output
+    assert main(["search", "不存在", "--output-dir", str(tmp_path), "--channel", "Alpha",
+                 "--config", str(tmp_path / "none.json")]) == 1
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,68 @@
+import sys
+import os
+import math
+import datetime
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.pipeline import write_report
+from utils.segments import SegmentStore, segments_path
+from utils.summarizer import split_transcript
+
+def make_segments(count, seconds=10.0):
+    return [
+        {"start": n * seconds, "end": (n + 1) * seconds, "text": f"第{n}段逐字稿。", "avg_logprob": None if n == 1 else -0.25, "tokens": [1, 2]}
+        for n in range(count)
+    ]
+
+def test_round_trip_through_the_binary_file(tmp_path):
+    store = SegmentStore.from_segments(make_segments(5))
+    path = str(tmp_path / "report.segments")
+    store.save(path)
+
+    loaded = SegmentStore.load(path)
+    assert loaded == store
+    assert len(loaded) == 5
+    assert loaded.text == "".join(segment["text"] for segment in make_segments(5))
+    assert loaded[2].text == "第2段逐字稿。"
+    assert (loaded[2].start, loaded[2].end, loaded[2].avg_logprob) == (20.0, 30.0, -0.25)
+    # Unknown log probabilities survive as None
+    assert loaded[1].avg_logprob is None and math.isnan(loaded.logprobs[1])
+    assert loaded.to_dicts()[4] == {"start": 40.0, "end": 50.0, "text": "第4段逐字稿。", "avg_logprob": -0.25}
+
+def test_time_slicing():
+    store = SegmentStore.from_segments(make_segments(6))
+
+    assert store.index_at(0.0) == 0
+    assert store.index_at(25.0) == 2
+    assert [segment.start for segment in store.between(15.0, 35.0)] == [10.0, 20.0, 30.0]
+    # A segment ending exactly at the start of the range is not part of it
+    assert [segment.start for segment in store.between(20.0, 30.0)] == [20.0]
+    assert len(store.between(100.0, 200.0)) == 0
+    assert store.duration == 60.0
+
+def test_segments_read_like_whisper_dicts():
+    segments = make_segments(40)
+    store = SegmentStore.from_segments(segments)
+
+    assert store[0].get("text", "") == segments[0]["text"]
+    assert split_transcript("", store, 20) == split_transcript("", segments, 20)
+
+def test_report_gets_timestamps_and_a_segment_file(tmp_path):
+    video = {"title": "Video", "channel_name": "Channel", "link": "https://youtu.be/x", "published": datetime.datetime(2026, 2, 15, 8, 0)}
+    store = SegmentStore.from_segments(make_segments(7))
+    summary_data = {"summary_content": "summary", "detailed_transcript": store.text}
+
+    report_path = write_report(video, summary_data, str(tmp_path), segments=store)
+
+    with open(report_path, encoding="utf-8") as f:
+        report = f.read()
+    # A new timestamped line every 30 seconds
+    assert "[00:00] 第0段逐字稿。第1段逐字稿。第2段逐字稿。\n\n[00:30] 第3段逐字稿。" in report
+    assert "[01:00] 第6段逐字稿。" in report
+    assert SegmentStore.load(segments_path(report_path)) == store
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
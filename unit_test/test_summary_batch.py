@@ -0,0 +1,76 @@
+import sys
+import os
+import re
+import threading
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import fake_keys
+from utils.summarizer import SummaryBatch, plan_summaries, summarize_batch
+
+class DummyLogger:
+    def __init__(self):
+        self.lines = []
+    def info(self, msg):
+        self.lines.append(msg)
+    warning = critical = info
+
+def make_job(name, length):
+    return {"transcript_text": f"{name} " + "字" * length, "video_link": f"https://youtu.be/{name}"}
+
+def test_long_transcripts_are_spread_over_the_keys():
+    # Round-robin by position would put both long transcripts on key 0
+    jobs = [make_job("a", 900), make_job("b", 50), make_job("c", 800), make_job("d", 60)]
+    planned = plan_summaries(jobs, num_keys=2, mode="single")
+
+    assert [job["video_link"][-1] for job in planned] == ["b", "d", "c", "a"]
+    keys = {job["video_link"][-1]: job["plan"]["key_index"] for job in planned}
+    assert {keys["a"], keys["c"]} == {0, 1}
+    assert all(job["plan"]["model"] == "models/gemini-2.5-pro" for job in planned)
+
+def test_batch_starts_the_shortest_transcript_of_the_run_first():
+    keys, client = fake_keys("batch-order", count=2)
+    jobs = [make_job("a", 300), make_job("b", 10), make_job("c", 100)]
+
+    done = list(summarize_batch(jobs, DummyLogger(), keys, mode="single", max_concurrency=1))
+
+    assert [job["video_link"] for job in done] == ["https://youtu.be/b", "https://youtu.be/c", "https://youtu.be/a"]
+    assert all(job["summary"]["summary_content"] for job in done)
+    # Each job's abstract prompt names its video; they went out in the same order
+    abstract_prompts = [prompt for model, prompt in client.prompts if model == "models/gemini-2.5-flash-lite"]
+    assert [re.search(r"youtu\.be/(\w+)", prompt).group(1) for prompt in abstract_prompts] == ["b", "c", "a"]
+
+def test_results_are_yielded_as_they_complete():
+    keys, client = fake_keys("batch-complete")
+    client.slow.add("slow-video")
+    # The slow one is shorter, so it starts first, but the other one finishes first
+    jobs = [make_job("slow-video", 10), make_job("fast", 50)]
+
+    done = [job["video_link"] for job in summarize_batch(jobs, DummyLogger(), keys, mode="single", max_concurrency=2)]
+
+    assert done == ["https://youtu.be/fast", "https://youtu.be/slow-video"]
+
+def test_cancel_drops_waiting_jobs_and_closes_their_summarizers():
+    class FakeSummarizer:
+        key_index = 0
+        closed = False
+        def close(self):
+            self.closed = True
+
+    keys, client = fake_keys("batch-cancel")
+    cancel = threading.Event()
+    cancel.set()
+    batch = SummaryBatch(DummyLogger(), keys, cancel_event=cancel)
+    summarizer = FakeSummarizer()
+    job = dict(make_job("a", 10), summarizer=summarizer)
+    batch.submit(job)
+    batch.close()
+
+    assert list(batch.results()) == []
+    assert summarizer.closed
+    assert client.prompts == []
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,53 @@
+import sys
+import os
+import time
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.transcript_store import TranscriptStore
+
+DECODE_OPTIONS = {"temperature": (0.0, 0.2), "compression_ratio_threshold": 2.4}
+
+def make_result(text):
+    return {
+        "text": text,
+        "segments": [{"start": 0.0, "end": 2.5, "text": text, "avg_logprob": -0.2, "tokens": [1, 2, 3]}],
+    }
+
+def test_round_trip_keeps_text_and_segments(tmp_path):
+    store = TranscriptStore(str(tmp_path))
+    store.put("abc123", "mlx-community/whisper-large-v3-turbo", DECODE_OPTIONS, make_result("你好"))
+
+    cached = TranscriptStore(str(tmp_path)).get("abc123", "mlx-community/whisper-large-v3-turbo", DECODE_OPTIONS)
+    assert cached["text"] == "你好"
+    assert cached["segments"] == [{"start": 0.0, "end": 2.5, "text": "你好", "avg_logprob": -0.2}]
+
+def test_key_includes_model_and_decode_options(tmp_path):
+    store = TranscriptStore(str(tmp_path))
+    store.put("abc123", "model-a", DECODE_OPTIONS, make_result("a"))
+
+    assert store.get("abc123", "model-b", DECODE_OPTIONS) is None
+    assert store.get("abc123", "model-a", {"temperature": (0.0,)}) is None
+    assert store.get("abc123", "model-a", DECODE_OPTIONS)["text"] == "a"
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 2
+
+def test_least_recently_used_is_evicted(tmp_path):
+    store = TranscriptStore(str(tmp_path), max_bytes=2500)
+    for video_id in ("v0", "v1"):
+        store.put(video_id, "m", DECODE_OPTIONS, make_result("x" * 500))
+        time.sleep(0.02)
+    # Touch v0 so v1 becomes the oldest entry
+    assert store.get("v0", "m", DECODE_OPTIONS)
+    time.sleep(0.02)
+    store.put("v2", "m", DECODE_OPTIONS, make_result("x" * 500))
+
+    assert store.get("v0", "m", DECODE_OPTIONS) is not None
+    assert store.get("v1", "m", DECODE_OPTIONS) is None
+    assert store.get("v2", "m", DECODE_OPTIONS) is not None
+    assert store.stats()["bytes"] <= 2500
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
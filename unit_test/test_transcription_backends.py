@@ -0,0 +1,182 @@
+import sys
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.audio import SAMPLE_RATE
+from utils import transcriber
+from utils.transcriber import (transcribe, stream_transcription, stitch_segments, CHUNKED_MIN_DURATION, SEGMENTLESS_CHUNK_SECONDS,
+                               TranscriptionProgress)
+from utils.transcription_backends import FakeBackend, get_backend, ctranslate2_model_name
+
+class DummyLogger:
+    def __init__(self):
+        self.lines = []
+    def info(self, msg):
+        self.lines.append(msg)
+    def critical(self, msg):
+        self.lines.append(msg)
+
+class CountingBackend(FakeBackend):
+    name = "counting"
+
+    def __init__(self, model_name, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.loads = 0
+
+    def _load(self):
+        self.loads += 1
+
+class SilentBackend(FakeBackend):
+    """
+    Like mlx-whisper: no segments until the whole decode returns.
+    """
+    name = "silent"
+    reports_segments = False
+
+    def transcribe(self, audio, decode_options, on_segment=None):
+        return super().transcribe(audio, decode_options)
+
+def noise(seconds, seed=0):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, int(seconds * SAMPLE_RATE)).astype(np.float32)
+
+def test_get_backend_reuses_instance():
+    first = get_backend("fake", "model-a")
+    assert get_backend("fake", "model-a") is first
+    assert get_backend("fake", "model-b") is not first
+    try:
+        get_backend("nope", "model-a")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+def test_model_is_loaded_once():
+    backend = CountingBackend("model")
+    logger = DummyLogger()
+    for _ in range(3):
+        assert transcribe(noise(12), "model", logger, backend=backend)["text"]
+    assert backend.loads == 1
+    assert backend.calls == 3
+
+def test_short_buffer_is_one_decode():
+    backend = FakeBackend("model")
+    result = transcribe(noise(12), "model", DummyLogger(), backend=backend)
+    assert backend.calls == 1
+    assert [segment["start"] for segment in result["segments"]] == [0.0, 5.0, 10.0]
+    assert result["text"] == " segment 0 segment 5000 segment 10000"
+
+def test_backend_without_segment_hook_logs_a_heartbeat(monkeypatch):
+    monkeypatch.setattr(transcriber, "PROGRESS_LOG_INTERVAL", 0.05)
+    backend = SilentBackend("model", seconds_per_audio_second=0.03)
+    logger = DummyLogger()
+    events = []
+    result = transcribe(noise(12), "model", logger, backend=backend, on_segment=events.append)
+
+    assert any(line.startswith("Transcribing: still decoding 12.0 seconds") for line in logger.lines)
+    # The segments still reach the caller once the decode is done
+    assert [event.start for event in events] == [segment["start"] for segment in result["segments"]] == [0.0, 5.0, 10.0]
+
+def test_backend_without_segment_hook_reports_chunk_by_chunk():
+    backend = SilentBackend("model")
+    logger = DummyLogger()
+    events = []
+    result = transcribe(noise(3 * SEGMENTLESS_CHUNK_SECONDS), "model", logger, chunk_workers=1, backend=backend,
+                        on_segment=events.append)
+
+    # Well below CHUNKED_MIN_DURATION, but one decode per chunk, each reported as it finishes
+    assert backend.calls == 3
+    assert sum(line.startswith("Transcribed chunk") for line in logger.lines) == 3
+    assert [event.start for event in events] == [segment["start"] for segment in result["segments"]]
+    assert result["segments"][-1]["end"] > 2 * SEGMENTLESS_CHUNK_SECONDS
+
+def test_long_buffer_is_chunked_and_stitched():
+    audio = noise(CHUNKED_MIN_DURATION + 300)
+    # Silence near the 600s mark gives the splitter a clean cut
+    audio[int(598 * SAMPLE_RATE):int(602 * SAMPLE_RATE)] = 0
+    backend = FakeBackend("model", segment_seconds=10.0)
+    result = transcribe(audio, "model", DummyLogger(), chunk_workers=2, backend=backend)
+
+    assert backend.calls > 1
+    starts = [segment["start"] for segment in result["segments"]]
+    assert starts == sorted(starts)
+    # No gaps or overlaps bigger than a segment across chunk boundaries
+    for previous, segment in zip(result["segments"], result["segments"][1:]):
+        assert segment["start"] >= previous["end"] - 0.5
+        assert segment["start"] - previous["end"] < 10.0
+    assert result["segments"][-1]["end"] > CHUNKED_MIN_DURATION
+
+def test_stitching_trims_overlap_instead_of_dropping_segments():
+    chunks = [{"offset": 0.0, "start": 0.0, "end": 600.0}, {"offset": 590.0, "start": 600.0, "end": 1200.0}]
+    first = {"segments": [{"start": 580.0, "end": 590.0, "text": " A B"},
+                          {"start": 590.0, "end": 601.0, "text": " C D"}]}
+    second = {"segments": [{"start": 5.0, "end": 15.8, "text": " E F G H I J K"},
+                           {"start": 15.8, "end": 20.0, "text": " L"}]}
+    result = stitch_segments(chunks, [first, second])
+    # Starts inside the previous segment but holds words only the second chunk decoded
+    assert result["text"] == " A B C D E F G H I J K L"
+    assert [segment["start"] for segment in result["segments"]] == [580.0, 590.0, 601.0, 605.8]
+
+    # Words both chunks decoded are dropped, the rest of the segment is kept
+    second = {"segments": [{"start": 8.0, "end": 15.8, "text": " C D E F"}]}
+    assert stitch_segments(chunks, [first, second])["text"] == " A B C D E F"
+
+    # With word timestamps, the words said before the previous segment ended go
+    words = [{"start": 9.0, "end": 10.5, "word": " D"}, {"start": 11.0, "end": 12.0, "word": " E"}]
+    second = {"segments": [{"start": 9.0, "end": 12.0, "text": " D E", "words": words}]}
+    result = stitch_segments(chunks, [first, second])
+    assert result["text"] == " A B C D E"
+    assert result["segments"][-1]["words"] == words[1:]
+
+def test_segment_events_follow_the_timeline():
+    audio = noise(CHUNKED_MIN_DURATION + 300)
+    backend = FakeBackend("model", segment_seconds=10.0)
+    events = []
+    result = transcribe(audio, "model", DummyLogger(), chunk_workers=3, backend=backend, on_segment=events.append)
+
+    assert [event.index for event in events] == list(range(len(result["segments"])))
+    assert [(event.start, event.end, event.text) for event in events] == \
+        [(segment["start"], segment["end"], segment["text"]) for segment in result["segments"]]
+    assert all(event.avg_logprob == -0.1 for event in events)
+
+def test_concurrent_transcriptions_keep_their_own_events():
+    backend = FakeBackend("model", segment_seconds=1.0, seconds_per_audio_second=0.01)
+    def run(seconds):
+        events = []
+        transcribe(noise(seconds, seed=seconds), "model", DummyLogger(), backend=backend, on_segment=events.append)
+        return [event.start for event in events]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(run, [3, 5, 7, 9]))
+    assert results == [[float(n) for n in range(seconds)] for seconds in [3, 5, 7, 9]]
+
+def test_stream_transcription_yields_then_returns_result():
+    backend = FakeBackend("model")
+    stream = stream_transcription(noise(12), "model", DummyLogger(), backend=backend)
+    starts = [event.start for event in stream]
+    assert starts == [0.0, 5.0, 10.0]
+    assert [segment["start"] for segment in stream.result["segments"]] == starts
+
+def test_progress_is_throttled():
+    logger = DummyLogger()
+    progress = TranscriptionProgress(logger, 100.0, interval=0.0)
+    progress.update(0, 10.0)
+    progress.update(1, 15.0)
+    progress.update(0, 5.0)  # never goes backwards
+    progress.report()
+    assert logger.lines == ["Transcribing: 25.0 / 100.0 seconds (25.0%)"]
+
+    quiet = TranscriptionProgress(logger, 100.0, interval=60.0)
+    quiet.update(0, 50.0)
+    quiet.report()
+    assert len(logger.lines) == 1
+
+def test_ctranslate2_model_name():
+    assert ctranslate2_model_name("mlx-community/whisper-large-v3-turbo") == "large-v3-turbo"
+    assert ctranslate2_model_name("mlx-community/whisper-large-v3-mlx") == "large-v3"
+    assert ctranslate2_model_name("Systran/faster-whisper-small") == "Systran/faster-whisper-small"
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
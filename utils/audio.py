@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+
+SAMPLE_RATE = 16000  # what Whisper expects
+FRAME_SECONDS = 0.03
+DECODE_READ_BYTES = 1024 ** 2  # ffmpeg output is read in 1 MB pieces
+
+def load_audio(file_path, sample_rate=SAMPLE_RATE):
+    """
+    Decodes any audio/video file to a mono float32 array at `sample_rate` with a
+    single ffmpeg process. The PCM stream is appended to one buffer as ffmpeg
+    produces it and viewed as float32 without a copy, so there is no
+    intermediate file and no second full-size copy of the output.
+    The duration is len(audio) / sample_rate; no separate ffprobe is needed.
+    """
+    import ffmpeg
+    process = (
+        ffmpeg.input(file_path, threads=0)
+        .output("-", format="f32le", acodec="pcm_f32le", ac=1, ar=sample_rate)
+        .run_async(cmd=["ffmpeg", "-nostdin", "-nostats", "-loglevel", "error"], pipe_stdout=True, pipe_stderr=True)
+    )
+    # Drain stderr alongside, so a chatty ffmpeg can never block on a full pipe
+    errors = []
+    stderr_reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+
+    buffer = bytearray()
+    while True:
+        piece = process.stdout.read(DECODE_READ_BYTES)
+        if not piece:
+            break
+        buffer += piece
+    process.stdout.close()
+    stderr_reader.join()
+    process.stderr.close()
+    if process.wait() != 0:
+        raise ffmpeg.Error("ffmpeg", None, b"".join(errors))
+
+    usable = len(buffer) - len(buffer) % 4
+    return np.frombuffer(buffer, np.float32, count=usable // 4)
+
+def frame_energies(audio, sample_rate=SAMPLE_RATE, frame_seconds=FRAME_SECONDS):
+    """
+    RMS energy of consecutive non-overlapping frames.
+    """
+    frame = max(1, int(sample_rate * frame_seconds))
+    count = len(audio) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:count * frame].reshape(count, frame)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+def find_split_points(audio, sample_rate=SAMPLE_RATE, chunk_seconds=600, search_seconds=60, min_silence_seconds=0.5):
+    """
+    Picks sample positions to cut the audio roughly every `chunk_seconds`, moving each
+    cut to the quietest `min_silence_seconds` stretch within +/- `search_seconds`
+    of the target, so cuts fall between words rather than inside them.
+    """
+    total_seconds = len(audio) / sample_rate
+    if total_seconds <= chunk_seconds * 1.5:
+        return []
+
+    energies = frame_energies(audio, sample_rate)
+    window = max(1, int(min_silence_seconds / FRAME_SECONDS))
+    # Moving average, so a single quiet frame inside speech doesn't win
+    smoothed = np.convolve(energies, np.ones(window) / window, mode="same")
+
+    points = []
+    target = chunk_seconds
+    while total_seconds - target > chunk_seconds * 0.5:
+        low = max(0, int((target - search_seconds) / FRAME_SECONDS))
+        high = min(len(smoothed), int((target + search_seconds) / FRAME_SECONDS))
+        if points:
+            # Never go back before the previous cut
+            low = max(low, points[-1] // int(sample_rate * FRAME_SECONDS) + 1)
+        if high <= low:
+            break
+        best_frame = low + int(np.argmin(smoothed[low:high]))
+        points.append(best_frame * int(sample_rate * FRAME_SECONDS))
+        target = best_frame * FRAME_SECONDS + chunk_seconds
+    return points
+
+def split_audio(audio, sample_rate=SAMPLE_RATE, chunk_seconds=600, overlap_seconds=1.0, **kwargs):
+    """
+    Splits audio at silence boundaries into chunks that overlap by `overlap_seconds`
+    on each side. Returns a list of dicts:
+    'audio' (the samples, overlap included), 'offset' (start of 'audio' in seconds),
+    and 'start'/'end' (the part of the timeline this chunk is responsible for, in seconds).
+    """
+    points = find_split_points(audio, sample_rate, chunk_seconds, **kwargs)
+    bounds = [0] + points + [len(audio)]
+    overlap = int(overlap_seconds * sample_rate)
+
+    chunks = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        padded_start = max(0, start - overlap)
+        padded_end = min(len(audio), end + overlap)
+        chunks.append({
+            "audio": audio[padded_start:padded_end],
+            "offset": padded_start / sample_rate,
+            "start": start / sample_rate,
+            "end": end / sample_rate,
+        })
+    return chunks
@@ -1,97 +1,543 @@
 import feedparser
 import requests
 import re
-from bs4 import BeautifulSoup
+import os
+import json
+import html
+import codecs
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from dateutil import parser
 import datetime
 import time
 
-def get_channel_rss_url(channel_url):
+from utils.metrics import NULL_TRACER
+
+DEFAULT_TIMEOUT = 10  # seconds, per HTTP request
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PER_HOST_LIMIT = 8
+
+RSS_CACHE_FILE = "rss_cache.json"  # lives next to config.json
+RSS_CACHE_TTL = 30 * 24 * 3600  # handle -> channel_id practically never changes
+RSS_CACHE_NEGATIVE_TTL = 24 * 3600  # retry failed lookups once a day
+
+FEED_STATE_FILE = "feed_state.json"  # lives next to config.json
+FEED_STATE_MAX_SEEN = 500  # a feed only lists the latest 15 uploads, so this is plenty
+
+FEED_URL_TEMPLATE = "https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+
+# Fast-path patterns, matched against the raw page while it streams in
+_CHANNEL_URL_PATTERN = re.compile(r"/channel/(UC[\w-]{22})")
+_RSS_LINK_PATTERN = re.compile(r"<link[^>]*type=\"application/rss\+xml\"[^>]*>")
+_HREF_PATTERN = re.compile(r"href=\"([^\"]+)\"")
+# Only markers of the page's own channel: a plain "channelId" also appears for
+# featured channels and shelves, possibly before the page's own ID
+_CHANNEL_ID_PATTERN = re.compile(
+    r"\"externalId\":\"(UC[\w-]{22})\"|<meta itemprop=\"channelId\" content=\"(UC[\w-]{22})\""
+)
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
     """
-    Attempts to find the RSS feed URL for a given YouTube channel URL.
+    Returns the process-wide keep-alive session shared by all channel/feed requests.
     """
-    if "feeds/videos.xml" in channel_url:
-        return channel_url
-    
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=DEFAULT_MAX_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers.update({"User-Agent": "Mozilla/5.0"})
+        return _session
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host, so a large channel list
+    doesn't hammer youtube.com with every worker at once.
+    """
+    def __init__(self, per_host_limit=DEFAULT_PER_HOST_LIMIT):
+        self.per_host_limit = per_host_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._semaphores[host]
+
+def _get(url, session, timeout, limiter, headers=None):
+    session = session or get_session()
+    if limiter is None:
+        return session.get(url, timeout=timeout, headers=headers)
+    with limiter(url):
+        return session.get(url, timeout=timeout, headers=headers)
+
+class RSSUrlCache:
+    """
+    Persistent channel URL -> RSS URL mapping stored as JSON.
+    Failed lookups are cached too (as None) with a shorter TTL.
+    """
+    def __init__(self, path=RSS_CACHE_FILE, ttl=RSS_CACHE_TTL, negative_ttl=RSS_CACHE_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self._entries = json.load(f)
+            except:
+                self._entries = {}
+
+    def get(self, channel_url):
+        """
+        Returns (found, rss_url). rss_url is None for a cached failed lookup.
+        """
+        with self._lock:
+            entry = self._entries.get(channel_url)
+        if not entry:
+            return False, None
+        ttl = self.ttl if entry["rss_url"] else self.negative_ttl
+        if time.time() - entry["resolved_at"] > ttl:
+            return False, None
+        return True, entry["rss_url"]
+
+    def set(self, channel_url, rss_url):
+        with self._lock:
+            self._entries[channel_url] = {"rss_url": rss_url, "resolved_at": time.time()}
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            # Write to a temp file first so a crash never leaves a truncated cache
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+def _scan_for_rss_url(text):
+    link = _RSS_LINK_PATTERN.search(text)
+    if link:
+        href = _HREF_PATTERN.search(link.group(0))
+        if href:
+            return html.unescape(href.group(1))
+    channel_id = _CHANNEL_ID_PATTERN.search(text)
+    if channel_id:
+        return FEED_URL_TEMPLATE.format(channel_id=channel_id.group(1) or channel_id.group(2))
+    return None
+
+def _resolve_rss_url(channel_url, session, timeout, limiter):
+    """
+    Returns (rss_url, cacheable, error). Network errors are not cacheable, a page
+    without a feed link is (negative-cached).
+    """
+    channel_id = _CHANNEL_URL_PATTERN.search(channel_url)
+    if channel_id:
+        return FEED_URL_TEMPLATE.format(channel_id=channel_id.group(1)), True, None
+
+    session = session or get_session()
+    semaphore = limiter(channel_url) if limiter else None
+    pieces = []
     try:
-        response = requests.get(channel_url, headers={"User-Agent": "Mozilla/5.0"})
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            rss_link = soup.find('link', {'type': 'application/rss+xml'})
-            if rss_link:
-                return rss_link['href']
+        if semaphore:
+            semaphore.acquire()
+        # Stream the page and stop as soon as the feed link shows up, instead of
+        # downloading the whole multi-megabyte page and building a soup tree
+        with session.get(channel_url, timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                return None, response.status_code == 404, None
+            try:
+                decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+            except LookupError:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            tail = ""
+            for chunk in response.iter_content(chunk_size=_STREAM_CHUNK_SIZE):
+                # The decoder keeps a character split across two chunks for the next one
+                text = decoder.decode(chunk)
+                pieces.append(text)
+                # Re-scan a little of the previous text in case a tag spans two chunks
+                window = tail + text
+                rss_url = _scan_for_rss_url(window)
+                if rss_url:
+                    return rss_url, True, None
+                tail = window[-1024:]
+            pieces.append(decoder.decode(b"", final=True))
     except Exception as e:
-        print(f"Error fetching RSS URL for {channel_url}: {e}")
-    
-    # Fallback: if it's a @handle, we might need another way or just fail.
+        return None, False, f"Error fetching RSS URL for {channel_url}: {e}"
+    finally:
+        if semaphore:
+            semaphore.release()
+
+    # Slow path: the page markup changed shape, let BeautifulSoup have a go
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup("".join(pieces), 'html.parser')
+    rss_link = soup.find('link', {'type': 'application/rss+xml'})
+    if rss_link:
+        return rss_link['href'], True, None
+    return None, True, None
+
+def _lookup_rss_url(channel_url, session, timeout, limiter, rss_cache):
+    """
+    Returns (rss_url, error), using and filling the RSSUrlCache if one is given.
+    """
+    if "feeds/videos.xml" in channel_url:
+        return channel_url, None
+
+    if rss_cache is not None:
+        found, rss_url = rss_cache.get(channel_url)
+        if found:
+            return rss_url, None
+
+    rss_url, cacheable, error = _resolve_rss_url(channel_url, session, timeout, limiter)
+    if rss_cache is not None and cacheable:
+        rss_cache.set(channel_url, rss_url)
+    return rss_url, error
+
+def get_channel_rss_url(channel_url, session=None, timeout=DEFAULT_TIMEOUT, limiter=None, rss_cache=None, logger=None):
+    """
+    Attempts to find the RSS feed URL for a given YouTube channel URL.
+    A failed lookup is reported to `logger` (if given) and returns None.
+    """
     # Often the RSS url is https://www.youtube.com/feeds/videos.xml?channel_id=<CHANNEL_ID>
     # Getting channel_id from @handle usually requires parsing the page.
-    # The soup method above matches the <link> tag which usually contains the channel_id based RSS.
-    return None
+    # The scan in _resolve_rss_url matches the <link> tag which usually contains the channel_id based RSS.
+    rss_url, error = _lookup_rss_url(channel_url, session, timeout, limiter, rss_cache)
+    if error and logger is not None:
+        logger.warning(error)
+    return rss_url
 
-def check_for_new_videos(channel_urls, start_time, end_time, logger):
+class FeedStateStore:
     """
-    Checks RSS feeds for videos within the time range.
-    Returns a list of dicts: {'title': str, 'link': str, 'published': datetime, 'channel_name': str}
+    Per-feed state for incremental polling, stored as JSON:
+    the validators of the last response (etag / last-modified), the most
+    recent video ids that are done with ("seen") and the ones handed out to a
+    run that has not finished them yet ("pending"). A pending video is handed
+    out again by the next poll until mark_seen() is called for it, so a failed
+    or cancelled video is not lost; while a feed has pending videos it is
+    fetched in full instead of with a conditional GET.
+    Changes are only written to disk by save().
+    """
+    def __init__(self, path=FEED_STATE_FILE, max_seen=FEED_STATE_MAX_SEEN):
+        self.path = path
+        self.max_seen = max_seen
+        self._feeds = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self._feeds = json.load(f)
+            except:
+                self._feeds = {}
+
+    def get(self, rss_url):
+        """
+        Returns the stored state dict for the feed, or None if it was never polled.
+        """
+        with self._lock:
+            state = self._feeds.get(rss_url)
+            return dict(state) if state else None
+
+    def validators(self, rss_url):
+        state = self.get(rss_url) or {}
+        if state.get("pending"):
+            # A 304 would hide the videos still to be done
+            return None, None
+        return state.get("etag"), state.get("modified")
+
+    def _add_seen(self, state, video_ids):
+        known = set(state["seen"])
+        state["seen"].extend(video_id for video_id in video_ids if video_id not in known)
+        # Keep only the newest ids
+        del state["seen"][:-self.max_seen]
+
+    def update(self, rss_url, etag=None, modified=None, seen_ids=(), pending_ids=(), listed_ids=None):
+        """
+        Records a fetched feed: its validators, the ids that need no processing
+        (`seen_ids`) and the ones handed out to a run (`pending_ids`). With
+        `listed_ids` (every id in the feed), pending ids that dropped off the
+        feed are given up, as no later poll could hand them out again.
+        """
+        with self._lock:
+            state = self._feeds.setdefault(rss_url, {"etag": None, "modified": None, "seen": []})
+            if etag or modified:
+                state["etag"] = etag
+                state["modified"] = modified
+            self._add_seen(state, seen_ids)
+            pending = state.setdefault("pending", [])
+            pending.extend(video_id for video_id in pending_ids if video_id not in pending)
+            if listed_ids is not None:
+                listed = set(listed_ids)
+                pending[:] = [video_id for video_id in pending if video_id in listed]
+            self._dirty = True
+
+    def mark_seen(self, rss_url, video_id):
+        """
+        Records that a handed-out video is done with (reported, or skipped for
+        good), so later polls no longer hand it out.
+        """
+        with self._lock:
+            state = self._feeds.setdefault(rss_url, {"etag": None, "modified": None, "seen": []})
+            if video_id in state.get("pending", []):
+                state["pending"].remove(video_id)
+            self._add_seen(state, [video_id])
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._feeds, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+def fetch_feed(rss_url, session=None, timeout=DEFAULT_TIMEOUT, limiter=None, etag=None, modified=None):
+    """
+    Downloads the feed through the shared session and parses it with feedparser.
+    With etag/modified it is a conditional GET, and None is returned when the
+    server answers 304 Not Modified.
+    """
+    request_headers = {}
+    if etag:
+        request_headers["If-None-Match"] = etag
+    if modified:
+        request_headers["If-Modified-Since"] = modified
+
+    response = _get(rss_url, session, timeout, limiter, headers=request_headers or None)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    # feedparser looks headers up by lower-case name
+    headers = {key.lower(): value for key, value in response.headers.items()}
+    feed = feedparser.parse(response.content, response_headers=headers)
+    # feedparser only fills these in when it does the HTTP request itself
+    feed['etag'] = headers.get('etag')
+    feed['modified'] = headers.get('last-modified')
+    return feed
+
+def _discover_channel(channel_url, session, timeout, limiter, rss_cache, feed_state):
+    """
+    Resolves and fetches one channel. Runs on a worker thread, so it doesn't log;
+    the result is reported back to the caller instead.
+    """
+    result = {"channel_url": channel_url, "rss_url": None, "feed": None, "not_modified": False, "error": None}
+    rss_url, result["error"] = _lookup_rss_url(channel_url, session, timeout, limiter, rss_cache)
+    if not rss_url:
+        return result
+    result["rss_url"] = rss_url
+
+    etag, modified = feed_state.validators(rss_url) if feed_state is not None else (None, None)
+    try:
+        feed = fetch_feed(rss_url, session=session, timeout=timeout, limiter=limiter, etag=etag, modified=modified)
+        result["feed"] = feed
+        result["not_modified"] = feed is None
+    except Exception as e:
+        result["error"] = e
+    return result
+
+def _traced_discover_channel(tracer, channel_url, *args):
+    with tracer.span("discover", channel=channel_url) as span:
+        result = _discover_channel(channel_url, *args)
+        if result["error"] is not None or not result["rss_url"]:
+            span.set(error=str(result["error"] or "no RSS feed found"))
+        span.set(not_modified=result["not_modified"], entries=len(result["feed"].entries) if result["feed"] else 0)
+        return result
+
+def _entry_published(entry, start_time):
+    # Convert to datetime
+    published_dt = parser.parse(entry.published)
+
+    # Make naive if necessary for comparison, or ensure both are aware.
+    # Assuming entry.published includes timezone.
+    # User input start_time/end_time from Streamlit are usually naive (local time) or set to UTC?
+    # Streamlit datetime is usually naive.
+
+    if published_dt.tzinfo is not None:
+         # Convert to naive if start_time is naive (assuming local system time matching)
+         # Or better, make start_time aware.
+         # For simplicity, let's assume the user input is in local time and the feed is UTC.
+         # We should convert everything to UTC or everything to local.
+         # Let's convert published_dt to local naive for comparison if start_time is naive.
+         if start_time is None or start_time.tzinfo is None:
+             published_dt = published_dt.replace(tzinfo=None) # This effectively ignores TZ, which is risky.
+             # Better: convert to local time.
+             # But let's check simple comparison first.
+             pass
+
+    return published_dt
+
+def _entry_to_video(entry, published_dt, channel_name):
+    return {
+        'title': entry.title,
+        'link': entry.link,
+        'published': published_dt,
+        'channel_name': channel_name,
+        'video_id': entry.yt_videoid
+    }
+
+def filter_unseen_entries(feed, seen_ids, logger):
+    """
+    Returns the feed entries whose video id is not in seen_ids, as video dicts.
     """
-    logger.info("Checking for new videos...")
     found_videos = []
-    
-    # Ensure start_time and end_time are timezone-aware if possible, or naive. 
-    # Feedparser returns struct_time.
-    
-    for url in channel_urls:
-        rss_url = get_channel_rss_url(url)
+    channel_name = feed.feed.get('title', 'Unknown Channel')
+
+    for entry in feed.entries:
+        if entry.get('yt_videoid') in seen_ids:
+            continue
+        try:
+            published_dt = _entry_published(entry, None)
+            logger.info(f"Found new video: {entry.title} ({published_dt})")
+            found_videos.append(_entry_to_video(entry, published_dt, channel_name))
+        except Exception as e:
+            logger.warning(f"Error parsing date for {entry.get('title', 'Unknown')}: {e}")
+
+    return found_videos
+
+def filter_feed_entries(feed, start_time, end_time, logger):
+    """
+    Returns the feed entries published within the time range as video dicts.
+    """
+    found_videos = []
+    channel_name = feed.feed.get('title', 'Unknown Channel')
+
+    for entry in feed.entries:
+        # published_parsed is a struct_time
+        # published is a string
+        try:
+            published_dt = _entry_published(entry, start_time)
+
+            # logger.info(f"Checking video '{entry.title}' published at {published_dt}")
+
+            if start_time <= published_dt <= end_time:
+                logger.info(f"Found match: {entry.title} ({published_dt})")
+                found_videos.append(_entry_to_video(entry, published_dt, channel_name))
+
+        except Exception as e:
+            logger.warning(f"Error parsing date for {entry.get('title', 'Unknown')}: {e}")
+
+    return found_videos
+
+def discover_videos(channel_urls, start_time, end_time, logger, max_workers=DEFAULT_MAX_WORKERS,
+                    per_host_limit=DEFAULT_PER_HOST_LIMIT, timeout=DEFAULT_TIMEOUT, session=None, rss_cache=None,
+                    feed_state=None, since_last_run=False, tracer=None):
+    """
+    Fetches all channel feeds concurrently and yields matching videos as soon as
+    each feed completes, so downstream stages can start before discovery ends.
+    Each video dict also carries 'channel_index', the position of its channel in channel_urls.
+    Pass an RSSUrlCache to skip channel page lookups resolved on previous runs.
+
+    With since_last_run=True (requires a FeedStateStore) the time window is ignored:
+    feeds are fetched with conditional GETs, unchanged feeds (304) are skipped and
+    only videos no earlier run has finished are yielded; each such video carries its
+    'rss_url', and the caller reports it done with feed_state.mark_seen(). A feed polled for the
+    first time falls back to the time window if one is given, otherwise it only
+    records the current entries as the baseline.
+    With a metrics.Tracer, every channel lookup and feed fetch is recorded as a "discover" span.
+    """
+    if since_last_run and feed_state is None:
+        raise ValueError("since_last_run requires a feed_state")
+    if not since_last_run:
+        # Validators are only meaningful when we know what the last response contained
+        feed_state = None
+
+    logger.info("Checking for new videos...")
+    session = session or get_session()
+    limiter = HostLimiter(per_host_limit)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(_traced_discover_channel, tracer or NULL_TRACER, url, session, timeout, limiter, rss_cache, feed_state): index
+            for index, url in enumerate(channel_urls)
+        }
+        try:
+            yield from _collect_discovered(futures, start_time, end_time, logger, feed_state)
+        finally:
+            if rss_cache is not None:
+                rss_cache.save()
+            if feed_state is not None:
+                feed_state.save()
+
+def _collect_discovered(futures, start_time, end_time, logger, feed_state):
+    """
+    Reports each finished channel lookup and yields its matching videos.
+    """
+    for future in as_completed(futures):
+        result = future.result()
+        url = result["channel_url"]
+        rss_url = result["rss_url"]
+
         if not rss_url:
-            logger.warning(f"Could not find RSS feed for {url}")
+            logger.warning(result["error"] or f"Could not find RSS feed for {url}")
             continue
-            
-        logger.info(f"Fetching RSS feed: {rss_url}")
-        feed = feedparser.parse(rss_url)
-        
+
+        if result["error"] is not None:
+            logger.warning(f"Error fetching feed {rss_url}: {result['error']}")
+            continue
+
+        if result["not_modified"]:
+            logger.info(f"No changes in RSS feed: {rss_url}")
+            continue
+
+        logger.info(f"Fetched RSS feed: {rss_url}")
+        feed = result["feed"]
         if feed.bozo:
             logger.warning(f"Error parsing feed {rss_url}: {feed.bozo_exception}")
             continue
-            
-        channel_name = feed.feed.get('title', 'Unknown Channel')
-        
-        for entry in feed.entries:
-            # published_parsed is a struct_time
-            # published is a string
-            try:
-                # Convert to datetime
-                published_dt = parser.parse(entry.published)
-                
-                # Make naive if necessary for comparison, or ensure both are aware.
-                # Assuming entry.published includes timezone.
-                # User input start_time/end_time from Streamlit are usually naive (local time) or set to UTC?
-                # Streamlit datetime is usually naive.
-                
-                if published_dt.tzinfo is not None:
-                     # Convert to naive if start_time is naive (assuming local system time matching)
-                     # Or better, make start_time aware.
-                     # For simplicity, let's assume the user input is in local time and the feed is UTC.
-                     # We should convert everything to UTC or everything to local.
-                     # Let's convert published_dt to local naive for comparison if start_time is naive.
-                     if start_time.tzinfo is None:
-                         published_dt = published_dt.replace(tzinfo=None) # This effectively ignores TZ, which is risky.
-                         # Better: convert to local time.
-                         # But let's check simple comparison first.
-                         pass
-                
-                # logger.info(f"Checking video '{entry.title}' published at {published_dt}")
-                
-                if start_time <= published_dt <= end_time:
-                    logger.info(f"Found match: {entry.title} ({published_dt})")
-                    found_videos.append({
-                        'title': entry.title,
-                        'link': entry.link,
-                        'published': published_dt,
-                        'channel_name': channel_name,
-                        'video_id': entry.yt_videoid
-                    })
-                    
-            except Exception as e:
-                logger.warning(f"Error parsing date for {entry.get('title', 'Unknown')}: {e}")
-                
-    return found_videos
+
+        if feed_state is None:
+            videos = filter_feed_entries(feed, start_time, end_time, logger)
+        else:
+            state = feed_state.get(rss_url)
+            if state is not None:
+                videos = filter_unseen_entries(feed, set(state["seen"]), logger)
+            elif start_time is not None and end_time is not None:
+                videos = filter_feed_entries(feed, start_time, end_time, logger)
+            else:
+                logger.info(f"First poll of {rss_url}, recording {len(feed.entries)} existing videos")
+                videos = []
+            # Handed-out videos only count as seen once the run is done with them (mark_seen)
+            listed_ids = [entry.get('yt_videoid') for entry in feed.entries if entry.get('yt_videoid')]
+            pending_ids = {video['video_id'] for video in videos}
+            feed_state.update(
+                rss_url,
+                etag=feed.get('etag'),
+                modified=feed.get('modified'),
+                seen_ids=[video_id for video_id in listed_ids if video_id not in pending_ids],
+                pending_ids=sorted(pending_ids),
+                listed_ids=listed_ids
+            )
+
+        for video in videos:
+            video['channel_index'] = futures[future]
+            if feed_state is not None:
+                video['rss_url'] = rss_url
+            yield video
+
+def check_for_new_videos(channel_urls, start_time, end_time, logger, **kwargs):
+    """
+    Checks RSS feeds for videos within the time range.
+    Returns a list of dicts: {'title': str, 'link': str, 'published': datetime, 'channel_name': str}
+    ordered by channel, then by feed order.
+    """
+    found_videos = list(discover_videos(channel_urls, start_time, end_time, logger, **kwargs))
+    # sorted() is stable, so entries keep their feed order within a channel
+    return sorted(found_videos, key=lambda video: video['channel_index'])
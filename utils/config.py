@@ -0,0 +1,52 @@
+import os
+import json
+
+CONFIG_FILE = "config.json"
+
+# Settings used when config.json has no value yet. The Streamlit app saves the
+# last-used values to config.json, and the CLI reads the same file, so both
+# entry points start from the same settings.
+DEFAULT_SETTINGS = {
+    "channels": "",
+    "since_last_run": False,
+    "output_dir": os.path.join(os.getcwd(), "output"),
+    "model_name": "mlx-community/whisper-large-v3-turbo",
+    "transcription_backend": "auto",
+    "audio_format": "speech",
+    "transcode_audio": False,
+    "live_retry_minutes": 10,
+    "gemini_abstract_model": "models/gemini-2.5-flash-lite",
+    "gemini_summary_model": "models/gemini-2.5-pro",
+    # Per-key Gemini rate limits, e.g. "flash=1000/4000000, pro=150" or "off" (gemini_pool.parse_model_limits);
+    # empty for the free-tier defaults
+    "gemini_rate_limits": "",
+    "summarize_mode": "auto",
+    "download_workers": 2,
+    "transcribe_workers": 1,
+    "chunk_workers": 2,
+    "summarize_workers": 2,
+    "queue_size": 4,
+    "transcript_cache_mb": 2048,
+    "response_cache_mb": 256,
+}
+
+def load_config(path=CONFIG_FILE):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except:
+            pass
+    return {}
+
+def save_config(config, path=CONFIG_FILE):
+    with open(path, "w") as f:
+        json.dump(config, f)
+
+def parse_api_keys(text):
+    """
+    Splits keys given one per line or comma-separated.
+    """
+    if not text:
+        return []
+    return [k.strip() for k in text.replace(",", "\n").split("\n") if k.strip()]
@@ -1,71 +1,270 @@
-import yt_dlp
 import os
+import heapq
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def download_audio(video_url, output_dir, logger):
+# yt-dlp format selectors. "speech" takes the best audio-only stream at or below
+# 96 kbps (YouTube's ~50-70 kbps Opus or 48 kbps AAC), which is plenty for Whisper,
+# and falls back to the smallest audio stream, then to whatever exists.
+AUDIO_FORMATS = {
+    "speech": "bestaudio[abr<=96]/worstaudio/bestaudio/best",
+    "best": "bestaudio/best",
+}
+DEFAULT_AUDIO_FORMAT = "speech"
+DEFAULT_DOWNLOAD_WORKERS = 2
+
+# Upcoming live events / premieres are re-attempted later instead of sleeping:
+# after 15 s, 30 s, 60 s, ... (at most 5 minutes apart) for up to 10 minutes.
+LIVE_RETRY_INITIAL_DELAY = 15.0
+LIVE_RETRY_MAX_DELAY = 300.0
+LIVE_RETRY_HORIZON = 600.0
+
+# yt-dlp error messages for a stream that has not started yet
+_LIVE_UPCOMING_MESSAGES = (
+    "This live event will begin in",
+    "Premieres in",
+)
+
+class DownloadResult:
     """
-    Downloads audio from YouTube video using yt-dlp.
-    Returns path to the downloaded audio file.
+    Outcome of one download attempt: status is OK (path is set), LIVE_UPCOMING
+    (a live event or premiere that has not started yet; worth retrying later)
+    or FAILED (error holds the message).
+    """
+    OK = "ok"
+    LIVE_UPCOMING = "live_upcoming"
+    FAILED = "failed"
+
+    __slots__ = ("status", "path", "error")
+
+    def __init__(self, status, path=None, error=None):
+        self.status = status
+        self.path = path
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.status == self.OK
+
+    def __repr__(self):
+        return f"DownloadResult({self.status!r}, path={self.path!r}, error={self.error!r})"
+
+class RetryQueue:
+    """
+    Deferred re-attempts with exponential backoff, so a batch never sleeps on a
+    video that cannot be downloaded yet.
+    schedule() parks a payload until its next attempt is due, and drain() yields
+    payloads as they come due, returning once nothing is scheduled and no
+    tracked item is still in flight (one that may yet be scheduled).
+    Producers call track() for every item they hand out and done() once it can
+    no longer be scheduled; payloads yielded by drain() are tracked already.
+    """
+    def __init__(self, initial_delay=LIVE_RETRY_INITIAL_DELAY, max_delay=LIVE_RETRY_MAX_DELAY,
+                 horizon=LIVE_RETRY_HORIZON, factor=2.0, clock=time.monotonic):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.horizon = horizon
+        self.factor = factor
+        self.clock = clock
+        self._entries = []  # heap of (due, sequence, payload)
+        self._sequence = 0
+        self._in_flight = 0
+        self._changed = threading.Condition()
+
+    def track(self):
+        with self._changed:
+            self._in_flight += 1
+
+    def done(self):
+        with self._changed:
+            self._in_flight -= 1
+            self._changed.notify_all()
+
+    def delay(self, attempt):
+        """
+        Seconds to wait before re-attempt number `attempt` (1-based).
+        """
+        return min(self.max_delay, self.initial_delay * self.factor ** (attempt - 1))
+
+    def schedule(self, payload, attempt, since):
+        """
+        Parks `payload` for re-attempt number `attempt`. `since` is the clock()
+        time of its first failed attempt. Returns the delay in seconds, or None
+        when the attempt would fall beyond the horizon (give up).
+        """
+        delay = self.delay(attempt)
+        due = self.clock() + delay
+        if due - since > self.horizon:
+            return None
+        with self._changed:
+            heapq.heappush(self._entries, (due, self._sequence, payload))
+            self._sequence += 1
+            self._changed.notify_all()
+        return delay
+
+    def __len__(self):
+        with self._changed:
+            return len(self._entries)
+
+    def drain(self, stop=lambda: False, poll_interval=0.5):
+        """
+        Generator yielding scheduled payloads when they are due. Checks `stop()`
+        at least every poll_interval seconds and returns early once it is true.
+        """
+        while True:
+            with self._changed:
+                while True:
+                    if stop():
+                        return
+                    if self._entries and self._entries[0][0] <= self.clock():
+                        payload = heapq.heappop(self._entries)[2]
+                        self._in_flight += 1
+                        break
+                    if not self._entries and self._in_flight <= 0:
+                        return
+                    wait = poll_interval
+                    if self._entries:
+                        wait = min(wait, max(0.0, self._entries[0][0] - self.clock()))
+                    self._changed.wait(wait)
+            yield payload
+
+class DownloadManager:
     """
-    # Store the last log time (using list or dict to allow modification in nested functions)
-    last_log_time = {"time": 0}
+    Audio downloads with at most `max_workers` running at once and one
+    yt_dlp.YoutubeDL per worker thread (per output directory), reused for every
+    download that thread makes instead of a new instance per attempt.
+    By default the audio stream is kept in its native container (m4a/webm),
+    which ffmpeg and Whisper decode directly; transcode=True restores the old
+    re-encode to m4a.
+    download() can be called from any thread (e.g. the pipeline's download
+    stage); download_many() runs a batch on the manager's own pool.
+    """
+    def __init__(self, max_workers=DEFAULT_DOWNLOAD_WORKERS, audio_format=DEFAULT_AUDIO_FORMAT, transcode=False):
+        self.max_workers = max(1, int(max_workers))
+        self.audio_format = AUDIO_FORMATS.get(audio_format, audio_format)
+        self.transcode = transcode
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._local = threading.local()
+
+    def _options(self, output_dir):
+        ydl_opts = {
+            'format': self.audio_format,
+            'outtmpl': os.path.join(output_dir, '%(id)s.%(ext)s'),
+            'quiet': True,
+            'no_warnings': True,
+            # Progress goes to the logger through the hook, not to stdout
+            'noprogress': True,
+            'progress_hooks': [self._progress_hook],
+        }
+        if self.transcode:
+            ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'm4a',
+            }]
+        return ydl_opts
+
+    def _get_ydl(self, output_dir):
+        # One instance per thread, rebuilt only when the run's output directory changes
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None or self._local.output_dir != output_dir:
+            import yt_dlp  # heavy; only needed once a download actually runs
+            if ydl is not None:
+                ydl.close()
+            ydl = yt_dlp.YoutubeDL(self._options(output_dir))
+            self._local.ydl = ydl
+            self._local.output_dir = output_dir
+        return ydl
 
-    def progress_hook(d):
+    def _progress_hook(self, d):
+        # Hooks are fixed when the YoutubeDL is built, so the current download's
+        # logger is looked up per thread
+        logger = getattr(self._local, "logger", None)
+        if logger is None:
+            return
         if d['status'] == 'downloading':
             current_time = time.time()
             # Check if it has been more than 10 seconds since the last log
-            if current_time - last_log_time["time"] >= 10:
+            if current_time - self._local.last_log_time >= 10:
                 percent = d.get('_percent_str', '0%')
                 speed = d.get('_speed_str', 'N/A')
                 eta = d.get('_eta_str', 'N/A')
                 logger.info(f"Download progress: {percent} | Speed: {speed} | Estimated time remaining: {eta}")
-                
-                # Update last log time
-                last_log_time["time"] = current_time
-        
+                self._local.last_log_time = current_time
+
         elif d['status'] == 'finished':
-            logger.info("Download completed, now processing with FFmpeg...")
-
-    logger.info(f"Downloading audio from {video_url}...")
-    
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'm4a',
-        }],
-        'outtmpl': os.path.join(output_dir, '%(id)s.%(ext)s'),
-        'quiet': True,
-        'no_warnings': True,
-        'progress_hooks': [progress_hook],
-    }
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    max_retries = 5
-    for attempt in range(max_retries + 1):
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if self.transcode:
+                logger.info("Download completed, now processing with FFmpeg...")
+            else:
+                logger.info(f"Download completed ({d.get('total_bytes') or d.get('downloaded_bytes') or 0} bytes)")
+
+    @staticmethod
+    def _downloaded_path(ydl, info, transcode):
+        requested = info.get('requested_downloads') or []
+        if requested and requested[-1].get('filepath'):
+            return requested[-1]['filepath']
+        filename = ydl.prepare_filename(info)
+        if transcode:
+            # filenames with 'm4a' extension are generated by postprocessor
+            return os.path.splitext(filename)[0] + ".m4a"
+        return filename
+
+    def download(self, video_url, output_dir, logger):
+        """
+        Makes one attempt at downloading the audio of a video and returns a
+        DownloadResult. An upcoming live event is reported right away as
+        LIVE_UPCOMING; re-attempting it later is up to the caller (RetryQueue).
+        """
+        logger.info(f"Downloading audio from {video_url}...")
+        os.makedirs(output_dir, exist_ok=True)
+
+        with self._slots:
+            self._local.logger = logger
+            self._local.last_log_time = 0
+            try:
+                ydl = self._get_ydl(output_dir)
                 info = ydl.extract_info(video_url, download=True)
-                filename = ydl.prepare_filename(info)
-                # filenames with 'm4a' extension are generated by postprocessor
-                base, _ = os.path.splitext(filename)
-                final_path = base + ".m4a"
-                
+                final_path = self._downloaded_path(ydl, info, self.transcode)
                 logger.info(f"Downloaded: {final_path}")
-                return final_path
-        except Exception as e:
-            error_msg = str(e)
-            if "This live event will begin in a few moments." in error_msg:
-                if attempt < max_retries:
+                return DownloadResult(DownloadResult.OK, path=final_path)
+            except Exception as e:
+                error_msg = str(e)
+                if any(message in error_msg for message in _LIVE_UPCOMING_MESSAGES):
                     logger.warning(f"Error downloading {video_url}: {error_msg}")
-                    logger.info(f"Retrying in 15 seconds... (Attempt {attempt + 1} of {max_retries})")
-                    time.sleep(15)
-                else:
-                    logger.warning(f"Error downloading {video_url}: {error_msg}")
-                    return "LIVE_EVENT_UPCOMING"
-            else:
-                logger.critical(f"Error downloading {video_url}: {e}")
-                return None
-    return None
+                    return DownloadResult(DownloadResult.LIVE_UPCOMING, error=error_msg)
+                # Not critical: one video that cannot be downloaded must not stop the others
+                logger.warning(f"Error downloading {video_url}: {e}")
+                return DownloadResult(DownloadResult.FAILED, error=error_msg)
+            finally:
+                self._local.logger = None
+
+    def download_many(self, video_urls, output_dir, logger):
+        """
+        Downloads several videos on a pool of max_workers threads.
+        Returns their DownloadResults in input order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="download") as executor:
+            return list(executor.map(lambda url: self.download(url, output_dir, logger), video_urls))
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_download_manager(max_workers=DEFAULT_DOWNLOAD_WORKERS, audio_format=DEFAULT_AUDIO_FORMAT, transcode=False):
+    """
+    Returns the process-wide manager for these options, so runs going on at the
+    same time share its download limit. Its YoutubeDL instances belong to the
+    threads that built them: each run's pipeline starts new download threads,
+    so they are reused within a run, not across runs.
+    """
+    key = (max(1, int(max_workers)), audio_format, transcode)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = DownloadManager(*key)
+        return _managers[key]
+
+def download_audio(video_url, output_dir, logger):
+    """
+    Downloads audio from YouTube video using yt-dlp.
+    Returns a DownloadResult; its path is the downloaded audio file.
+    """
+    return get_download_manager().download(video_url, output_dir, logger)
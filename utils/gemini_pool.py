@@ -0,0 +1,329 @@
+import asyncio
+import queue
+import random
+import re
+import threading
+import time
+from utils.tokens import estimate_tokens
+
+# Per-model (requests per minute, tokens per minute) for a single key, the
+# free-tier quotas. Paid keys allow far more; see parse_model_limits() for
+# settings['gemini_rate_limits'].
+# Matched by substring, first match wins, so "flash-lite" must come before "flash".
+# Limits of None mean no client-side limit (429s are still handled).
+DEFAULT_MODEL_LIMITS = [
+    ("flash-lite", (15, 250000)),
+    ("flash", (10, 250000)),
+    ("pro", (5, 250000)),
+]
+FALLBACK_LIMITS = (5, 250000)
+
+_RETRY_DELAY_PATTERNS = [
+    re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s"),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+]
+
+class RetriesExhausted(Exception):
+    pass
+
+def limits_for_model(model, model_limits=None):
+    if model_limits is None:
+        model_limits = DEFAULT_MODEL_LIMITS
+    for pattern, limits in model_limits:
+        if pattern in model:
+            return limits
+    return FALLBACK_LIMITS
+
+def parse_model_limits(text):
+    """
+    Parses a rate limit setting such as "flash-lite=4000/4000000, flash=1000, pro=off":
+    per model name pattern, requests per minute and optionally tokens per minute
+    (default FALLBACK_LIMITS' TPM); "off" disables client-side limiting for the
+    pattern, and "off" on its own for every model. Patterns are tried in the
+    order given, then DEFAULT_MODEL_LIMITS. An empty setting returns None (the
+    defaults). Raises ValueError on malformed input.
+    """
+    text = (text or "").strip()
+    if not text:
+        return None
+    if text.lower() == "off":
+        return [("", None)]
+    model_limits = []
+    for entry in text.split(","):
+        if not entry.strip():
+            continue
+        pattern, separator, value = entry.partition("=")
+        pattern, value = pattern.strip(), value.strip().lower()
+        if not separator or not pattern or not value:
+            raise ValueError(f"Expected model=RPM[/TPM] or model=off, got {entry.strip()!r}")
+        if value == "off":
+            model_limits.append((pattern, None))
+            continue
+        rpm, _, tpm = value.partition("/")
+        try:
+            limits = (int(rpm), int(tpm) if tpm else FALLBACK_LIMITS[1])
+        except ValueError:
+            raise ValueError(f"Expected model=RPM[/TPM] or model=off, got {entry.strip()!r}") from None
+        if min(limits) <= 0:
+            raise ValueError(f"Rate limits must be positive, got {entry.strip()!r}")
+        model_limits.append((pattern, limits))
+    return model_limits + DEFAULT_MODEL_LIMITS
+
+def _status_code(error):
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    if not isinstance(code, int):
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+def classify_error(error):
+    """
+    Returns "quota" for 429s, "unavailable" for 503s (and other transient server
+    errors), or None for errors that should not be retried. Decided by the HTTP
+    status code (or the API status name) carried by the exception, not its message.
+    """
+    code = _status_code(error)
+    status = getattr(error, "status", None)
+    if code == 429 or status == "RESOURCE_EXHAUSTED":
+        return "quota"
+    if code in (500, 502, 503, 504) or status in ("UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED"):
+        return "unavailable"
+    return None
+
+def retry_after(error):
+    """
+    Extracts the server's retry hint in seconds from an API error, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("retry-after"):
+        try:
+            return float(headers.get("retry-after"))
+        except ValueError:
+            pass
+    error_str = str(error)
+    for pattern in _RETRY_DELAY_PATTERNS:
+        match = pattern.search(error_str)
+        if match:
+            return float(match.group(1))
+    return None
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute` / 60 per second.
+    Not thread-safe: only used from the pool's event loop.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        # Requests bigger than the whole bucket go through once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+class KeySlot:
+    """
+    One API key: its long-lived client, per-model buckets and 429 cooldowns.
+    """
+    def __init__(self, index, api_key, client):
+        self.index = index
+        self.api_key = api_key
+        self.client = client
+        self.buckets = {}
+        self.cooldown_until = {}
+        self.calls = 0
+        self.quota_errors = 0
+        self.unavailable_errors = 0
+
+    def wait_time(self, model, tokens, limits, now):
+        cooldown = max(0.0, self.cooldown_until.get(model, 0.0) - now)
+        if limits is None:
+            return cooldown
+        # One pair of buckets per model and limits, so runs with different
+        # settings sharing this key do not reset each other's buckets
+        if (model, limits) not in self.buckets:
+            rpm, tpm = limits
+            self.buckets[(model, limits)] = (TokenBucket(rpm), TokenBucket(tpm))
+        requests_bucket, tokens_bucket = self.buckets[(model, limits)]
+        return max(cooldown, requests_bucket.wait_time(1, now), tokens_bucket.wait_time(tokens, now))
+
+    def consume(self, model, tokens, limits, now):
+        if limits is not None:
+            requests_bucket, tokens_bucket = self.buckets[(model, limits)]
+            requests_bucket.consume(1, now)
+            tokens_bucket.consume(tokens, now)
+        self.calls += 1
+
+def _default_client_factory(api_key):
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+class GeminiPool:
+    """
+    Long-lived Gemini clients, one per API key, with an asyncio scheduler that
+    sends each request to a key that currently has RPM/TPM capacity for the model.
+    429s put that key/model on cooldown (honouring the server's retry delay) and
+    the request moves to another key; 503s are retried with jittered backoff.
+
+    The event loop runs on its own daemon thread, so the pool can be shared by
+    any number of worker threads through submit() / generate_sync().
+    """
+    def __init__(self, api_keys, model_limits=None, client_factory=None, max_retries=20,
+                 base_delay=2.0, max_delay=60.0):
+        if not api_keys:
+            raise ValueError("GeminiPool needs at least one API key")
+        self.model_limits = model_limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        factory = client_factory or _default_client_factory
+        self.slots = [KeySlot(index, key, factory(key)) for index, key in enumerate(api_keys)]
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="gemini-pool", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def backoff(self, attempt):
+        # Exponential with "equal jitter": somewhere between half and all of the step
+        step = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return step * random.uniform(0.5, 1.0)
+
+    async def _acquire(self, model, tokens, key_hint, model_limits=None):
+        limits = limits_for_model(model, model_limits if model_limits is not None else self.model_limits)
+        order = list(self.slots)
+        if key_hint is not None:
+            start = key_hint % len(order)
+            order = order[start:] + order[:start]
+
+        while True:
+            now = time.monotonic()
+            waits = []
+            for slot in order:
+                wait = slot.wait_time(model, tokens, limits, now)
+                if wait <= 0:
+                    slot.consume(model, tokens, limits, now)
+                    return slot
+                waits.append(wait)
+            # Every key is busy: sleep until the first one frees up
+            await asyncio.sleep(min(max(min(waits), 0.01), 5.0))
+
+    async def generate(self, model, prompt, key_hint=None, notify=None, info=None, model_limits=None):
+        """
+        Sends one generate_content request. `notify` receives human-readable
+        retry messages; `info`, if given, is filled with the key index used and
+        the number of retries. `model_limits` (see parse_model_limits) overrides the
+        pool's limits for this request, so runs with their own settings can share
+        the pool. Raises RetriesExhausted after max_retries retryable errors.
+        """
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            slot = await self._acquire(model, tokens, key_hint, model_limits)
+            try:
+                response = await slot.client.aio.models.generate_content(model=model, contents=[prompt])
+                if info is not None:
+                    info["key_index"] = slot.index
+                    info["retries"] = attempt
+                return response
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None:
+                    raise
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise RetriesExhausted(f"Exhausted {self.max_retries} attempts: {e}") from e
+
+                hint = retry_after(e)
+                delay = hint if hint is not None else self.backoff(attempt)
+                if kind == "quota":
+                    slot.quota_errors += 1
+                    slot.cooldown_until[model] = time.monotonic() + delay
+                    if notify:
+                        notify(f"Quota exceeded (429) on key index {slot.index}, cooling it down for {delay:.1f}s. Retry {attempt}/{self.max_retries}.")
+                    # Next attempt can go straight to another key with capacity
+                    key_hint = slot.index + 1
+                else:
+                    slot.unavailable_errors += 1
+                    if notify:
+                        notify(f"Model currently unavailable (503). Retrying {attempt}/{self.max_retries} in {delay:.1f} seconds...\nError details: {e}")
+                    await asyncio.sleep(delay)
+
+    def submit(self, model, prompt, key_hint=None, notify=None, info=None, model_limits=None):
+        """
+        Thread-safe entry point. Returns a concurrent.futures.Future.
+        """
+        coroutine = self.generate(model, prompt, key_hint=key_hint, notify=notify, info=info, model_limits=model_limits)
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+
+    def generate_sync(self, model, prompt, key_hint=None, logger=None, info=None, model_limits=None):
+        """
+        Blocking call for worker threads. Retry messages are logged on the
+        calling thread (not the pool's loop thread), so UI loggers keep working.
+        """
+        messages = queue.Queue()
+        future = self.submit(model, prompt, key_hint=key_hint, notify=messages.put, info=info, model_limits=model_limits)
+        while True:
+            try:
+                message = messages.get(timeout=0.1)
+                if logger:
+                    logger.warning(message)
+            except queue.Empty:
+                if future.done():
+                    break
+        while not messages.empty():
+            message = messages.get()
+            if logger:
+                logger.warning(message)
+        return future.result()
+
+    def stats(self):
+        return [
+            {"key_index": slot.index, "calls": slot.calls, "quota_errors": slot.quota_errors,
+             "unavailable_errors": slot.unavailable_errors}
+            for slot in self.slots
+        ]
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+                self._loop.close()
+                self._loop = None
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(api_keys, **kwargs):
+    """
+    Returns the process-wide pool for this set of keys, creating it on first use,
+    so clients are reused across videos and runs.
+    """
+    key = tuple(api_keys)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = GeminiPool(list(api_keys), **kwargs)
+        return _pools[key]
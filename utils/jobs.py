@@ -0,0 +1,227 @@
+import os
+import json
+import uuid
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logger import UILogger, CriticalError, close_file_sink
+
+JOBS_DIR = "jobs"
+DEFAULT_MAX_JOBS = 2  # runs processed at the same time; later submissions wait in line
+
+# Job lifecycle. Jobs found "queued" or "running" when the manager starts were
+# cut off by a server restart and are marked "interrupted".
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+FINISHED_STATES = (DONE, FAILED, CANCELLED, INTERRUPTED)
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+class Job:
+    """
+    One submitted run: its settings, status, per-video progress and log.
+    Only the JSON-safe parts (no API keys) are persisted by to_record().
+    """
+    def __init__(self, job_id, settings, label, log_file=None, api_keys=None):
+        self.id = job_id
+        self.settings = settings
+        self.label = label
+        self.api_keys = api_keys or []
+        self.status = QUEUED
+        self.created_at = _now()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        # index -> {"title", "link", "state"}; insertion order is the video order
+        self.videos = {}
+        self.cancel_event = threading.Event()
+        self.logger = UILogger(log_file=log_file)
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_record(self):
+        with self.lock:
+            return {
+                "id": self.id,
+                "label": self.label,
+                "status": self.status,
+                "settings": self.settings,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+                "result": self.result,
+                "videos": [dict(video, index=index) for index, video in self.videos.items()],
+            }
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls(record["id"], record.get("settings", {}), record.get("label", ""))
+        job.status = record.get("status", INTERRUPTED)
+        job.created_at = record.get("created_at")
+        job.started_at = record.get("started_at")
+        job.finished_at = record.get("finished_at")
+        job.error = record.get("error")
+        job.result = record.get("result")
+        job.videos = {video["index"]: {k: v for k, v in video.items() if k != "index"} for video in record.get("videos", [])}
+        return job
+
+class JobManager:
+    """
+    Runs batches on a background thread pool, independent of any Streamlit
+    session: the UI submits a run, gets a job id back and polls the job for its
+    status, per-video progress and log. Job records are persisted as JSON under
+    `root` (one file per job, written atomically) so finished runs stay listed
+    after a restart, and each job's full log goes to `root/<id>.log`.
+
+    `runner(settings, api_keys, logger, rss_cache=..., feed_state=..., cancel_event=..., on_progress=...)`
+    does the actual work (pipeline.run_batch) and returns a JSON-safe result.
+    The channel caches are shared by all jobs so concurrent runs don't
+    overwrite each other's feed state.
+    """
+    def __init__(self, runner, root=JOBS_DIR, max_jobs=DEFAULT_MAX_JOBS, rss_cache=None, feed_state=None):
+        from utils.channel_monitor import RSSUrlCache, RSS_CACHE_FILE, FeedStateStore, FEED_STATE_FILE
+
+        self.runner = runner
+        self.root = root
+        self.rss_cache = rss_cache if rss_cache is not None else RSSUrlCache(RSS_CACHE_FILE)
+        self.feed_state = feed_state if feed_state is not None else FeedStateStore(FEED_STATE_FILE)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Progress callbacks arrive from many pipeline threads; one writer at a time
+        self._save_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def _record_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _log_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.log")
+
+    def _load(self):
+        for filename in os.listdir(self.root):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, filename), "r", encoding="utf-8") as f:
+                    job = Job.from_record(json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue
+            job.logger.log_file = self._log_path(job.id)
+            if not job.finished:
+                job.status = INTERRUPTED
+                job.finished_at = job.finished_at or _now()
+                self._save(job)
+            self._jobs[job.id] = job
+
+    def _save(self, job, **changes):
+        record = job.to_record()
+        record.update(changes)
+        path = self._record_path(job.id)
+        with self._save_lock:
+            # Write to a temp file first so a crash never leaves a truncated record
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+
+    def submit(self, settings, api_keys, label=None):
+        """
+        Queues a run and returns its job id. `settings` must be JSON-serializable.
+        """
+        job_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        job = Job(job_id, settings, label or job_id, log_file=self._log_path(job_id), api_keys=api_keys)
+        with self._lock:
+            self._jobs[job_id] = job
+        self._save(job)
+        self._executor.submit(self._run, job)
+        return job_id
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        with job.lock:
+            job.status = RUNNING
+            job.started_at = _now()
+        self._save(job)
+
+        def on_progress(index, video, state):
+            with job.lock:
+                entry = job.videos.setdefault(index, {"title": video.get("title", "Unknown_Title"), "link": video.get("link")})
+                entry["state"] = state
+            self._save(job)
+
+        try:
+            result = self.runner(
+                job.settings, job.api_keys, job.logger,
+                rss_cache=self.rss_cache, feed_state=self.feed_state,
+                cancel_event=job.cancel_event, on_progress=on_progress
+            )
+            job.result = result
+            if job.cancel_event.is_set():
+                self._finish(job, CANCELLED)
+            else:
+                job.logger.info("All processing complete.")
+                self._finish(job, DONE)
+        except CriticalError as e:
+            # Already logged by logger.critical
+            self._finish(job, FAILED, str(e))
+        except Exception as e:
+            job.logger.warning(f"An unexpected error occurred: {e}")
+            self._finish(job, FAILED, str(e))
+        finally:
+            if job.logger.log_file:
+                close_file_sink(job.logger.log_file)
+
+    def _finish(self, job, status, error=None):
+        # Persisted before it is published, so a job seen as finished is on disk too
+        changes = {"status": status, "error": error, "finished_at": _now()}
+        self._save(job, **changes)
+        with job.lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        """
+        All known jobs, newest first.
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda job: job.created_at or "", reverse=True)
+
+    def active_jobs(self):
+        return [job for job in self.list_jobs() if not job.finished]
+
+    def cancel(self, job_id):
+        """
+        Asks a job to stop. A queued job never starts; a running one stops after
+        the download/transcription/summary steps already in progress.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        job.logger.warning("Cancellation requested.")
+        return True
+
+    def shutdown(self, wait=False):
+        for job in self.active_jobs():
+            job.cancel_event.set()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,308 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+import urllib.request
+
+JOURNAL_FILE = "journal.sqlite"
+
+# Per-video checkpoints, in pipeline order. A video's stage only ever moves
+# forward; a resumed run starts each video right after its last checkpoint.
+DISCOVERED = "discovered"
+DOWNLOADED = "downloaded"
+TRANSCRIBED = "transcribed"
+ABSTRACTED = "abstracted"
+SUMMARIZED = "summarized"
+REPORTED = "reported"
+STAGES = (DISCOVERED, DOWNLOADED, TRANSCRIBED, ABSTRACTED, SUMMARIZED, REPORTED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS videos (
+    key TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    video TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    error TEXT,
+    audio_path TEXT,
+    transcript TEXT,
+    abstract TEXT,
+    summary TEXT,
+    report_path TEXT,
+    updated_at TEXT
+);
+"""
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists, but owned by another user
+        return True
+    return True
+
+def video_key(video):
+    return video.get("video_id") or video.get("link")
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+def _dump_video(video):
+    return json.dumps(video, ensure_ascii=False, default=lambda value: value.isoformat() if hasattr(value, "isoformat") else str(value))
+
+def _load_video(text):
+    video = json.loads(text)
+    if isinstance(video.get("published"), str):
+        try:
+            video["published"] = datetime.datetime.fromisoformat(video["published"])
+        except ValueError:
+            pass
+    return video
+
+class RunJournal:
+    """
+    Crash-safe record of one run (one Trigger_* folder), kept in SQLite with a
+    write-ahead log next to the reports: the run's settings, whether discovery
+    finished, and for every video its last completed stage plus the artifacts
+    needed to continue from there (audio path, transcript, abstract, summary).
+    Every checkpoint is committed right away, so a killed process loses at
+    most the steps that were in progress. Safe to use from pipeline threads.
+    """
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if read_only:
+            # For looking at other runs: no schema or pragma setup, and nothing is written
+            uri = "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit; every statement is its own transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def for_run(cls, output_dir):
+        return cls(os.path.join(output_dir, JOURNAL_FILE))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, name):
+        row = self._conn.execute("SELECT value FROM run WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, name, value):
+        self._conn.execute(
+            "INSERT INTO run (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, json.dumps(value, ensure_ascii=False, default=str)),
+        )
+
+    def start(self, settings):
+        """
+        Stores the settings of a new run; a resumed run keeps its original ones.
+        """
+        with self._lock:
+            if self._get("settings") is None:
+                self._set("settings", settings)
+                self._set("started_at", _now())
+
+    @property
+    def settings(self):
+        with self._lock:
+            return self._get("settings") or {}
+
+    def claim(self):
+        """
+        Marks the run as being processed by this process (cleared by release()).
+        """
+        with self._lock:
+            self._set("owner_pid", os.getpid())
+
+    def release(self):
+        with self._lock:
+            self._set("owner_pid", None)
+
+    @property
+    def owner_pid(self):
+        with self._lock:
+            return self._get("owner_pid")
+
+    @property
+    def in_progress(self):
+        """
+        True while a live process is working on the run; a crashed owner does not count.
+        """
+        return _process_alive(self.owner_pid)
+
+    def discovery_done(self):
+        with self._lock:
+            self._set("discovery_complete", True)
+
+    @property
+    def discovery_complete(self):
+        with self._lock:
+            return bool(self._get("discovery_complete"))
+
+    def add_video(self, video):
+        """
+        Records a discovered video (no-op if it is already journaled).
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO videos (key, position, video, stage, updated_at) "
+                "VALUES (?, (SELECT COUNT(*) FROM videos), ?, ?, ?)",
+                (video_key(video), _dump_video(video), DISCOVERED, _now()),
+            )
+
+    def checkpoint(self, video, stage, audio_path=None, transcript=None, abstract=None, summary=None, report_path=None):
+        """
+        Marks `stage` as completed for the video and stores the given artifacts.
+        A stage older than the recorded one leaves the stage unchanged.
+        """
+        columns = {"audio_path": audio_path, "report_path": report_path}
+        for name, value in (("transcript", transcript), ("abstract", abstract), ("summary", summary)):
+            columns[name] = json.dumps(value, ensure_ascii=False) if value is not None else None
+        assignments = ", ".join(f"{name} = COALESCE(?, {name})" for name in columns)
+        with self._lock:
+            row = self._conn.execute("SELECT stage FROM videos WHERE key = ?", (video_key(video),)).fetchone()
+            current = row[0] if row else DISCOVERED
+            if STAGES.index(stage) < STAGES.index(current):
+                stage = current
+            self._conn.execute(
+                f"UPDATE videos SET stage = ?, error = NULL, updated_at = ?, {assignments} WHERE key = ?",
+                (stage, _now(), *columns.values(), video_key(video)),
+            )
+
+    def fail(self, video, error):
+        """
+        Records why the video stopped; its stage stays at the last checkpoint.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE videos SET error = ?, updated_at = ? WHERE key = ?",
+                (str(error), _now(), video_key(video)),
+            )
+
+    def state(self, video):
+        """
+        Returns the video's journal entry as a dict ('stage', 'error' and the
+        decoded artifacts), or None if it was never journaled.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stage, error, audio_path, transcript, abstract, summary, report_path FROM videos WHERE key = ?",
+                (video_key(video),),
+            ).fetchone()
+        if row is None:
+            return None
+        stage, error, audio_path, transcript, abstract, summary, report_path = row
+        return {
+            "stage": stage,
+            "error": error,
+            "audio_path": audio_path,
+            "transcript": json.loads(transcript) if transcript else None,
+            "abstract": json.loads(abstract) if abstract else None,
+            "summary": json.loads(summary) if summary else None,
+            "report_path": report_path,
+        }
+
+    def videos(self):
+        """
+        Every journaled video, in discovery order.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT video FROM videos ORDER BY position").fetchall()
+        return [_load_video(row[0]) for row in rows]
+
+    def counts(self):
+        """
+        Number of videos per stage.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, COUNT(*) FROM videos GROUP BY stage").fetchall()
+        counts = dict.fromkeys(STAGES, 0)
+        counts.update(rows)
+        return counts
+
+    @property
+    def unfinished(self):
+        """
+        Number of videos without a report; a run whose discovery was cut short
+        counts as unfinished too.
+        """
+        counts = self.counts()
+        pending = sum(count for stage, count in counts.items() if stage != REPORTED)
+        if not self.discovery_complete:
+            pending = max(pending, 1)
+        return pending
+
+# Journal path -> (file signature, owner pid, unfinished count), so that listing the
+# runs (on every Streamlit rerun) only reads the journals that changed since
+_run_summaries = {}
+_run_summaries_lock = threading.Lock()
+
+def _file_signature(path):
+    # Commits go to the -wal file, checkpoints to the database itself
+    signature = []
+    for file_path in (path, path + "-wal"):
+        try:
+            stat = os.stat(file_path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def _run_summary(path):
+    signature = _file_signature(path)
+    with _run_summaries_lock:
+        cached = _run_summaries.get(path)
+    if cached and cached[0] == signature:
+        return cached[1:]
+    journal = RunJournal(path, read_only=True)
+    try:
+        summary = (journal.owner_pid, journal.unfinished)
+    finally:
+        journal.close()
+    with _run_summaries_lock:
+        _run_summaries[path] = (signature,) + summary
+    return summary
+
+def find_unfinished_runs(output_root, limit=10):
+    """
+    Trigger_* folders under `output_root` whose journal still has work left and
+    that no live process is working on, newest first, as (path, unfinished video
+    count) pairs. Journals are opened read-only, and only if they changed since
+    the previous call.
+    """
+    if not os.path.isdir(output_root):
+        return []
+    runs = []
+    for name in sorted(os.listdir(output_root), reverse=True):
+        path = os.path.join(output_root, name)
+        journal_path = os.path.join(path, JOURNAL_FILE)
+        if not name.startswith("Trigger_") or not os.path.isfile(journal_path):
+            continue
+        try:
+            owner_pid, unfinished = _run_summary(journal_path)
+        except sqlite3.Error:
+            continue
+        # The owner may have exited without touching the journal, so this is checked every time
+        if unfinished and not _process_alive(owner_pid):
+            runs.append((path, unfinished))
+            if len(runs) >= limit:
+                break
+    return runs
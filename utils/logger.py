@@ -1,33 +1,169 @@
-import streamlit as st
+import atexit
+import collections
 import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
 from enum import Enum
 
+LOG_FILE = os.path.join("logs", "app.log")
+LOG_FILE_MAX_BYTES = 5 * 1024 ** 2  # 5 MB per file
+LOG_FILE_BACKUPS = 5
+
+DEFAULT_MAX_LINES = 5000  # kept in memory for the session
+DEFAULT_RENDER_LINES = 300  # shown in the console, newest last
+DEFAULT_FLUSH_INTERVAL = 0.25  # seconds; at most 4 console updates per second
+
 class LogLevel(Enum):
     INFO = "INFO"
     WARNING = "WARNING"
     CRITICAL = "CRITICAL"
 
+_LOGGING_LEVELS = {
+    LogLevel.INFO: logging.INFO,
+    LogLevel.WARNING: logging.WARNING,
+    LogLevel.CRITICAL: logging.CRITICAL,
+}
+
 class CriticalError(Exception):
     pass
 
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+def get_file_sink(path=LOG_FILE):
+    """
+    Returns the process-wide logging.Logger writing to `path`. Records go through
+    a QueueHandler, and a QueueListener thread writes them to a rotating file and
+    the terminal, so logging from a worker only costs a queue put.
+    """
+    with _sinks_lock:
+        if path not in _sinks:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+            )
+            terminal_handler = logging.StreamHandler(sys.stdout)
+            for handler in (file_handler, terminal_handler):
+                # Entries are formatted by UILogger already
+                handler.setFormatter(logging.Formatter("%(message)s"))
+
+            records = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(records, file_handler, terminal_handler)
+            listener.start()
+
+            sink = logging.getLogger(f"youtube_summarizer.{path}")
+            sink.setLevel(logging.INFO)
+            sink.propagate = False
+            sink.addHandler(logging.handlers.QueueHandler(records))
+            _sinks[path] = (sink, listener)
+        return _sinks[path][0]
+
+def stop_file_sinks():
+    """
+    Flushes and stops every sink's listener thread (e.g. at interpreter exit).
+    """
+    with _sinks_lock:
+        for sink, listener in _sinks.values():
+            listener.stop()
+            for handler in sink.handlers + list(listener.handlers):
+                handler.close()
+            sink.handlers.clear()
+        _sinks.clear()
+
+def close_file_sink(path):
+    """
+    Flushes and stops one sink, e.g. when the job writing it has finished.
+    """
+    with _sinks_lock:
+        entry = _sinks.pop(path, None)
+    if entry:
+        sink, listener = entry
+        listener.stop()
+        for handler in sink.handlers + list(listener.handlers):
+            handler.close()
+        sink.handlers.clear()
+
+atexit.register(stop_file_sinks)
+
 class UILogger:
-    def __init__(self):
-        if "logs" not in st.session_state:
-            st.session_state.logs = []
+    """
+    Session log shown in the Streamlit console.
+    Lines are kept in a bounded ring buffer, and only the newest `render_lines`
+    are sent to the browser, at most once per `flush_interval` (lines logged in
+    between are coalesced into the next update). The full log goes to a rotating
+    file via get_file_sink(). Safe to call from pipeline worker threads.
+    """
+    def __init__(self, max_lines=DEFAULT_MAX_LINES, render_lines=DEFAULT_RENDER_LINES,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, log_file=LOG_FILE):
         self.container = None
+        self.flush_interval = flush_interval
+        self.log_file = log_file
+        self._lines = collections.deque(maxlen=max_lines)
+        self._tail = collections.deque(maxlen=render_lines)
+        self._total = 0
+        self._dirty = False
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._sink = None
 
     def set_container(self, container):
         self.container = container
+        self._dirty = True
 
     def log(self, message: str, level: LogLevel = LogLevel.INFO):
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] [{level.value}] {message}"
-        st.session_state.logs.append(log_entry)
-        
-        print(log_entry) # Also print to terminal
-        
-        if self.container:
-            self.container.code("\n".join(st.session_state.logs), language="text")
+        with self._lock:
+            self._lines.append(log_entry)
+            self._tail.append(log_entry)
+            self._total += 1
+            self._dirty = True
+
+        if self.log_file:
+            if self._sink is None:
+                self._sink = get_file_sink(self.log_file)
+            self._sink.log(_LOGGING_LEVELS[level], log_entry)
+
+        self.flush(force=level is LogLevel.CRITICAL)
+
+    def flush(self, force=False):
+        """
+        Sends the newest lines to the console if anything changed and the last
+        update is at least flush_interval old (or `force`). A thread that finds
+        another one rendering skips; its lines go out with the next update.
+        """
+        if not self.container:
+            return
+        if not self._render_lock.acquire(blocking=force):
+            return
+        try:
+            now = time.monotonic()
+            if not force and now - self._last_flush < self.flush_interval:
+                return
+            with self._lock:
+                if not self._dirty:
+                    return
+                text = self._tail_text()
+                self._dirty = False
+            self._last_flush = now
+            self.container.code(text, language="text")
+        finally:
+            self._render_lock.release()
+
+    def _tail_text(self):
+        hidden = self._total - len(self._tail)
+        lines = list(self._tail)
+        if hidden:
+            lines.insert(0, f"... {hidden} earlier lines (full log: {self.log_file or 'not saved'})")
+        return "\n".join(lines)
 
     def info(self, message: str):
         self.log(message, LogLevel.INFO)
@@ -40,12 +176,32 @@ class UILogger:
         raise CriticalError(message)
 
     def get_logs(self):
-        return "\n".join(st.session_state.logs)
+        """
+        Every line still in the ring buffer.
+        """
+        with self._lock:
+            return "\n".join(self._lines)
+
+    def get_tail(self):
+        """
+        What the console shows: the newest lines only.
+        """
+        with self._lock:
+            return self._tail_text()
 
     def clear(self):
-        st.session_state.logs = []
+        with self._lock:
+            self._lines.clear()
+            self._tail.clear()
+            self._total = 0
+            self._dirty = False
         if self.container:
              self.container.empty()
 
-# Global instance
-logger = UILogger()
+class ConsoleLogger(UILogger):
+    """
+    Logger for headless runs (cli.py): the same interface and log file as the
+    UI, with lines echoed to the terminal by the file sink and no Streamlit console.
+    """
+    def __init__(self, log_file=LOG_FILE):
+        super().__init__(max_lines=1000, render_lines=1, log_file=log_file)
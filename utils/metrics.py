@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import uuid
+import threading
+import itertools
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TRACE_FILE = "trace.jsonl"  # one finished span per line, in the Trigger_* folder
+METRICS_FILE = "metrics.prom"  # Prometheus text format snapshot of the run, same folder
+
+# Numeric span attributes that are added up per span name
+COUNTERS = ("bytes", "audio_seconds", "prompt_tokens", "response_tokens", "retries")
+
+METRIC_PREFIX = "ytsummarizer"
+
+class Span:
+    """
+    One timed step: wall time, CPU time of the thread that ran it, and free-form
+    attributes (video id, bytes downloaded, audio seconds, tokens, key index, ...).
+    """
+    __slots__ = ("id", "parent", "name", "attrs", "start", "wall", "cpu", "_wall_start", "_cpu_start")
+
+    def __init__(self, span_id, parent, name, attrs):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.wall = None
+        self.cpu = None
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.thread_time() - self._cpu_start
+
+    def to_record(self):
+        return {
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "start": self.start,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "attrs": self.attrs,
+        }
+
+class Tracer:
+    """
+    Collects the spans of one run. Finished spans are kept in memory, appended to
+    a JSON-lines trace file (if `path` is given) and added to a MetricsRegistry
+    (the process-wide one by default). Spans opened on the same thread nest, so a
+    Gemini call inside a pipeline stage records the stage as its parent.
+    Safe to use from any number of threads.
+    """
+    def __init__(self, path=None, registry=None):
+        self.path = path
+        self.registry = registry if registry is not None else get_registry()
+        self.trace_id = uuid.uuid4().hex[:12]
+        self._records = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Appending, so a resumed run adds to the trace of its earlier attempts
+            self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def for_run(cls, output_dir, registry=None):
+        return cls(os.path.join(output_dir, TRACE_FILE), registry=registry)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """
+        Times the block as a span named `name`. The yielded Span takes more
+        attributes through set(); an exception is recorded as attribute 'error'.
+        """
+        stack = self._stack()
+        span = Span(next(self._ids), stack[-1].id if stack else None, name, attrs)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs.setdefault("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            stack.pop()
+            span.finish()
+            self._record(span)
+
+    def annotate(self, **attrs):
+        """
+        Sets attributes on the innermost span open on this thread, if any.
+        """
+        stack = self._stack()
+        if stack:
+            stack[-1].set(**attrs)
+
+    def _record(self, span):
+        record = dict(span.to_record(), trace=self.trace_id)
+        with self._lock:
+            self._records.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+        if self.registry is not None:
+            self.registry.add(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def summary(self):
+        return summarize_spans(self.records())
+
+    def write_metrics(self, path):
+        """
+        Writes this run's totals in the Prometheus text format (atomically).
+        """
+        registry = MetricsRegistry()
+        for record in self.records():
+            registry.add(record)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(registry.render())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize_spans(records):
+    """
+    Per span name, in order of first appearance: count, errors, wall time
+    (total, p50, p95), CPU time, the summed COUNTERS and, where audio was
+    processed, the real-time factor (wall seconds per audio second).
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault(record["name"], []).append(record)
+
+    rows = []
+    for name, group in groups.items():
+        walls = [record["wall"] or 0.0 for record in group]
+        row = {
+            "span": name,
+            "count": len(group),
+            "errors": sum(1 for record in group if record["attrs"].get("error")),
+            "wall_total": sum(walls),
+            "wall_p50": _percentile(walls, 0.5),
+            "wall_p95": _percentile(walls, 0.95),
+            "cpu_total": sum(record["cpu"] or 0.0 for record in group),
+        }
+        for counter in COUNTERS:
+            row[counter] = sum(record["attrs"].get(counter) or 0 for record in group)
+        row["rtf"] = row["wall_total"] / row["audio_seconds"] if row["audio_seconds"] else None
+        rows.append(row)
+    return rows
+
+def format_summary(rows):
+    """
+    The summary as fixed-width text lines, for logs and the console.
+    """
+    lines = [f"{'span':<12}{'count':>6}{'errors':>7}{'wall s':>9}{'p50 s':>8}{'p95 s':>8}{'cpu s':>8}{'MB':>8}{'RTF':>7}{'tokens in/out':>16}{'retries':>8}"]
+    for row in rows:
+        rtf = f"{row['rtf']:.2f}" if row["rtf"] is not None else "-"
+        tokens = f"{row['prompt_tokens']}/{row['response_tokens']}"
+        lines.append(
+            f"{row['span']:<12}{row['count']:>6}{row['errors']:>7}{row['wall_total']:>9.1f}{row['wall_p50']:>8.2f}"
+            f"{row['wall_p95']:>8.2f}{row['cpu_total']:>8.1f}{row['bytes'] / 1e6:>8.1f}{rtf:>7}{tokens:>16}{row['retries']:>8}"
+        )
+    return lines
+
+def load_trace(path):
+    """
+    Reads the span records of a trace file, skipping a torn last line.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class MetricsRegistry:
+    """
+    Running totals of finished spans per span name (and Gemini calls per model
+    and key), rendered in the Prometheus text exposition format. The
+    process-wide registry (get_registry) adds up every run of the process.
+    """
+    def __init__(self):
+        self._spans = {}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        attrs = record["attrs"]
+        with self._lock:
+            totals = self._spans.setdefault(record["name"], dict.fromkeys(("count", "errors", "wall", "cpu") + COUNTERS, 0))
+            totals["count"] += 1
+            totals["errors"] += 1 if attrs.get("error") else 0
+            totals["wall"] += record["wall"] or 0.0
+            totals["cpu"] += record["cpu"] or 0.0
+            for counter in COUNTERS:
+                totals[counter] += attrs.get(counter) or 0
+            if attrs.get("key_index") is not None:
+                key = (attrs.get("model", ""), attrs["key_index"])
+                self._calls[key] = self._calls.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            spans = {name: dict(totals) for name, totals in self._spans.items()}
+            calls = dict(self._calls)
+
+        metrics = [
+            ("spans_total", "count", "Finished spans."),
+            ("span_errors_total", "errors", "Spans that ended with an error."),
+            ("span_wall_seconds_total", "wall", "Wall time spent in spans."),
+            ("span_cpu_seconds_total", "cpu", "CPU time of the threads running the spans."),
+            ("downloaded_bytes_total", "bytes", "Audio bytes downloaded."),
+            ("audio_seconds_total", "audio_seconds", "Seconds of audio processed."),
+            ("prompt_tokens_total", "prompt_tokens", "Gemini prompt tokens."),
+            ("response_tokens_total", "response_tokens", "Gemini response tokens."),
+            ("retries_total", "retries", "Gemini retries (429/503)."),
+        ]
+        lines = []
+        for metric, field, help_text in metrics:
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+            for name, totals in spans.items():
+                lines.append(f'{METRIC_PREFIX}_{metric}{{span="{_label(name)}"}} {totals[field]:g}')
+        lines.append(f"# HELP {METRIC_PREFIX}_gemini_calls_total Successful Gemini calls per model and API key index.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_gemini_calls_total counter")
+        for (model, key_index), count in sorted(calls.items()):
+            lines.append(f'{METRIC_PREFIX}_gemini_calls_total{{model="{_label(model)}",key_index="{key_index}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """
+    Returns the process-wide MetricsRegistry that every Tracer reports to by default.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+class NullTracer(Tracer):
+    """
+    Tracer that measures nothing and keeps nothing; the default where no tracer is passed.
+    """
+    def __init__(self):
+        super().__init__(registry=MetricsRegistry())
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        yield Span(None, None, name, attrs)
+
+    def annotate(self, **attrs):
+        pass
+
+NULL_TRACER = NullTracer()
+
+def serve_metrics(port, host="127.0.0.1", registry=None):
+    """
+    Serves the registry (default: the process-wide one) as a Prometheus scrape
+    target at http://host:port/metrics on a daemon thread. Returns the server;
+    call shutdown() on it to stop.
+    """
+    registry = registry if registry is not None else get_registry()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,864 @@
+import os
+import datetime
+import shutil
+import heapq
+import itertools
+import queue
+import threading
+
+# Stage modules pull in yt_dlp, numpy, ffmpeg, feedparser, ... and are imported
+# inside process_videos/run_batch, so importing this module (every Streamlit
+# rerun, `cli.py --help`) stays fast.
+
+# Marker passed down the queues to tell workers that no more items will arrive
+_STOP = object()
+
+
+def sanitize(name):
+    return "".join([c for c in name if c.isalpha() or c.isdigit() or c in (' ', '-', '_')]).rstrip()
+
+
+def build_filename_base(video):
+    """
+    Format for filename: <upload_time>_<YouTube_Channel_Name>_<Video_Title>
+    """
+    upload_time = video.get('published')  # datetime object
+    upload_time_str = upload_time.strftime("%Y-%m-%d_%H-%M-%S") if upload_time else "UnknownTime"
+    safe_title = sanitize(video.get('title', 'Unknown_Title'))
+    safe_channel = sanitize(video.get('channel_name', 'Unknown_Channel'))
+
+    # Truncate if too long to avoid FS errors
+    return f"{upload_time_str}_{safe_channel}_{safe_title}"[:200]
+
+
+class Stage:
+    """
+    One step of the pipeline. `func` receives the work item (a dict) and returns it,
+    setting item['status'] to something other than "ok" to drop it from later stages.
+    With `priority`, waiting items are handed out lowest priority(item) first
+    instead of in arrival order.
+    """
+    def __init__(self, name, func, workers=1, priority=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.priority = priority
+
+
+class _PriorityQueue(queue.Queue):
+    """
+    Bounded queue that hands out the item with the lowest priority(item) first
+    (ties in arrival order). _STOP always sorts last.
+    """
+    def __init__(self, maxsize, priority):
+        self.priority = priority
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.queue = []
+        self._sequence = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        key = float("inf") if item is _STOP else self.priority(item)
+        heapq.heappush(self.queue, (key, next(self._sequence), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[2]
+
+
+class Pipeline:
+    """
+    Runs items through a list of stages, each with its own worker threads and a
+    bounded queue in front of it, so that different items can be in different
+    stages at the same time. Finished items are yielded in input order, or with
+    `ordered=False` as soon as each one is done (so a stage `priority` decides
+    which results come out first).
+    Setting `cancel_event` stops the pipeline like an abort, but without an error:
+    items already inside a stage function finish it, everything else is dropped.
+    """
+    def __init__(self, stages, logger, queue_size=4, thread_hook=None, cancel_event=None, on_stage=None, ordered=True):
+        self.stages = stages
+        self.ordered = ordered
+        self.logger = logger
+        self.queue_size = max(1, int(queue_size))
+        # Called with every new thread before it starts (e.g. to attach the Streamlit script context)
+        self.thread_hook = thread_hook
+        self.cancel_event = cancel_event
+        # Called as on_stage(item, stage_name) from the worker thread right before a stage runs an item
+        # (and with "queued" when the item enters the pipeline)
+        self.on_stage = on_stage
+
+        self._queues = [
+            _PriorityQueue(self.queue_size, stage.priority) if stage.priority else queue.Queue(maxsize=self.queue_size)
+            for stage in stages
+        ]
+        self._done = queue.Queue()
+        self._abort = threading.Event()
+        self._errors = []
+        self._lock = threading.Lock()
+        self._alive = [stage.workers for stage in stages]
+        self._threads = []
+
+    def _start_thread(self, target, *args, name=None):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        if self.thread_hook:
+            self.thread_hook(thread)
+        thread.start()
+        self._threads.append(thread)
+
+    def _put(self, q, item):
+        # Bounded put that gives up once the pipeline is aborted, so no thread blocks forever
+        while True:
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                if self._aborted() and item is not _STOP:
+                    return False
+
+    def _aborted(self):
+        return self._abort.is_set() or (self.cancel_event is not None and self.cancel_event.is_set())
+
+    def abort(self):
+        """
+        Stops the run from outside the consuming thread, e.g. when the consumer of a
+        later step gave up: like a cancel, the items in progress finish their stage.
+        """
+        self._abort.set()
+
+    @property
+    def stopping(self):
+        """
+        True once the run was aborted by an error or cancelled; lets a blocking
+        item source (see process_videos) give up.
+        """
+        return self._aborted()
+
+    def _stage_output(self, stage_index):
+        if stage_index + 1 < len(self.stages):
+            return self._queues[stage_index + 1]
+        return self._done
+
+    def _feed(self, items):
+        first = self._queues[0]
+        try:
+            for index, item in enumerate(items):
+                if self._aborted():
+                    break
+                item["index"] = index
+                item.setdefault("status", "ok")
+                if self.on_stage:
+                    self.on_stage(item, "queued")
+                if not self._put(first, item):
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._put(first, _STOP)
+
+    def _work(self, stage_index):
+        stage = self.stages[stage_index]
+        in_q = self._queues[stage_index]
+        out_q = self._stage_output(stage_index)
+
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                break
+            if self._aborted():
+                continue
+            if item["status"] == "ok":
+                try:
+                    if self.on_stage:
+                        self.on_stage(item, stage.name)
+                    item = stage.func(item)
+                except Exception as e:
+                    self._fail(e)
+                    continue
+            self._put(out_q, item)
+
+        # Last worker of this stage to exit tells the next stage to stop
+        with self._lock:
+            self._alive[stage_index] -= 1
+            last = self._alive[stage_index] == 0
+        if last:
+            if out_q is self._done:
+                out_q.put(_STOP)
+            else:
+                for _ in range(self.stages[stage_index + 1].workers):
+                    self._put(out_q, _STOP)
+
+    def _fail(self, error):
+        with self._lock:
+            self._errors.append(error)
+        self._abort.set()
+
+    def run(self, items):
+        """
+        Generator yielding processed items in the order they were fed in (or in
+        the order they finish, see `ordered`). Re-raises the first error raised by any stage after the workers have stopped.
+        """
+        self._start_thread(self._feed, items, name="pipeline-feed")
+        for stage_index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                self._start_thread(self._work, stage_index, name=f"pipeline-{stage.name}-{n}")
+
+        # Reorder buffer: hold early finishers until every item before them is done
+        pending = {}
+        next_index = 0
+        try:
+            while True:
+                item = self._done.get()
+                if item is _STOP:
+                    break
+                if not self.ordered:
+                    yield item
+                    continue
+                pending[item["index"]] = item
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        except BaseException:
+            # Consumer gave up (error or generator closed): let the workers drain and exit
+            self._abort.set()
+            raise
+
+        for thread in self._threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+
+def is_finished_state(state):
+    """
+    True for the process_videos progress states that end a video: "done", a failure
+    ("<stage>_failed") or "live_upcoming" (skipped, the live event never started).
+    Every other state, "queued", a stage name or "live_deferred", is still in progress.
+    """
+    return state == "done" or state == "live_upcoming" or state.endswith("_failed")
+
+
+def process_videos(videos, output_dir, logger, model_name, api_keys, abstract_model, summary_model,
+                   download_workers=2, transcribe_workers=1, summarize_workers=2, queue_size=4, thread_hook=None,
+                   transcript_store=None, response_cache=None, summarize_mode="auto", chunk_workers=None,
+                   backend="auto", cancel_event=None, on_progress=None, audio_format="speech", transcode_audio=False,
+                   live_retry_minutes=10, journal=None, audio_decoder=None, tracer=None, search_index=None,
+                   feed_state=None, model_limits=None, ordered=True):
+    """
+    Downloads, transcribes and summarizes the videos with overlapping stages and writes
+    one markdown report per video, in the order the videos were given, so reports, the
+    journal and the feed state are updated deterministically. Transcripts are summarized
+    as one run-level summarizer.SummaryBatch: keys are planned across the whole run and
+    the shortest waiting transcript goes first, on up to `summarize_workers` threads; with
+    `ordered=False` each report is also written as soon as its summary is done instead of
+    after those of the videos given before it.
+    `videos` may be any iterable, e.g. the discover_videos generator, and is consumed lazily.
+    With a TranscriptStore, videos transcribed before skip both download and transcription,
+    and with a ResponseCache repeated Gemini prompts cost no API quota. `model_limits`
+    (gemini_pool.parse_model_limits output) are this run's Gemini RPM/TPM limits.
+    `backend` selects the transcription backend by name ("auto", "mlx", "ctranslate2", ...).
+    `audio_format` ("speech" or "best") and `transcode_audio` are passed to the DownloadManager.
+    Upcoming live events are parked on a RetryQueue and fed through the pipeline again with
+    exponential backoff for up to `live_retry_minutes`, while the other videos keep going.
+    Downloaded files are decoded to 16 kHz samples by one ffmpeg process in the decode stage
+    (`audio_decoder`, default audio.load_audio) and deleted right away; the transcription
+    backend only ever sees the array.
+    `on_progress(index, video, state)` is called from worker threads as each video enters a
+    stage ("queued", "download", "decode", "transcribe", "summarize") and once it is finished
+    ("done" or its failure status, see is_finished_state). Setting `cancel_event` stops the run after the steps in progress.
+    An error while processing one video (including a CriticalError from logger.critical) only
+    fails that video. With a RunJournal, every video's completed stages and their artifacts are
+    checkpointed, and a video journaled before continues after its last checkpoint (a reported
+    one is skipped).
+    With a metrics.Tracer, every stage a video goes through is recorded as a span (bytes
+    downloaded, audio seconds, Gemini calls nested inside the summarize span).
+    With a search_index.SearchIndex, every report is indexed as soon as it is written.
+    With a channel_monitor.FeedStateStore, videos discovered with since_last_run are marked
+    seen once they have a report; failed, cancelled and skipped live events stay pending, so
+    the next since-last-run poll picks them up again.
+    Returns the list of video links that could not be downloaded yet (upcoming live events).
+    """
+    from utils.logger import CriticalError
+    from utils.journal import DOWNLOADED, TRANSCRIBED, ABSTRACTED, SUMMARIZED, REPORTED
+    from utils.segments import SegmentStore
+    from utils.downloader import get_download_manager, DownloadResult, RetryQueue
+    from utils.audio import load_audio, SAMPLE_RATE
+    from utils.metrics import NULL_TRACER
+    from utils.transcriber import transcribe, DECODE_OPTIONS, DEFAULT_CHUNK_WORKERS
+    from utils.transcription_backends import get_backend
+    from utils.summarizer import SummaryBatch, IncrementalSummarizer
+
+    if chunk_workers is None:
+        chunk_workers = DEFAULT_CHUNK_WORKERS
+    if audio_decoder is None:
+        audio_decoder = load_audio
+    tracer = tracer or NULL_TRACER
+    downloads = get_download_manager(download_workers, audio_format, transcode_audio)
+    # Resolve once so the model is loaded a single time and the cache key names the real backend
+    transcription_backend = get_backend(backend, model_name)
+    transcript_key_options = dict(DECODE_OPTIONS, backend=transcription_backend.name)
+    live_retries = RetryQueue(horizon=max(0.0, live_retry_minutes) * 60)
+
+    def checkpoint(item, stage, **artifacts):
+        if journal is not None:
+            journal.checkpoint(item["video"], stage, **artifacts)
+
+    def resume_state(video):
+        """
+        The parts of a work item restored from the journal, or None if the video already has a report.
+        """
+        state = journal.state(video) if journal is not None else None
+        if state is None:
+            return {}
+        if state["stage"] == REPORTED:
+            return None
+        item = {}
+        if state["transcript"]:
+            item["transcript"] = state["transcript"]["text"]
+            item["segments"] = SegmentStore.from_segments(state["transcript"]["segments"])
+        elif state["audio_path"] and os.path.exists(state["audio_path"]):
+            item["audio_path"] = state["audio_path"]
+        if state["abstract"]:
+            item["abstract"] = state["abstract"]
+        if state["summary"]:
+            item["summary_data"] = state["summary"]
+        return item
+
+    def mark_seen(video):
+        if feed_state is not None and video.get("rss_url") and video.get("video_id"):
+            feed_state.mark_seen(video["rss_url"], video["video_id"])
+            feed_state.save()
+
+    def drop_summarizer(item):
+        # Its windows will never be needed: stop them and free the executor's threads
+        summarizer = item.pop("summarizer", None)
+        if summarizer is not None:
+            summarizer.close()
+
+    def isolated(stage_name, func):
+        # A failing video is marked and passed on; the rest of the batch keeps going
+        def run(item):
+            try:
+                return func(item)
+            except CriticalError as e:
+                # Already logged by logger.critical
+                error = e
+            except Exception as e:
+                logger.warning(f"{stage_name.capitalize()} failed for {item['video'].get('title', 'Unknown_Title')}: {e}")
+                error = e
+            item.pop("audio", None)
+            drop_summarizer(item)
+            item["status"] = f"{stage_name}_failed"
+            item["error"] = str(error)
+            return item
+        return run
+
+    def traced(stage_name, func):
+        def run(item):
+            video = item["video"]
+            with tracer.span(stage_name, video_id=video.get("video_id"), index=item.get("origin", item["index"])) as span:
+                item = func(item)
+                if item["status"] != "ok":
+                    span.set(status=item["status"], error=item.get("error"))
+                return item
+        return run
+
+    def download_stage(item):
+        try:
+            return fetch_audio(item)
+        finally:
+            # Past this point the item can no longer be scheduled for a retry
+            live_retries.done()
+
+    def fetch_audio(item):
+        video = item["video"]
+        if "attempt" in item:
+            logger.info(f"Retrying live event: {video.get('title', 'Unknown_Title')} (attempt {item['attempt'] + 1})")
+        else:
+            logger.info(f"Processing video: {video.get('title', 'Unknown_Title')}")
+
+        if "transcript" in item or "audio_path" in item:
+            logger.info(f"Resuming {video.get('link')} from the run journal")
+            return item
+
+        if transcript_store is not None:
+            cached = transcript_store.get(video.get('video_id'), model_name, transcript_key_options)
+            if cached:
+                logger.info(f"Using cached transcript for {video.get('link')} (length: {len(cached['text'])} chars)")
+                item["transcript"] = cached["text"]
+                item["segments"] = SegmentStore.from_segments(cached["segments"])
+                tracer.annotate(cached=True)
+                checkpoint(item, TRANSCRIBED, transcript={"text": cached["text"], "segments": cached["segments"]})
+                return item
+
+        download = downloads.download(video.get('link'), output_dir, logger)
+
+        if download.status == DownloadResult.LIVE_UPCOMING:
+            attempt = item.get("attempt", 0) + 1
+            since = item.get("deferred_since", live_retries.clock())
+            retry = {"video": video, "origin": item.get("origin", item["index"]), "attempt": attempt, "deferred_since": since}
+            delay = live_retries.schedule(retry, attempt, since)
+            if delay is None:
+                logger.info(f"The audio {video.get('link')} cannot be downloaded in the moment, skip to the next audio")
+                item["status"] = "live_upcoming"
+            else:
+                logger.info(f"The audio {video.get('link')} cannot be downloaded yet, retrying in {delay:.0f} seconds")
+                item["status"] = "live_deferred"
+        elif not download.ok:
+            item["status"] = "download_failed"
+        else:
+            item["audio_path"] = download.path
+            tracer.annotate(bytes=os.path.getsize(download.path))
+            checkpoint(item, DOWNLOADED, audio_path=download.path)
+        return item
+
+    def decode_stage(item):
+        if "transcript" in item:
+            # Cache hit in the download stage
+            return item
+
+        audio_path = item.pop("audio_path")
+        try:
+            item["audio"] = audio_decoder(audio_path)
+            tracer.annotate(audio_seconds=len(item["audio"]) / SAMPLE_RATE)
+        except Exception as e:
+            logger.warning(f"Could not decode {audio_path}: {e}")
+            item["status"] = "decode_failed"
+        finally:
+            # The samples are all that is needed from here on, free the disk space early
+            try:
+                os.remove(audio_path)
+                logger.info(f"Removed temp audio: {audio_path}")
+            except:
+                pass
+        return item
+
+    def transcribe_stage(item):
+        if "transcript" in item:
+            return item
+
+        # Popped so the samples are freed as soon as this stage is done with them
+        audio = item.pop("audio")
+        tracer.annotate(audio_seconds=len(audio) / SAMPLE_RATE)
+        # Long transcripts start their map step on finalized segments while Whisper keeps going
+        summarizer = None
+        if summarize_mode != "single":
+            summarizer = IncrementalSummarizer(
+                logger, api_keys, abstract_model=abstract_model, summary_model=summary_model,
+                cache=response_cache, mode=summarize_mode, key_index=batch.planner.next_key(abstract_model),
+                tracer=tracer, model_limits=model_limits
+            )
+        try:
+            result = transcribe(audio, model_name, logger, chunk_workers=chunk_workers, backend=transcription_backend,
+                                on_segment=summarizer.add_segment if summarizer else None)
+        except BaseException:
+            if summarizer:
+                summarizer.close()
+            raise
+
+        if not result or not result["text"]:
+            if summarizer:
+                summarizer.close()
+            item["status"] = "transcribe_failed"
+            return item
+
+        item["transcript"] = result["text"]
+        # Columns instead of one dict per segment while the item waits for Gemini
+        item["segments"] = SegmentStore.from_segments(result["segments"])
+        item["summarizer"] = summarizer
+        checkpoint(item, TRANSCRIBED, transcript={"text": result["text"], "segments": item["segments"].to_dicts()})
+        if transcript_store is not None:
+            transcript_store.put(item["video"].get('video_id'), model_name, transcript_key_options, result)
+        return item
+
+    def summarize_stage(item):
+        if on_progress:
+            on_progress(item.get("origin", item["index"]), item["video"], "summarize")
+        summary_data = batch.summarize(item).pop("summary")
+        if summary_data:
+            item["summary_data"] = summary_data
+            checkpoint(item, SUMMARIZED, summary=summary_data)
+        else:
+            item["status"] = "summarize_failed"
+        return item
+
+    batch = SummaryBatch(
+        logger, api_keys, abstract_model=abstract_model, summary_model=summary_model, cache=response_cache,
+        mode=summarize_mode, max_concurrency=summarize_workers, tracer=tracer, model_limits=model_limits,
+        run=traced("summarize", isolated("summarize", summarize_stage)), thread_hook=thread_hook, cancel_event=cancel_event,
+    )
+
+    pipeline = Pipeline(
+        [
+            Stage("download", traced("download", isolated("download", download_stage)), download_workers),
+            # Decoded audio takes ~230 MB per hour, so at most queue_size items wait for Whisper with samples in memory
+            Stage("decode", traced("decode", isolated("decode", decode_stage)), transcribe_workers),
+            Stage("transcribe", traced("transcribe", isolated("transcribe", transcribe_stage)), transcribe_workers),
+        ],
+        logger,
+        queue_size=queue_size,
+        thread_hook=thread_hook,
+        cancel_event=cancel_event,
+        # Transcripts go to the batch as soon as they exist; the report order is restored below
+        ordered=False,
+        # A retried live event keeps the index of its first attempt ("origin") in progress reports
+        on_stage=(lambda item, stage: on_progress(item.get("origin", item["index"]), item["video"], stage)) if on_progress else None,
+    )
+
+    def feed_batch():
+        try:
+            for item in pipeline.run(work_items()):
+                if item["status"] == "ok" and "summary_data" not in item:
+                    item["transcript_text"] = item["transcript"]
+                    item["video_link"] = item["video"].get("link")
+                    item["on_abstract"] = lambda abstract, item=item: checkpoint(item, ABSTRACTED, abstract=abstract)
+                    batch.submit(item)
+                else:
+                    # Failed, deferred, or summarized before the run was interrupted
+                    drop_summarizer(item)
+                    batch.add_done(item)
+        except BaseException as e:
+            batch.close(error=e)
+        else:
+            batch.close()
+
+    def finished_items():
+        held = {}
+        next_index = 0
+        for item in batch.results():
+            if not ordered:
+                yield item
+                continue
+            # Reorder buffer: hold early finishers until every item before them is done
+            held[item["index"]] = item
+            while next_index in held:
+                yield held.pop(next_index)
+                next_index += 1
+        # Items dropped on cancel leave gaps; the rest still comes out in order
+        for index in sorted(held):
+            yield held[index]
+
+    already_reported = []
+
+    def work_items():
+        for video in videos:
+            if journal is not None:
+                journal.add_video(video)
+            restored = resume_state(video)
+            if restored is None:
+                logger.info(f"Already reported: {video.get('title', 'Unknown_Title')}")
+                already_reported.append(video.get("link"))
+                mark_seen(video)
+                continue
+            live_retries.track()
+            yield dict(restored, video=video)
+        # Then the deferred live events, as they come due; ends once none is scheduled or in flight
+        yield from live_retries.drain(stop=lambda: pipeline.stopping)
+
+    feeder = threading.Thread(target=feed_batch, name="pipeline-summaries", daemon=True)
+    if thread_hook:
+        thread_hook(feeder)
+    feeder.start()
+
+    failed_live_videos = []
+    processed = 0
+    try:
+        for item in finished_items():
+            video = item["video"]
+            video_title = video.get('title', 'Unknown_Title')
+            index = item.get("origin", item["index"])
+
+            if item["status"] == "live_deferred":
+                # Fed through the pipeline again later
+                if on_progress:
+                    on_progress(index, video, item["status"])
+                continue
+
+            processed += 1
+            if item["status"] != "ok" and journal is not None:
+                journal.fail(video, item.get("error") or item["status"])
+
+            if item["status"] == "live_upcoming":
+                failed_live_videos.append(video.get('link'))
+                if on_progress:
+                    on_progress(index, video, item["status"])
+                continue
+
+            report_path = None
+            if item["status"] == "ok":
+                try:
+                    with tracer.span("report", video_id=video.get("video_id"), index=index):
+                        report_path = write_report(video, item["summary_data"], output_dir, segments=item.get("segments"))
+                except Exception as e:
+                    # Like a failed stage: the video stays unfinished and the rest of the batch keeps going
+                    logger.warning(f"Report failed for {video_title}: {e}")
+                    item["status"] = "report_failed"
+                    if journal is not None:
+                        journal.fail(video, str(e))
+
+            if report_path:
+                checkpoint(item, REPORTED, report_path=report_path)
+                logger.info(f"Report saved to: {report_path}")
+                mark_seen(video)
+                if search_index is not None:
+                    try:
+                        search_index.add_report(report_path, video, item["summary_data"]["summary_content"],
+                                                segments=item.get("segments"),
+                                                transcript=item["summary_data"].get("detailed_transcript"))
+                    except Exception as e:
+                        # The report is saved; SearchIndex.sync() indexes it later
+                        logger.warning(f"Could not index {report_path}: {e}")
+
+            if on_progress:
+                on_progress(index, video, "done" if item["status"] == "ok" else item["status"])
+
+            logger.info(f"Finished processing {video_title}")
+    except BaseException:
+        # Gave up on the run: stop transcribing and drop the transcripts still waiting for Gemini
+        pipeline.abort()
+        batch.cancel()
+        raise
+    feeder.join()
+
+    if cancel_event is not None and cancel_event.is_set():
+        logger.warning("Processing cancelled.")
+    elif processed == 0 and already_reported:
+        logger.info(f"All {len(already_reported)} videos of this run were already reported.")
+    elif processed == 0:
+        logger.info("No videos found in the specified time period.")
+
+    if response_cache is not None:
+        stats = response_cache.stats()
+        logger.info(f"Gemini response cache: {stats['hits']} hits, {stats['misses']} misses")
+
+    return failed_live_videos
+
+
+def _as_datetime(value):
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _journaled_videos(journal, discovered, resume=False):
+    """
+    Records discovery in the journal. A resumed run first replays the journaled
+    videos and only asks the channels again if discovery was cut short.
+    """
+    from utils.journal import video_key
+
+    seen = set()
+    if resume:
+        for video in journal.videos():
+            seen.add(video_key(video))
+            yield video
+        if journal.discovery_complete:
+            return
+    for video in discovered:
+        if video_key(video) not in seen:
+            yield video
+    journal.discovery_done()
+
+
+def run_batch(settings, api_keys, logger, rss_cache=None, feed_state=None, thread_hook=None,
+              cancel_event=None, on_progress=None):
+    """
+    One complete run: creates the trigger folder under settings['output_dir'], discovers
+    the channels' videos and streams them through process_videos.
+    `settings` holds the config.json keys plus 'channels' (a list of URLs) and
+    'start'/'end' (datetimes or ISO strings). Pass shared RSSUrlCache/FeedStateStore
+    instances when several runs may be active at once, so they don't overwrite each other's state.
+    Progress is journaled in the trigger folder (see journal.RunJournal). With
+    settings['resume_dir'] set to such a folder, that run is continued instead, with
+    the settings it was started with: only unfinished videos and stages are processed.
+    Every stage is traced (see metrics.Tracer) to trace.jsonl and metrics.prom in the folder.
+    Reports are added to the search index in settings['output_dir'] (see search_index.SearchIndex).
+    A new run that discovers no videos removes its folder again and returns None as 'output_dir'.
+    Returns a dict with 'output_dir', 'failed_live_videos', 'unfinished_videos' and
+    'stage_summary' (metrics.summarize_spans rows).
+    """
+    from utils.journal import RunJournal, JOURNAL_FILE
+    from utils.metrics import Tracer, METRICS_FILE, format_summary
+    from utils.search_index import SearchIndex
+
+    resume_dir = settings.get("resume_dir")
+    if resume_dir:
+        if not os.path.isfile(os.path.join(resume_dir, JOURNAL_FILE)):
+            logger.critical(f"No run journal found in {resume_dir}")
+        journal = RunJournal.for_run(resume_dir)
+        if journal.in_progress:
+            journal.close()
+            logger.critical(f"The run in {resume_dir} is still being processed")
+        # The run keeps the settings it was started with
+        settings = dict(journal.settings, resume_dir=resume_dir)
+        logger.info(f"Resuming run: {', '.join(f'{count} {stage}' for stage, count in journal.counts().items() if count)}")
+
+    from utils.gemini_pool import parse_model_limits
+    try:
+        # Per run, so concurrent jobs and daemon polls keep their own limits
+        model_limits = parse_model_limits(settings.get("gemini_rate_limits"))
+    except ValueError as e:
+        logger.critical(f"Invalid Gemini rate limits: {e}")
+
+    start_datetime = _as_datetime(settings["start"])
+    end_datetime = _as_datetime(settings["end"])
+    since_last_run = settings.get("since_last_run", False)
+
+    logger.info("Starting processing...")
+    if since_last_run:
+        logger.info("Time Period: new videos since last run")
+    else:
+        logger.info(f"Time Period: {start_datetime} - {end_datetime}")
+    logger.info(f"Model: {settings['model_name']}")
+
+    if resume_dir:
+        current_output_dir = resume_dir
+    else:
+        # Create Trigger Time Folder
+        trigger_time_str = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        start_str = start_datetime.strftime("%Y-%m-%d_%H-%M-%S")
+        end_str = end_datetime.strftime("%Y-%m-%d_%H-%M-%S")
+
+        if since_last_run:
+            folder_name = f"Trigger_{trigger_time_str}_SinceLastRun"
+        else:
+            folder_name = f"Trigger_{trigger_time_str}_From_{start_str}_{end_str}"
+        current_output_dir = os.path.join(settings["output_dir"], folder_name)
+        os.makedirs(current_output_dir, exist_ok=True)
+        journal = RunJournal.for_run(current_output_dir)
+        journal.start(settings)
+    logger.info(f"Output Directory: {current_output_dir}")
+
+    journal.claim()
+    # Spans of this run go to trace.jsonl in the trigger folder (appended to on resume)
+    tracer = Tracer.for_run(current_output_dir)
+    # Shared by all runs under the output folder, next to their Trigger_* folders
+    search_index = SearchIndex.for_output(os.path.dirname(os.path.abspath(current_output_dir)))
+    empty = False
+    try:
+        result = _run_journaled(settings, api_keys, logger, journal, current_output_dir, start_datetime, end_datetime,
+                                since_last_run, rss_cache, feed_state, thread_hook, cancel_event, on_progress, tracer,
+                                search_index, model_limits)
+        # A run that found nothing leaves no folder behind, e.g. a daemon poll without new videos
+        empty = not resume_dir and journal.discovery_complete and not any(journal.counts().values())
+    finally:
+        journal.release()
+        journal.close()
+        search_index.close()
+        tracer.close()
+        if not empty:
+            tracer.write_metrics(os.path.join(current_output_dir, METRICS_FILE))
+
+    if empty:
+        shutil.rmtree(current_output_dir, ignore_errors=True)
+        logger.info("No videos found; no run folder was kept.")
+        result["output_dir"] = None
+    result["stage_summary"] = tracer.summary()
+    if result["stage_summary"]:
+        logger.info("Stage timings:\n\t" + "\n\t".join(format_summary(result["stage_summary"])))
+    return result
+
+
+def _run_journaled(settings, api_keys, logger, journal, current_output_dir, start_datetime, end_datetime,
+                   since_last_run, rss_cache, feed_state, thread_hook, cancel_event, on_progress, tracer, search_index,
+                   model_limits):
+    from utils.channel_monitor import discover_videos, RSSUrlCache, RSS_CACHE_FILE, FeedStateStore, FEED_STATE_FILE
+    from utils.transcript_store import TranscriptStore, TRANSCRIPT_CACHE_DIR
+    from utils.summarizer import ResponseCache, RESPONSE_CACHE_DIR
+
+    channel_list = settings.get("channels") or []
+    if not channel_list:
+        logger.warning("No channels provided.")
+        return {"output_dir": current_output_dir, "failed_live_videos": [], "unfinished_videos": 0}
+    logger.info(f"Processing {len(channel_list)} channels.")
+
+    if feed_state is None:
+        feed_state = FeedStateStore(FEED_STATE_FILE)
+    # Discovery streams straight into the pipeline, so downloads start as soon as the first feed has been fetched
+    discovered = discover_videos(
+        channel_list,
+        start_datetime,
+        end_datetime,
+        logger,
+        rss_cache=rss_cache if rss_cache is not None else RSSUrlCache(RSS_CACHE_FILE),
+        feed_state=feed_state,
+        since_last_run=since_last_run,
+        tracer=tracer
+    )
+    videos = _journaled_videos(journal, discovered, resume=bool(settings.get("resume_dir")))
+
+    transcript_cache_mb = settings.get("transcript_cache_mb", 2048)
+    response_cache_mb = settings.get("response_cache_mb", 256)
+    failed_live_videos = process_videos(
+        videos,
+        current_output_dir,
+        logger,
+        model_name=settings["model_name"],
+        api_keys=api_keys,
+        abstract_model=settings["gemini_abstract_model"],
+        summary_model=settings["gemini_summary_model"],
+        download_workers=settings.get("download_workers", 2),
+        transcribe_workers=settings.get("transcribe_workers", 1),
+        summarize_workers=settings.get("summarize_workers", 2),
+        queue_size=settings.get("queue_size", 4),
+        thread_hook=thread_hook,
+        transcript_store=TranscriptStore(TRANSCRIPT_CACHE_DIR, max_bytes=transcript_cache_mb * 1024 * 1024) if transcript_cache_mb else None,
+        response_cache=ResponseCache(RESPONSE_CACHE_DIR, max_bytes=response_cache_mb * 1024 * 1024) if response_cache_mb else None,
+        summarize_mode=settings.get("summarize_mode", "auto"),
+        chunk_workers=settings.get("chunk_workers"),
+        backend=settings.get("transcription_backend", "auto"),
+        audio_format=settings.get("audio_format", "speech"),
+        transcode_audio=settings.get("transcode_audio", False),
+        live_retry_minutes=settings.get("live_retry_minutes", 10),
+        cancel_event=cancel_event,
+        on_progress=on_progress,
+        journal=journal,
+        tracer=tracer,
+        search_index=search_index,
+        # Since-last-run videos only count as seen once they have a report
+        feed_state=feed_state if since_last_run else None,
+        model_limits=model_limits
+    )
+
+    if failed_live_videos:
+        urls_str = "\n\t".join(failed_live_videos)
+        logger.info(f"Here is the video cannot process at the moment, please retry later: \n\t{urls_str}")
+
+    unfinished = journal.unfinished
+    if unfinished:
+        logger.info(f"{unfinished} videos are unfinished; resume this run to retry them.")
+    return {"output_dir": current_output_dir, "failed_live_videos": failed_live_videos, "unfinished_videos": unfinished}
+
+
+def write_report(video, summary_data, output_dir, segments=None):
+    """
+    Writes the markdown report. With the transcript's segments, the detailed
+    transcript gets [mm:ss] timestamps and the segments are also saved as a
+    binary segment file next to the report (see segments.SegmentStore).
+    """
+    from utils.segments import SegmentStore, segments_path
+
+    report_filename = f"{build_filename_base(video)}.md"
+    report_path = os.path.join(output_dir, report_filename)
+
+    if segments:
+        segments = SegmentStore.from_segments(segments)
+        segments.save(segments_path(report_path))
+        transcript = "\n\n".join(segments.timestamped_lines())
+    else:
+        transcript = summary_data['detailed_transcript']
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(f"# {video.get('title', 'Unknown_Title')}\n\n")
+        f.write(f"**Channel:** {video.get('channel_name', 'Unknown_Channel')}\n")
+        f.write(f"**Upload Time:** {video.get('published')}\n")
+        f.write(f"**Link:** {video.get('link')}\n\n")
+        f.write("## Summary & Outline\n\n")
+        f.write(summary_data['summary_content'])
+        f.write("\n\n## Detailed Transcript\n\n")
+        f.write(transcript)
+
+    return report_path
@@ -0,0 +1,349 @@
+import os
+import re
+import glob
+import bisect
+import sqlite3
+import datetime
+import threading
+import contextlib
+
+SEARCH_INDEX_FILE = "search_index.sqlite"  # in output_dir, next to the Trigger_* folders
+
+TITLE = "title"
+SUMMARY = "summary"
+TRANSCRIPT = "transcript"
+
+# Entry rowids are (document id << _DOCUMENT_SHIFT) + n, so a report's entries
+# are one rowid range and can be replaced without scanning the FTS table
+_DOCUMENT_SHIFT = 20
+
+# unicode61 has no word segmentation for Chinese and Japanese; a run of CJK
+# characters would be a single token. Every CJK character is therefore wrapped
+# in zero-width spaces (a separator to the tokenizer) before it is indexed, and
+# query terms become phrases of single characters, which match adjacent characters.
+_CJK = re.compile("([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff])")
+_ZWSP = "\u200b"
+# Private-use characters marking a match in highlight(), to locate it in the text
+_MATCH_OPEN = "\ue000"
+_MATCH_CLOSE = "\ue001"
+
+_PLAIN_PARAGRAPH_CHARS = 1000  # transcripts without timestamps are indexed in pieces of about this size
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    report_path TEXT UNIQUE NOT NULL,
+    video_id TEXT,
+    title TEXT,
+    channel TEXT,
+    link TEXT,
+    published TEXT,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS documents_published ON documents (published);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5(
+    body,
+    kind UNINDEXED,
+    start UNINDEXED,
+    "end" UNINDEXED,
+    marks UNINDEXED,
+    tokenize = 'unicode61'
+);
+"""
+
+_REPORT_FIELD = re.compile(r"^\*\*(Channel|Upload Time|Link):\*\* ?(.*)$")
+_TIMESTAMP_LINE = re.compile(r"^\[(?:(\d+):)?(\d+):(\d+)\] ?(.*)$", re.S)
+
+def _index_text(text):
+    return _CJK.sub(_ZWSP + r"\1" + _ZWSP, text)
+
+def _display_text(text):
+    return text.replace(_ZWSP, "")
+
+def build_query(query):
+    """
+    FTS5 query for the user's search terms: every whitespace-separated term
+    must match, as a phrase (CJK terms character by character). A term ending
+    in '*' matches as a prefix. Returns None when there is nothing to search.
+    """
+    phrases = []
+    for term in query.split():
+        prefix = term.endswith("*")
+        term = _CJK.sub(r" \1 ", term.rstrip("*")).replace('"', " ").strip()
+        if term:
+            phrases.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(phrases) or None
+
+def _published_text(value):
+    """
+    Upload times are stored as naive ISO text, so comparing strings compares times.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None).isoformat(sep=" ", timespec="seconds")
+    return datetime.datetime.combine(value, datetime.time(0, 0)).isoformat(sep=" ", timespec="seconds")
+
+def _plain_paragraphs(text):
+    for block in re.split(r"\n\s*\n", text or ""):
+        block = block.strip()
+        while block:
+            yield block[:_PLAIN_PARAGRAPH_CHARS]
+            block = block[_PLAIN_PARAGRAPH_CHARS:].lstrip()
+
+def _segment_paragraphs(segments):
+    """
+    (start, end, text, marks) per paragraph of a SegmentStore, where marks are
+    "offset:start" pairs giving each segment's position in the paragraph text.
+    """
+    text = segments.text
+    offsets = segments.offsets
+    for first, stop in segments.paragraph_spans():
+        marks = " ".join(f"{offsets[index] - offsets[first]}:{segments.starts[index]:g}" for index in range(first, stop))
+        yield segments.starts[first], segments.ends[stop - 1], text[offsets[first]:offsets[stop]], marks
+
+def _transcript_rows(segments, transcript):
+    if segments:
+        yield from _segment_paragraphs(segments)
+        return
+    for paragraph in _plain_paragraphs(transcript):
+        match = _TIMESTAMP_LINE.match(paragraph)
+        if match:
+            hours, minutes, seconds, text = match.groups()
+            start = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+            yield start, None, text, f"0:{start}"
+        else:
+            yield None, None, paragraph, ""
+
+def _match_start(start, marks, highlighted):
+    """
+    Start time of the segment holding the first match in a paragraph.
+    """
+    offset = _display_text(highlighted).find(_MATCH_OPEN)
+    if not marks or offset < 0:
+        return start
+    pairs = [mark.split(":") for mark in marks.split()]
+    index = bisect.bisect_right([int(offset_text) for offset_text, _ in pairs], offset) - 1
+    return float(pairs[max(0, index)][1])
+
+def parse_report(path):
+    """
+    Reads a markdown report written by pipeline.write_report back into
+    (video, summary, transcript); the video dict has title, channel_name,
+    published (text) and link.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    head, _, rest = text.partition("## Summary & Outline")
+    summary, _, transcript = rest.partition("## Detailed Transcript")
+
+    video = {"title": None, "channel_name": None, "published": None, "link": None}
+    for line in head.splitlines():
+        if line.startswith("# ") and video["title"] is None:
+            video["title"] = line[2:].strip()
+            continue
+        match = _REPORT_FIELD.match(line.strip())
+        if match:
+            name, value = match.groups()
+            field = {"Channel": "channel_name", "Upload Time": "published", "Link": "link"}[name]
+            video[field] = None if value.strip() in ("", "None") else value.strip()
+    return video, summary.strip(), transcript.strip()
+
+def timestamp_link(link, seconds):
+    """
+    The video link, playing from `seconds` when given.
+    """
+    if not link or seconds is None:
+        return link
+    return f"{link}{'&' if '?' in link else '?'}t={int(seconds)}s"
+
+class SearchIndex:
+    """
+    Full-text index (SQLite FTS5) over the reports under an output folder:
+    titles, summaries and transcripts, the latter in paragraphs that remember
+    where each segment starts, so a hit links to the moment it was said.
+    The pipeline adds every report as it is written (add_report); sync() picks
+    up reports written before the index existed or changed since.
+    Safe to use from several threads; other processes may use the same file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit; changes to one report are grouped in _transaction()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def for_output(cls, output_dir):
+        return cls(os.path.join(output_dir, SEARCH_INDEX_FILE))
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _relative(self, report_path):
+        return os.path.relpath(os.path.abspath(report_path), self.root)
+
+    def add_report(self, report_path, video, summary, segments=None, transcript=None):
+        """
+        Indexes one report, replacing what was indexed for it before. With the
+        transcript's segments (a SegmentStore) hits carry segment start times;
+        otherwise the plain `transcript` text is indexed.
+        """
+        rows = [(TITLE, None, None, video.get("title") or "", "")]
+        rows.append((SUMMARY, None, None, summary or "", ""))
+        for start, end, text, marks in _transcript_rows(segments, transcript):
+            rows.append((TRANSCRIPT, start, end, text, marks))
+        rows = [row for row in rows if row[3].strip()]
+
+        relative_path = self._relative(report_path)
+        mtime = os.path.getmtime(report_path) if os.path.exists(report_path) else None
+        with self._transaction() as conn:
+            found = conn.execute("SELECT id FROM documents WHERE report_path = ?", (relative_path,)).fetchone()
+            values = (video.get("video_id"), video.get("title"), video.get("channel_name"), video.get("link"),
+                      _published_text(video.get("published")), mtime)
+            if found:
+                document_id = found[0]
+                conn.execute("UPDATE documents SET video_id = ?, title = ?, channel = ?, link = ?, published = ?, mtime = ? "
+                             "WHERE id = ?", values + (document_id,))
+                self._delete_entries(conn, document_id)
+            else:
+                document_id = conn.execute("INSERT INTO documents (report_path, video_id, title, channel, link, published, mtime) "
+                                           "VALUES (?, ?, ?, ?, ?, ?, ?)", (relative_path,) + values).lastrowid
+            first_rowid = document_id << _DOCUMENT_SHIFT
+            conn.executemany(
+                'INSERT INTO entries (rowid, body, kind, start, "end", marks) VALUES (?, ?, ?, ?, ?, ?)',
+                [(first_rowid + n, _index_text(text), kind, start, end, marks)
+                 for n, (kind, start, end, text, marks) in enumerate(rows[:(1 << _DOCUMENT_SHIFT)])]
+            )
+
+    @staticmethod
+    def _delete_entries(conn, document_id):
+        conn.execute("DELETE FROM entries WHERE rowid >= ? AND rowid < ?",
+                     (document_id << _DOCUMENT_SHIFT, (document_id + 1) << _DOCUMENT_SHIFT))
+
+    def remove_report(self, report_path):
+        relative_path = self._relative(report_path)
+        with self._transaction() as conn:
+            found = conn.execute("SELECT id FROM documents WHERE report_path = ?", (relative_path,)).fetchone()
+            if found:
+                self._delete_entries(conn, found[0])
+                conn.execute("DELETE FROM documents WHERE id = ?", (found[0],))
+
+    def sync(self):
+        """
+        Brings the index up to date with the reports in the Trigger_* folders:
+        indexes new and changed ones (by modification time, using the segment
+        file where there is one) and drops deleted ones. Returns how many
+        reports were (re)indexed.
+        """
+        from utils.segments import SegmentStore, segments_path
+
+        with self._lock:
+            known = dict(self._conn.execute("SELECT report_path, mtime FROM documents").fetchall())
+
+        indexed = 0
+        present = set()
+        for report_path in sorted(glob.glob(os.path.join(self.root, "Trigger_*", "*.md"))):
+            relative_path = self._relative(report_path)
+            present.add(relative_path)
+            try:
+                mtime = os.path.getmtime(report_path)
+            except OSError:
+                continue
+            if relative_path in known and known[relative_path] == mtime:
+                continue
+            video, summary, transcript = parse_report(report_path)
+            segments = None
+            if os.path.exists(segments_path(report_path)):
+                try:
+                    segments = SegmentStore.load(segments_path(report_path))
+                except (OSError, ValueError):
+                    segments = None
+            self.add_report(report_path, video, summary, segments=segments, transcript=transcript)
+            indexed += 1
+
+        for relative_path in set(known) - present:
+            self.remove_report(os.path.join(self.root, relative_path))
+        return indexed
+
+    def channels(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT channel FROM documents WHERE channel IS NOT NULL ORDER BY channel")]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def search(self, query, start=None, end=None, channels=None, limit=20, markers=("[", "]")):
+        """
+        Best matches first (bm25). `start`/`end` limit the upload time, `channels`
+        the channel names. Each hit is a dict with the report's title, channel,
+        published, report_path, kind (title, summary or transcript), start (seconds
+        into the video for transcript hits, else None), link (playing from start)
+        and snippet (the match between `markers`).
+        """
+        match = build_query(query)
+        if not match:
+            return []
+
+        conditions = ["entries MATCH ?"]
+        params = [match]
+        if start is not None:
+            conditions.append("d.published >= ?")
+            params.append(_published_text(start))
+        if end is not None:
+            conditions.append("d.published <= ?")
+            params.append(_published_text(end))
+        if channels:
+            conditions.append(f"d.channel IN ({', '.join('?' * len(channels))})")
+            params.extend(channels)
+
+        sql = (
+            "SELECT d.report_path, d.video_id, d.title, d.channel, d.link, d.published, entries.kind, "
+            'entries.start, entries."end", entries.marks, '
+            "snippet(entries, 0, ?, ?, '…', 32), highlight(entries, 0, ?, ?) "
+            f"FROM entries JOIN documents AS d ON d.id = (entries.rowid >> {_DOCUMENT_SHIFT}) "
+            f"WHERE {' AND '.join(conditions)} ORDER BY entries.rank LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, [markers[0], markers[1], _MATCH_OPEN, _MATCH_CLOSE] + params + [limit]).fetchall()
+
+        hits = []
+        for (report_path, video_id, title, channel, link, published, kind,
+             paragraph_start, paragraph_end, marks, snippet, highlighted) in rows:
+            seconds = _match_start(paragraph_start, marks, highlighted) if kind == TRANSCRIPT else None
+            hits.append({
+                "report_path": os.path.join(self.root, report_path),
+                "video_id": video_id,
+                "title": title,
+                "channel": channel,
+                "published": published,
+                "kind": kind,
+                "start": seconds,
+                "end": paragraph_end,
+                "link": timestamp_link(link, seconds),
+                "snippet": _display_text(snippet),
+            })
+        return hits
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
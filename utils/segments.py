@@ -0,0 +1,233 @@
+import os
+import sys
+import math
+import struct
+import bisect
+from array import array
+
+SEGMENTS_SUFFIX = ".segments"  # binary segment file, next to the report with the same base name
+
+_MAGIC = b"YTSG"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHI")  # magic, version, segment count
+# The timestamped transcript (and the search index) start a new paragraph after this many seconds
+DEFAULT_PARAGRAPH_SECONDS = 30.0
+
+def format_timestamp(seconds):
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+class Segment:
+    """
+    One transcript segment. Reads like a Whisper segment dict too
+    (segment.get("start")), so code written for those accepts it.
+    """
+    __slots__ = ("start", "end", "text", "avg_logprob")
+
+    def __init__(self, start, end, text, avg_logprob=None):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.avg_logprob = avg_logprob
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        return default if value is None else value
+
+    def __repr__(self):
+        return f"Segment({self.start!r}, {self.end!r}, {self.text!r}, {self.avg_logprob!r})"
+
+def _little_endian(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+class SegmentStore:
+    """
+    Timed transcript segments in columns: start/end seconds (float64), average
+    log probability (float32, NaN when unknown) and the offsets of each
+    segment's text into one shared string. A multi-hour transcript costs a few
+    dozen bytes per segment instead of a dict per segment, and time ranges are
+    found by binary search over the start times (segments are kept in timeline order).
+    save()/load() use a compact binary file (a header followed by the columns
+    and the UTF-8 text), written next to the report.
+    """
+    def __init__(self):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.logprobs = array("f")
+        # offsets[i]:offsets[i + 1] is the text of segment i
+        self.offsets = array("I", [0])
+        self._pieces = []
+        self._text = ""
+
+    @classmethod
+    def from_segments(cls, segments):
+        """
+        Builds a store from Whisper segment dicts, SegmentEvents or Segments.
+        """
+        if isinstance(segments, SegmentStore):
+            return segments
+        store = cls()
+        for segment in segments or []:
+            if isinstance(segment, dict):
+                store.append(segment.get("start"), segment.get("end"), segment.get("text", ""), segment.get("avg_logprob"))
+            else:
+                store.append(segment.start, segment.end, segment.text, segment.avg_logprob)
+        return store
+
+    def append(self, start, end, text, avg_logprob=None):
+        text = text or ""
+        self.starts.append(start or 0.0)
+        self.ends.append(end if end is not None else (start or 0.0))
+        self.logprobs.append(math.nan if avg_logprob is None else avg_logprob)
+        self.offsets.append(self.offsets[-1] + len(text))
+        self._pieces.append(text)
+
+    @property
+    def text(self):
+        """
+        All segment texts joined, i.e. the plain transcript.
+        """
+        if self._pieces:
+            self._text += "".join(self._pieces)
+            self._pieces = []
+        return self._text
+
+    @property
+    def duration(self):
+        return self.ends[-1] if len(self) else 0.0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._take(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        logprob = self.logprobs[index]
+        return Segment(
+            self.starts[index],
+            self.ends[index],
+            self.text[self.offsets[index]:self.offsets[index + 1]],
+            None if math.isnan(logprob) else logprob,
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return (isinstance(other, SegmentStore) and self.starts == other.starts and self.ends == other.ends
+                and self.offsets == other.offsets and self.text == other.text
+                and self.logprobs.tobytes() == other.logprobs.tobytes())
+
+    def _take(self, indices):
+        store = SegmentStore()
+        for index in indices:
+            segment = self[index]
+            store.append(segment.start, segment.end, segment.text, segment.avg_logprob)
+        return store
+
+    def index_at(self, seconds):
+        """
+        Index of the segment playing at `seconds` (the last one starting at or before it).
+        """
+        return max(0, bisect.bisect_right(self.starts, seconds) - 1)
+
+    def between(self, start, end):
+        """
+        The segments overlapping [start, end) seconds, as a new store.
+        """
+        first = self.index_at(start)
+        if first < len(self) and self.ends[first] <= start:
+            first += 1
+        last = bisect.bisect_left(self.starts, end)
+        return self[first:last]
+
+    def to_dicts(self):
+        """
+        JSON-safe segment dicts, as stored in the run journal and transcript cache.
+        """
+        return [
+            {"start": segment.start, "end": segment.end, "text": segment.text, "avg_logprob": segment.avg_logprob}
+            for segment in self
+        ]
+
+    def paragraph_spans(self, paragraph_seconds=DEFAULT_PARAGRAPH_SECONDS):
+        """
+        Yields (first, stop) index ranges of consecutive segments, a new range
+        whenever `paragraph_seconds` have passed since the current one started.
+        """
+        first = 0
+        for index in range(1, len(self)):
+            if self.starts[index] - self.starts[first] >= paragraph_seconds:
+                yield first, index
+                first = index
+        if len(self):
+            yield first, len(self)
+
+    def paragraphs(self, paragraph_seconds=DEFAULT_PARAGRAPH_SECONDS):
+        """
+        Yields (start, end, text) per paragraph (see paragraph_spans()).
+        """
+        for first, stop in self.paragraph_spans(paragraph_seconds):
+            text = self.text[self.offsets[first]:self.offsets[stop]]
+            yield self.starts[first], self.ends[stop - 1], text.strip()
+
+    def timestamped_lines(self, paragraph_seconds=DEFAULT_PARAGRAPH_SECONDS):
+        """
+        The transcript as "[mm:ss] text" lines, one per paragraph (see paragraphs()).
+        """
+        return [f"[{format_timestamp(start)}] {text}" for start, _, text in self.paragraphs(paragraph_seconds)]
+
+    def save(self, path):
+        """
+        Writes the binary segment file (atomically).
+        """
+        text = self.text.encode("utf-8")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(self)))
+            for column in (self.starts, self.ends, self.logprobs, self.offsets):
+                f.write(_little_endian(column).tobytes())
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Not a segment file (version {_VERSION}): {path}")
+
+        store = cls()
+        position = _HEADER.size
+        for name, length in (("starts", count), ("ends", count), ("logprobs", count), ("offsets", count + 1)):
+            column = array(getattr(store, name).typecode)
+            size = length * column.itemsize
+            column.frombytes(data[position:position + size])
+            if sys.byteorder == "big":
+                column.byteswap()
+            setattr(store, name, column)
+            position += size
+        store._text = data[position:].decode("utf-8")
+        return store
+
+def segments_path(report_path):
+    """
+    The segment file belonging to a report (same folder, same base name).
+    """
+    return os.path.splitext(report_path)[0] + SEGMENTS_SUFFIX
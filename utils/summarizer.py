@@ -1,72 +1,400 @@
-from google import genai
+import heapq
+import itertools
 import os
-import time
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.disk_cache import DiskCache, make_key
+from utils.tokens import estimate_tokens
+from utils.gemini_pool import get_pool, RetriesExhausted
+from utils.metrics import NULL_TRACER
+from utils.segments import SegmentStore, format_timestamp
 
-def call_gemini_with_retry(api_keys, model, prompt, logger, max_retries=20, delay=10, current_key_index=0):
+# Transcripts longer than this used to be truncated; they are now summarized chunk by chunk
+SINGLE_PROMPT_CHAR_LIMIT = 80000
+DEFAULT_CHUNK_TOKENS = 12000
+DEFAULT_MAP_WORKERS = 4
+
+# Fallback split points when no Whisper segments are available
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？!?\n])")
+
+RESPONSE_CACHE_DIR = os.path.join("cache", "gemini")
+DEFAULT_RESPONSE_CACHE_BYTES = 256 * 1024 ** 2  # 256 MB
+
+class CachedResponse:
     """
-    Calls Gemini API with:
-    1. Retry mechanism for 503 errors (wait and retry same key).
-    2. Rotation mechanism for 429 errors (switch to next key and wait).
+    Stand-in for a Gemini response loaded from the cache. Only .text is kept.
     """
-    
-    if not api_keys:
-        logger.critical("No API keys available.")
+    def __init__(self, text):
+        self.text = text
+
+class ResponseCache:
+    """
+    On-disk cache of Gemini response texts keyed by a hash of (model, full prompt).
+    """
+    def __init__(self, root=RESPONSE_CACHE_DIR, max_bytes=DEFAULT_RESPONSE_CACHE_BYTES):
+        self.cache = DiskCache(root, max_bytes)
+
+    def get(self, model, prompt):
+        entry = self.cache.get(make_key("gemini", model, prompt))
+        return CachedResponse(entry["text"]) if entry else None
+
+    def put(self, model, prompt, text):
+        self.cache.put(make_key("gemini", model, prompt), {"model": model, "text": text})
+
+    def stats(self):
+        return self.cache.stats()
+
+def call_gemini_with_retry(api_keys, model, prompt, logger, max_retries=20, delay=10, current_key_index=0, cache=None, pool=None,
+                           tracer=None, model_limits=None):
+    """
+    Calls Gemini API through the shared GeminiPool, which:
+    1. Keeps one client per key and sends the request to a key with RPM/TPM capacity.
+    2. Moves to another key on 429 errors, honouring the server's retry delay.
+    3. Retries 503 errors with jittered exponential backoff.
+    4. Optional ResponseCache, consulted before any network call.
+    current_key_index is the preferred key; `delay` caps the backoff between retries.
+    `model_limits` (gemini_pool.parse_model_limits output) are the RPM/TPM limits
+    for this call, None for the defaults.
+    With a metrics.Tracer, every call is recorded as a "gemini" span with the model,
+    prompt/response tokens, retries and the key that answered.
+    """
+    tracer = tracer or NULL_TRACER
+    with tracer.span("gemini", model=model, prompt_tokens=estimate_tokens(prompt)) as span:
+        if cache is not None:
+            cached = cache.get(model, prompt)
+            if cached is not None:
+                logger.info(f"Using cached Gemini response ({model})")
+                span.set(cached=True, prompt_tokens=0)
+                return cached
+
+        if not api_keys:
+            logger.critical("No API keys available.")
+            return None
+
+        if pool is None:
+            pool = get_pool(api_keys, max_retries=max_retries, max_delay=delay)
+
+        info = {}
+        try:
+            response = pool.generate_sync(model, prompt, key_hint=current_key_index, logger=logger, info=info,
+                                          model_limits=model_limits)
+        except RetriesExhausted as e:
+            logger.warning(str(e))
+            span.set(error=str(e), retries=pool.max_retries)
+            return None
+
+        usage = getattr(response, "usage_metadata", None)
+        span.set(
+            key_index=info.get("key_index"),
+            retries=info.get("retries", 0),
+            prompt_tokens=getattr(usage, "prompt_token_count", None) or span.attrs["prompt_tokens"],
+            response_tokens=getattr(usage, "candidates_token_count", None) or estimate_tokens(response.text),
+        )
+
+        if cache is not None and response.text:
+            cache.put(model, prompt, response.text)
+        return response
+
+class TranscriptSplitter:
+    """
+    Online form of split_transcript(): pieces are added one at a time and a
+    chunk is returned as soon as the next piece would push it over max_tokens,
+    so the same pieces give the same chunks whether they arrive all at once or
+    while Whisper is still running.
+    """
+    def __init__(self, max_tokens=DEFAULT_CHUNK_TOKENS):
+        self.max_tokens = max_tokens
+        self._current, self._current_tokens, self._start, self._end = [], 0, None, None
+
+    def add(self, text, piece_start=None, piece_end=None):
+        """
+        Returns the list of chunks completed by this piece (usually empty).
+        """
+        max_tokens = self.max_tokens
+        completed = []
+        tokens = estimate_tokens(text)
+        if self._current and self._current_tokens + tokens > max_tokens:
+            completed.append(self._flush())
+
+        # A single piece over budget (e.g. no punctuation at all) is cut by length
+        while tokens > max_tokens:
+            cut = max(1, len(text) * max_tokens // tokens)
+            completed.append({"text": text[:cut], "start": piece_start, "end": piece_end})
+            text = text[cut:]
+            tokens = estimate_tokens(text)
+
+        if self._start is None:
+            self._start = piece_start
+        self._end = piece_end
+        self._current.append(text)
+        self._current_tokens += tokens
+        return completed
+
+    def _flush(self):
+        chunk = {"text": "".join(self._current), "start": self._start, "end": self._end}
+        self._current, self._current_tokens, self._start = [], 0, None
+        return chunk
+
+    def finish(self):
+        """
+        Returns the last, partial chunk (as a list, empty if nothing is pending).
+        """
+        return [self._flush()] if self._current else []
+
+def split_transcript(transcript_text, segments=None, max_tokens=DEFAULT_CHUNK_TOKENS):
+    """
+    Splits a transcript into chunks of at most ~max_tokens, cutting only on
+    Whisper segment boundaries (or sentence ends when there are no segments).
+    Returns a list of {'text', 'start', 'end'}; start/end are None without segments.
+    """
+    if segments:
+        pieces = [(segment.get("text", ""), segment.get("start"), segment.get("end")) for segment in segments]
+    else:
+        pieces = [(piece, None, None) for piece in _SENTENCE_END_PATTERN.split(transcript_text) if piece]
+
+    splitter = TranscriptSplitter(max_tokens)
+    chunks = []
+    for text, piece_start, piece_end in pieces:
+        chunks.extend(splitter.add(text, piece_start, piece_end))
+    chunks.extend(splitter.finish())
+    return chunks
+
+def _chunk_label(index, chunk):
+    # No chunk count in the label: while streaming it is not known yet
+    label = f"第 {index + 1} 段"
+    if chunk["start"] is not None and chunk["end"] is not None:
+        label += f"，時間 {format_timestamp(chunk['start'])} - {format_timestamp(chunk['end'])}"
+    return label
+
+def _summarize_chunk(index, chunk, logger, api_keys, abstract_model, cache=None, key_index=0, tracer=None, model_limits=None):
+    """
+    Map step for one chunk. Returns its labelled notes, or None.
+    """
+    prompt_chunk = (
+        f"使用繁體中文，整理以下影片逐字稿片段（{_chunk_label(index, chunk)}）的內容，並提供：\n"
+        "1. 重點摘要\n"
+        "2. 提到的關鍵數據、人物與論點\n\n"
+        "逐字稿片段:\n"
+        f"{chunk['text']}"
+    )
+    response = call_gemini_with_retry(
+        api_keys, abstract_model, prompt_chunk, logger,
+        current_key_index=(key_index + index) % max(1, len(api_keys)), cache=cache, tracer=tracer,
+        model_limits=model_limits
+    )
+    if not response:
         return None
-        
-    attempt = 1
-    num_keys = len(api_keys)
-    
-    while attempt <= max_retries:
-        api_key = api_keys[current_key_index]
-        client = genai.Client(api_key=api_key)
+    logger.info(f"Chunk {index + 1} summarized")
+    return f"### {_chunk_label(index, chunk)}\n{response.text}"
 
-        # logger.info(f"Using API key {api_key}, index {current_key_index}")
-        
+def _reduce_notes(notes, logger, api_keys, summary_model, cache=None, key_index=0, tracer=None, model_limits=None):
+    logger.info(f"(2/2) Merging chunk summaries with Gemini ({summary_model})...")
+    prompt_reduce = (
+        "以下是同一部影片逐字稿各段落的重點整理，依時間順序排列。\n"
+        "使用繁體中文，整合所有段落，並提供以下資訊:\n"
+        "1. 簡明摘要\n"
+        "2. 結構化提綱（若段落附有時間，則同時附上時間軸）\n"
+        "3. 主要結論\n\n"
+        "段落重點:\n"
+        + "\n\n".join(notes)
+    )
+    return call_gemini_with_retry(api_keys, summary_model, prompt_reduce, logger, current_key_index=key_index, cache=cache,
+                                  tracer=tracer, model_limits=model_limits)
+
+def map_reduce_summary(transcript_text, logger, api_keys, abstract_model, summary_model, segments=None,
+                       chunk_tokens=DEFAULT_CHUNK_TOKENS, map_workers=DEFAULT_MAP_WORKERS, cache=None, key_index=0,
+                       notes=None, on_notes=None, tracer=None, model_limits=None):
+    """
+    Summarizes a long transcript without truncating it:
+    1. Split into token-budgeted chunks on segment boundaries.
+    2. Map: summarize the chunks concurrently with the (cheap) abstract model,
+       starting each chunk on a different API key.
+    3. Reduce: merge the chunk notes with the summary model.
+    Chunk notes from an earlier attempt can be passed as `notes` to skip the map
+    step; `on_notes(notes)` is called once the map step is complete.
+    Returns the final response, or None.
+    """
+    if notes:
+        logger.info(f"(1/2) Reusing {len(notes)} chunk summaries from the run journal")
+        return _reduce_notes(notes, logger, api_keys, summary_model, cache=cache, key_index=key_index, tracer=tracer,
+                             model_limits=model_limits)
+
+    chunks = split_transcript(transcript_text, segments, chunk_tokens)
+    total = len(chunks)
+    logger.info(f"(1/2) Summarizing {total} transcript chunks with Gemini ({abstract_model})...")
+
+    def summarize_chunk(index):
+        return _summarize_chunk(index, chunks[index], logger, api_keys, abstract_model, cache=cache, key_index=key_index,
+                                tracer=tracer, model_limits=model_limits)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(map_workers, total))) as executor:
+        notes = list(executor.map(summarize_chunk, range(total)))
+
+    if not all(notes):
+        logger.warning("Some transcript chunks could not be summarized.")
+        return None
+    if on_notes:
+        on_notes(notes)
+
+    return _reduce_notes(notes, logger, api_keys, summary_model, cache=cache, key_index=key_index, tracer=tracer,
+                         model_limits=model_limits)
+
+class IncrementalSummarizer:
+    """
+    Map-reduce summarization that starts while the video is still being transcribed.
+    Feed finalized segments with add_segment() (e.g. as transcribe()'s on_segment
+    callback); every full window is sent to the abstract model right away, using
+    the same windows and prompts as map_reduce_summary. finish() then only waits
+    for the last windows and runs the reduce.
+
+    In "auto" mode windows are held back until the transcript is known to be too
+    long for a single prompt, so short videos never pay for map calls they would
+    not use. mode "single" never starts early.
+    """
+    def __init__(self, logger, api_keys, abstract_model="models/gemini-2.5-flash-lite", summary_model="models/gemini-2.5-pro",
+                 cache=None, mode="auto", chunk_tokens=DEFAULT_CHUNK_TOKENS, map_workers=DEFAULT_MAP_WORKERS, key_index=0,
+                 tracer=None, model_limits=None):
+        self.logger = logger
+        self.api_keys = api_keys
+        self.abstract_model = abstract_model
+        self.summary_model = summary_model
+        self.cache = cache
+        self.mode = mode
+        self.key_index = key_index
+        self.tracer = tracer
+        self.model_limits = model_limits
+        self._splitter = TranscriptSplitter(chunk_tokens)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, map_workers))
+        self._ready = []
+        self._futures = []
+        self._chars = 0
+        self._eager = mode == "map_reduce"
+
+    @property
+    def started(self):
+        """
+        Number of windows already sent to the abstract model.
+        """
+        return len(self._futures)
+
+    def add_segment(self, segment):
+        """
+        Accepts a SegmentEvent or a segment dict.
+        """
+        if isinstance(segment, dict):
+            text, start, end = segment.get("text", ""), segment.get("start"), segment.get("end")
+        else:
+            text, start, end = segment.text, segment.start, segment.end
+        self._chars += len(text)
+        self._ready.extend(self._splitter.add(text, start, end))
+        if self.mode == "auto" and self._chars > SINGLE_PROMPT_CHAR_LIMIT:
+            self._eager = True
+        if self._eager:
+            self._submit_ready()
+
+    def _submit_ready(self):
+        for chunk in self._ready:
+            index = len(self._futures)
+            if index == 0:
+                self.logger.info(f"(1/2) Summarizing transcript windows with Gemini ({self.abstract_model}) while transcription continues...")
+            self._futures.append(self._executor.submit(
+                _summarize_chunk, index, chunk, self.logger, self.api_keys, self.abstract_model,
+                cache=self.cache, key_index=self.key_index, tracer=self.tracer, model_limits=self.model_limits
+            ))
+        self._ready = []
+
+    def finish(self, transcript_text, video_link=None, segments=None, on_abstract=None):
+        """
+        Completes the summary once the transcript is final. Returns the same dict
+        as summarize_transcript(), or None. `on_abstract` is passed on as in
+        summarize_transcript().
+        """
         try:
-            return client.models.generate_content(
-                model=model,
-                contents=[prompt]
-            )
+            if resolve_mode(prompt_transcript(transcript_text, segments)[0], self.mode) != "map_reduce":
+                return summarize_transcript(
+                    transcript_text, video_link, self.logger, api_keys=self.api_keys,
+                    abstract_model=self.abstract_model, summary_model=self.summary_model,
+                    cache=self.cache, segments=segments, mode="single", key_index=self.key_index,
+                    on_abstract=on_abstract, tracer=self.tracer, model_limits=self.model_limits
+                )
+
+            early = len(self._futures)
+            self._ready.extend(self._splitter.finish())
+            self._eager = True
+            self._submit_ready()
+            self.logger.info(f"Waiting for {len(self._futures)} transcript windows ({early} started during transcription)...")
+            notes = [future.result() for future in self._futures]
+            if not all(notes):
+                self.logger.warning("Some transcript chunks could not be summarized.")
+                return None
+            if on_abstract:
+                on_abstract(notes)
+
+            response = _reduce_notes(notes, self.logger, self.api_keys, self.summary_model, cache=self.cache, key_index=self.key_index,
+                                     tracer=self.tracer, model_limits=self.model_limits)
+            if not response:
+                return None
+            return {
+                "summary_content": response.text,
+                "detailed_transcript": transcript_text
+            }
         except Exception as e:
-            error_str = str(e)
-            
-            # Case 1: 429 Quota Exceeded -> Rotate Key
-            if "429" in error_str or "quota" in error_str.lower():
-                logger.warning(f"Quota exceeded (429) on key index {current_key_index}. Switching to next key...")
-                
-                # Move to next key
-                current_key_index = (current_key_index + 1) % num_keys
-                attempt += 1
-                
-                if current_key_index == 0:
-                    # Cycled through all keys, wait before trying the first one again
-                    logger.warning(f"Cycled through all {num_keys} keys. Waiting {delay} seconds before retrying...")
-                    time.sleep(delay)
-                else:
-                    # Brief delay between key switches
-                    time.sleep(1)
-                
-                continue
-            
-            # Case 2: 503 Service Unavailable -> Wait and Retry same key
-            elif "503" in error_str or "UNAVAILABLE" in error_str:
-                if attempt < max_retries:
-                    logger.warning(f"Model currently unavailable (503). Retrying {attempt}/{max_retries} in {delay} seconds...\nError details: {e}")
-                    print(f"System sleeping for {delay} seconds due to 503 error...") 
-                    time.sleep(delay)
-                    attempt += 1
-                    continue
-            
-            # If not 503/429 or retries exhausted, re-raise
-            raise e
-            
-    logger.error(f"Exhausted {max_retries} attempts.")
-    return None
+            self.logger.critical(f"Error generation summary: {e}")
+            return None
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Drops windows that have not started yet, e.g. when transcription failed.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def prompt_transcript(transcript_text, segments=None):
+    """
+    The transcript as the single-prompt summary sends it, and a note for the prompt
+    on how to read it. With segments it is timestamped, and so longer than the text.
+    """
+    if segments:
+        # Whisper's own timestamps, so the outline's timeline does not depend on the abstract
+        return ("\n".join(SegmentStore.from_segments(segments).timestamped_lines()),
+                "逐字稿每行開頭的 [分:秒] 是影片時間，結構化提綱的時間軸以此為準\n")
+    return transcript_text, ""
+
+def resolve_mode(prompt_text, mode):
+    """
+    The summarize mode to use; "auto" is decided on `prompt_text`, the transcript
+    as the single prompt would send it (see prompt_transcript).
+    """
+    if mode == "auto":
+        return "map_reduce" if len(prompt_text) > SINGLE_PROMPT_CHAR_LIMIT else "single"
+    return mode
+
+def summary_priority(transcript_text):
+    """
+    Scheduling priority for summarizing a transcript: lower goes first.
+    Short videos first, so their reports land early.
+    """
+    return len(transcript_text or "")
 
-def summarize_transcript(transcript_text, video_link, logger, api_keys=None, abstract_model="models/gemini-2.5-flash-lite", summary_model="models/gemini-2.5-pro"):
+def summarize_transcript(transcript_text, video_link, logger, api_keys=None, abstract_model="models/gemini-2.5-flash-lite", summary_model="models/gemini-2.5-pro", cache=None,
+                         segments=None, mode="auto", chunk_tokens=DEFAULT_CHUNK_TOKENS, map_workers=DEFAULT_MAP_WORKERS, key_index=0,
+                         abstract=None, on_abstract=None, tracer=None, model_limits=None):
     """
     Summarizes the transcript using Google Gemini.
     Returns a dict with summary, outline, etc.
+    Pass a ResponseCache to reuse responses for identical (model, prompt) pairs.
+    mode: "single" (one abstract + one summary call), "map_reduce" (chunked, see
+    map_reduce_summary) or "auto" (map_reduce only for transcripts too long for one prompt).
+    key_index is the API key the calls should start on.
+    `segments` (Whisper segment dicts or a segments.SegmentStore) give the chunks
+    their time ranges and the single-prompt summary a timestamped transcript.
+    The first step's output (the abstract text in single mode, the list of chunk
+    notes in map_reduce mode) is handed to `on_abstract` once it exists, and can be
+    passed back as `abstract` to skip that step, e.g. when resuming a run.
+    Gemini calls are recorded on `tracer` and limited by `model_limits` (see call_gemini_with_retry).
     """
     # Helper to support legacy single key arg if needed, but app.py sends list now
     if not api_keys:
@@ -84,38 +412,70 @@ def summarize_transcript(transcript_text, video_link, logger, api_keys=None, abs
     logger.info(f"Summary Model: {summary_model}")
     logger.info(f"Available Keys: {len(api_keys)}")
     
+    transcript_for_prompt, timeline_note = prompt_transcript(transcript_text, segments)
+    mode = resolve_mode(transcript_for_prompt, mode)
+
     try:
+        if mode == "map_reduce":
+            response = map_reduce_summary(
+                transcript_text, logger, api_keys, abstract_model, summary_model,
+                segments=segments, chunk_tokens=chunk_tokens, map_workers=map_workers, cache=cache,
+                key_index=key_index, notes=abstract if isinstance(abstract, list) else None, on_notes=on_abstract,
+                tracer=tracer, model_limits=model_limits
+            )
+            if not response:
+                return None
+            return {
+                "summary_content": response.text,
+                "detailed_transcript": transcript_text
+            }
+
         # Client initialization is now handled inside call_gemini_with_retry per call/key
         
-        logger.info(f"(1/2) Generating abstract with Gemini ({abstract_model})...")
-        
-        prompt_abstract = (
-            f"使用繁體中文，分析以下 YouTube 影片連結 {video_link} 並提供：\n"
-            "1. 簡明摘要\n"
-            "2. 結構化提綱同時附上時間軸\n"
-            "3. 主要結論\n\n"
-        )
-        
-        abstract_response = call_gemini_with_retry(api_keys, abstract_model, prompt_abstract, logger)
-        if not abstract_response:
-             return None
+        if isinstance(abstract, str):
+            logger.info("(1/2) Reusing the abstract from the run journal")
+            abstract_text = abstract
+        else:
+            logger.info(f"(1/2) Generating abstract with Gemini ({abstract_model})...")
+
+            prompt_abstract = (
+                f"使用繁體中文，分析以下 YouTube 影片連結 {video_link} 並提供：\n"
+                "1. 簡明摘要\n"
+                "2. 結構化提綱同時附上時間軸\n"
+                "3. 主要結論\n\n"
+            )
+
+            abstract_response = call_gemini_with_retry(api_keys, abstract_model, prompt_abstract, logger, current_key_index=key_index,
+                                                       cache=cache, tracer=tracer, model_limits=model_limits)
+            if not abstract_response:
+                 return None
+            abstract_text = abstract_response.text
+            if on_abstract:
+                on_abstract(abstract_text)
 
         logger.info(f"(2/2) Generating summary with Gemini ({summary_model})...")
 
+        if len(transcript_for_prompt) > SINGLE_PROMPT_CHAR_LIMIT:
+            # Only when single mode was asked for; "auto" switches to map_reduce instead
+            logger.warning(f"The transcript is longer than one prompt holds ({len(transcript_for_prompt)} characters), "
+                           f"only the first {SINGLE_PROMPT_CHAR_LIMIT} are summarized.")
+
         prompt_summary = (
             "如果摘要和逐字稿主題不相符，則以逐字稿為主，並忽略摘要以及任何時間軸\n"
             "如果摘要和逐字稿主題相符，則在結構化提綱時，保留時間軸，並以逐字稿內容加以補充\n"
+            f"{timeline_note}"
             "使用繁體中文，分析以下文字稿和摘要，並提供以下資訊:\n"
             "1. 簡明摘要\n"
             "2. 結構化提綱\n"
             "3. 主要結論\n\n"
             "逐字稿:\n"
-            f"{transcript_text[:80000]}\n\n"
+            f"{transcript_for_prompt[:SINGLE_PROMPT_CHAR_LIMIT]}\n\n"
             "摘要:\n"
-            f"{abstract_response.text}"
+            f"{abstract_text}"
         )
         
-        response = call_gemini_with_retry(api_keys, summary_model, prompt_summary, logger)
+        response = call_gemini_with_retry(api_keys, summary_model, prompt_summary, logger, current_key_index=key_index, cache=cache,
+                                          tracer=tracer, model_limits=model_limits)
         if not response:
             return None
             
@@ -126,3 +486,241 @@ def summarize_transcript(transcript_text, video_link, logger, api_keys=None, abs
     except Exception as e:
         logger.critical(f"Error generation summary: {e}")
         return None
+
+class SummaryPlanner:
+    """
+    Plans the summaries of a run together, as their transcripts become known.
+    Each job gets its mode, the model that carries its transcript (the summary
+    model for one prompt, the abstract model for map-reduce chunk notes) and the
+    API key its calls start on: the key with the fewest tokens already planned for
+    that model, so long transcripts are spread over the keys instead of landing
+    wherever the video order puts them.
+    """
+    def __init__(self, num_keys, abstract_model="models/gemini-2.5-flash-lite", summary_model="models/gemini-2.5-pro", mode="auto"):
+        self.abstract_model = abstract_model
+        self.summary_model = summary_model
+        self.mode = mode
+        self._load = [{} for _ in range(max(1, num_keys))]
+        self._lock = threading.Lock()
+
+    def _least_loaded(self, model):
+        return min(range(len(self._load)), key=lambda index: (self._load[index].get(model, 0), index))
+
+    def next_key(self, model):
+        """
+        The key with the fewest tokens planned for `model` so far.
+        """
+        with self._lock:
+            return self._least_loaded(model)
+
+    def plan(self, transcript_text, segments=None, mode=None, key_index=None):
+        """
+        Returns the plan for one transcript: mode, model, key_index, tokens and
+        priority (lower runs first). Pass key_index to keep a key already in use,
+        e.g. an IncrementalSummarizer's.
+        """
+        prompt_text = prompt_transcript(transcript_text, segments)[0]
+        mode = resolve_mode(prompt_text, mode or self.mode)
+        model = self.abstract_model if mode == "map_reduce" else self.summary_model
+        tokens = estimate_tokens(prompt_text)
+        with self._lock:
+            if key_index is None:
+                key_index = self._least_loaded(model)
+            load = self._load[key_index % len(self._load)]
+            load[model] = load.get(model, 0) + tokens
+        return {"mode": mode, "model": model, "key_index": key_index, "tokens": tokens, "priority": summary_priority(prompt_text)}
+
+def plan_summaries(jobs, num_keys, abstract_model="models/gemini-2.5-flash-lite", summary_model="models/gemini-2.5-pro", mode="auto"):
+    """
+    Plans a whole run's summaries at once (see SummaryPlanner). Jobs are dicts with
+    'transcript_text' and optionally 'segments', 'mode' and 'summarizer'. Keys are
+    handed out longest transcript first, which spreads the load best; each job gets
+    its 'plan', and the jobs are returned in the order they should run, shortest first.
+    """
+    _plan_jobs(SummaryPlanner(num_keys, abstract_model, summary_model, mode), jobs)
+    return sorted(jobs, key=lambda job: job["plan"]["priority"])
+
+def _plan_jobs(planner, jobs):
+    for job in sorted(jobs, key=lambda job: len(job["transcript_text"] or ""), reverse=True):
+        summarizer = job.get("summarizer")
+        job["plan"] = planner.plan(job["transcript_text"], job.get("segments"), job.get("mode"),
+                                   key_index=summarizer.key_index if summarizer else None)
+
+_BATCH_DONE = object()
+
+class SummaryBatch:
+    """
+    Run-level summarization. Jobs are submitted as their transcripts become known,
+    all at once or one by one while the rest of the run is still being transcribed,
+    and planned together by a SummaryPlanner. Waiting jobs start shortest first
+    across the whole run on up to `max_concurrency` threads (default: two per key);
+    the GeminiPool keeps their calls within each key's quota.
+
+    A job is a dict with 'transcript_text' and 'video_link', and optionally
+    'segments', 'mode', 'abstract' / 'on_abstract' (see summarize_transcript) and
+    'summarizer', an IncrementalSummarizer fed during transcription. Each job gets
+    its 'plan'; `run(job)` then summarizes it on a worker thread. The default,
+    SummaryBatch.summarize, stores the result as job['summary']; callers wrap it to
+    add tracing or checkpoints. results() yields the jobs as they complete.
+
+    Once `cancel_event` is set, or the batch is closed with an error, waiting jobs
+    are dropped and their summarizers closed.
+    """
+    def __init__(self, logger, api_keys, abstract_model="models/gemini-2.5-flash-lite", summary_model="models/gemini-2.5-pro",
+                 cache=None, mode="auto", max_concurrency=None, tracer=None, model_limits=None, run=None,
+                 thread_hook=None, cancel_event=None):
+        self.logger = logger
+        self.api_keys = api_keys
+        self.abstract_model = abstract_model
+        self.summary_model = summary_model
+        self.cache = cache
+        self.tracer = tracer
+        self.model_limits = model_limits
+        self.planner = SummaryPlanner(len(api_keys or []), abstract_model, summary_model, mode)
+        self.max_concurrency = max(1, int(max_concurrency or 2 * max(1, len(api_keys or []))))
+        self.thread_hook = thread_hook
+        self.cancel_event = cancel_event
+        self._run = run or self.summarize
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._changed = threading.Condition()
+        self._done = queue.Queue()
+        self._workers = 0
+        self._submitted = 0
+        self._closed = False
+        self._stopped = False
+        self._error = None
+
+    def _cancelled(self):
+        return self._stopped or (self.cancel_event is not None and self.cancel_event.is_set())
+
+    def submit(self, *jobs):
+        """
+        Plans the jobs and queues them for summarization.
+        """
+        _plan_jobs(self.planner, jobs)
+        with self._changed:
+            if self._closed:
+                raise RuntimeError("The summary batch is closed.")
+            if self._cancelled():
+                for job in jobs:
+                    self._drop(job)
+                return
+            for job in jobs:
+                heapq.heappush(self._waiting, (job["plan"]["priority"], next(self._sequence), job))
+                self._submitted += 1
+            while self._workers < min(self.max_concurrency, self._submitted):
+                self._start_worker()
+            self._changed.notify_all()
+
+    def add_done(self, job):
+        """
+        Passes a job that needs no summary (e.g. its video failed earlier) straight
+        to results(), so callers can read every job from one stream.
+        """
+        self._done.put(job)
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._work, name=f"summary-batch-{self._workers}", daemon=True)
+        if self.thread_hook:
+            self.thread_hook(thread)
+        self._workers += 1
+        thread.start()
+
+    def _drop(self, job):
+        summarizer = job.pop("summarizer", None)
+        if summarizer is not None:
+            summarizer.close()
+
+    def _drop_waiting(self):
+        while self._waiting:
+            self._drop(heapq.heappop(self._waiting)[2])
+
+    def _work(self):
+        while True:
+            with self._changed:
+                while not self._waiting and not self._closed and not self._cancelled():
+                    self._changed.wait(0.2)
+                if self._cancelled():
+                    self._drop_waiting()
+                if not self._waiting:
+                    self._workers -= 1
+                    if self._workers == 0 and self._closed:
+                        self._done.put(_BATCH_DONE)
+                    return
+                job = heapq.heappop(self._waiting)[2]
+            try:
+                self._run(job)
+            except Exception as e:
+                self.logger.warning(f"Summarizing {job.get('video_link')} failed: {e}")
+                self._drop(job)
+                job["summary"] = None
+            self._done.put(job)
+
+    def summarize(self, job):
+        """
+        Summarizes one planned job (the default `run`) and stores the result, the
+        dict summarize_transcript returns or None, as job['summary'].
+        """
+        plan = job["plan"]
+        summarizer = job.pop("summarizer", None)
+        if summarizer is not None:
+            job["summary"] = summarizer.finish(job["transcript_text"], job.get("video_link"), job.get("segments"),
+                                               on_abstract=job.get("on_abstract"))
+        else:
+            job["summary"] = summarize_transcript(
+                job["transcript_text"], job.get("video_link"), self.logger, api_keys=self.api_keys,
+                abstract_model=self.abstract_model, summary_model=self.summary_model, cache=self.cache,
+                segments=job.get("segments"), mode=plan["mode"], key_index=plan["key_index"],
+                abstract=job.get("abstract"), on_abstract=job.get("on_abstract"), tracer=self.tracer,
+                model_limits=self.model_limits
+            )
+        return job
+
+    def cancel(self):
+        """
+        Drops the waiting jobs; those already running finish.
+        """
+        with self._changed:
+            self._stopped = True
+            self._drop_waiting()
+            self._changed.notify_all()
+
+    def close(self, error=None):
+        """
+        No more jobs will be submitted. results() ends once the queued jobs are done;
+        with `error` the waiting jobs are dropped and results() raises it at the end.
+        """
+        with self._changed:
+            self._closed = True
+            if error is not None:
+                self._error = error
+                self._stopped = True
+                self._drop_waiting()
+            if self._workers == 0:
+                self._done.put(_BATCH_DONE)
+            self._changed.notify_all()
+
+    def results(self):
+        """
+        Yields each job as it completes, until the batch is closed and drained.
+        """
+        while True:
+            job = self._done.get()
+            if job is _BATCH_DONE:
+                break
+            yield job
+        if self._error is not None:
+            raise self._error
+
+def summarize_batch(jobs, logger, api_keys, abstract_model="models/gemini-2.5-flash-lite", summary_model="models/gemini-2.5-pro",
+                    cache=None, mode="auto", max_concurrency=None, tracer=None, model_limits=None):
+    """
+    Summarizes all of a run's transcripts as one planned batch (see SummaryBatch)
+    and yields each job, with its 'plan' and 'summary', as it completes.
+    """
+    batch = SummaryBatch(logger, api_keys, abstract_model=abstract_model, summary_model=summary_model, cache=cache, mode=mode,
+                         max_concurrency=max_concurrency, tracer=tracer, model_limits=model_limits)
+    batch.submit(*jobs)
+    batch.close()
+    yield from batch.results()
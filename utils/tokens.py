@@ -0,0 +1,14 @@
+import re
+
+# CJK ideographs, kana and hangul: roughly one token per character for Gemini
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate without calling the API: one token per CJK character,
+    one per ~4 characters of everything else.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -1,100 +1,317 @@
-import mlx_whisper
-import sys
-import re
-import ffmpeg
+import queue
 import threading
 import time
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+from utils.audio import load_audio, split_audio, SAMPLE_RATE
+from utils.transcription_backends import get_backend
 
-def get_audio_duration(file_path):
+# Decode parameters passed to the Whisper backend. They are part of the transcript cache key,
+# so changing them invalidates cached transcripts.
+DECODE_OPTIONS = {
+    "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+    "compression_ratio_threshold": 2.4,
+}
+
+# Long audio is split at silences and the chunks are transcribed in parallel
+CHUNKED_MIN_DURATION = 20 * 60  # seconds; shorter audio is one decode
+CHUNK_SECONDS = 10 * 60
+CHUNK_OVERLAP_SECONDS = 1.0
+DEFAULT_CHUNK_WORKERS = 2
+# Backends that only return segments once a decode is done (mlx-whisper) get shorter
+# chunks, so segments and progress arrive chunk by chunk instead of all at the end
+SEGMENTLESS_CHUNK_SECONDS = 2 * 60
+STITCH_TOLERANCE_SECONDS = 0.5  # timestamp jitter allowed between two decodes of the same words
+
+PROGRESS_LOG_INTERVAL = 2.0  # seconds between progress lines, to avoid flooding the log
+
+class SegmentEvent:
     """
-    Get the duration of the audio file in seconds using ffmpeg-python.
+    One final segment on the audio's timeline, as delivered to `on_segment`.
+    Times are in seconds from the start of the audio; `index` counts up from 0.
     """
-    try:
-        probe = ffmpeg.probe(file_path)
-        return float(probe['format']['duration'])
-    except Exception as e:
-        print(f"Error getting duration: {e}")
-        return None
+    __slots__ = ("index", "start", "end", "text", "avg_logprob")
+
+    def __init__(self, index, start, end, text, avg_logprob=None):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+        self.avg_logprob = avg_logprob
+
+    @classmethod
+    def from_segment(cls, segment):
+        return cls(segment["id"], segment["start"], segment["end"], segment.get("text", ""), segment.get("avg_logprob"))
 
-class ProgressCapturer:
-    def __init__(self, logger, total_duration):
+    def __repr__(self):
+        return f"SegmentEvent({self.index}, {self.start:.2f}-{self.end:.2f}, {self.text!r})"
+
+class TranscriptionProgress:
+    """
+    Tracks how many seconds of audio have been decoded, per chunk, from the
+    segment end times the backend reports. update() may be called from any
+    thread; report() logs at most every `interval` seconds and is called from
+    the thread that owns the logger.
+    """
+    def __init__(self, logger, total_duration, interval=PROGRESS_LOG_INTERVAL):
         self.logger = logger
         self.total_duration = total_duration
-        self._stdout = None
-        self._original_stdout = None
-        self._buffer = ""
-        # Regex to capture timestamp from mlx_whisper output: [00:00.000 --> 00:07.480]
-        self._pattern = re.compile(r"-->\s*(\d{2}):(\d{2})\.(\d{3})")
-        self._last_log_time = 0
-        self._log_interval = 2.0  # Log every 2 seconds to avoid flooding
-
-    def __enter__(self):
-        self._original_stdout = sys.stdout
-        sys.stdout = self
-        return self
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        sys.stdout = self._original_stdout
-
-    def write(self, data):
-        # Pass through to original stdout so it still shows in terminal
-        self._original_stdout.write(data)
-        
-        # Buffer checking for pattern
-        self._buffer += data
-        # Process lines
-        while '\n' in self._buffer:
-            line, self._buffer = self._buffer.split('\n', 1)
-            self._process_line(line)
-
-    def flush(self):
-        self._original_stdout.flush()
-
-    def _process_line(self, line):
-        # Expected format: [00:00.000 --> 00:07.480] ... text ...
-        match = self._pattern.search(line)
-        if match:
-            minutes, seconds, milliseconds = match.groups()
-            current_seconds = float(minutes) * 60 + float(seconds) + float(milliseconds) / 1000
-            
-            # Log progress if interval met
-            current_time = time.time()
-            if current_time - self._last_log_time >= self._log_interval:
-                if self.total_duration:
-                    progress_percent = min(100, (current_seconds / self.total_duration) * 100)
-                    self.logger.info(f"Transcribing: {current_seconds:.1f} / {self.total_duration:.1f} seconds ({progress_percent:.1f}%)")
-                else:
-                    self.logger.info(f"Transcribing: {current_seconds:.1f} seconds processed")
-                
-                self._last_log_time = current_time
-
-def transcribe_audio(audio_path, model_name, logger):
-    """
-    Transcribes audio using mlx-whisper.
-    Returns the transcript text.
+        self.interval = interval
+        self._decoded = {}
+        self._lock = threading.Lock()
+        self._last_log_time = time.monotonic()
+
+    def update(self, key, seconds):
+        with self._lock:
+            self._decoded[key] = max(self._decoded.get(key, 0.0), seconds)
+
+    def decoded_seconds(self):
+        with self._lock:
+            return sum(self._decoded.values())
+
+    def report(self):
+        now = time.monotonic()
+        if now - self._last_log_time < self.interval:
+            return
+        self._last_log_time = now
+        current_seconds = self.decoded_seconds()
+        if self.total_duration:
+            progress_percent = min(100, (current_seconds / self.total_duration) * 100)
+            self.logger.info(f"Transcribing: {current_seconds:.1f} / {self.total_duration:.1f} seconds ({progress_percent:.1f}%)")
+        else:
+            self.logger.info(f"Transcribing: {current_seconds:.1f} seconds processed")
+
+def _overlap_length(tail, head):
     """
-    logger.info(f"Transcribing {audio_path} using {model_name}...")
-    
-    duration = get_audio_duration(audio_path)
-    if duration:
-        logger.info(f"Audio duration: {duration:.2f} seconds")
-    
+    Length of the longest start of head that tail ends with, cut at a word boundary
+    (or anywhere between CJK characters, which are not separated by spaces).
+    """
+    for length in range(min(len(tail), len(head)), 1, -1):
+        if not tail.endswith(head[:length]):
+            continue
+        if length == len(head) or head[length].isspace() or not head[length - 1].isascii():
+            return length
+    return 0
+
+def _trim_overlap(previous, segment, offset):
+    """
+    Returns the text of a segment that starts inside the previous kept one, without
+    the words both of them hold. With word timestamps, words said before the previous
+    segment ended are dropped; otherwise the text the previous segment ends with is.
+    """
+    words = segment.get("words")
+    if words:
+        cutoff = previous["end"] - STITCH_TOLERANCE_SECONDS
+        kept = [word for word in words if word["start"] + offset >= cutoff]
+        segment["words"] = kept
+        return "".join(word.get("word", "") for word in kept)
+    text = segment.get("text", "")
+    head = text.lstrip()
+    tail = previous["text"].strip()
+    if head.strip() and head.strip() in tail:
+        return ""
+    length = _overlap_length(tail, head)
+    return head[length:] if length else text
+
+class SegmentStitcher:
+    """
+    Merges per-chunk Whisper results back into one timeline, one chunk at a time
+    and in chunk order.
+    Segment times are shifted by the chunk offset, and segments lying entirely in
+    a neighbour's part of the overlap are dropped. Words decoded by both chunks
+    around a cut show up as a segment overlapping the previous kept one in time
+    (or repeating its text verbatim); only the repeated words are dropped from it,
+    so speech that just one of the chunks decoded in full is kept.
+    """
+    def __init__(self):
+        self.segments = []
+
+    def add(self, chunk, result):
+        """
+        Returns the segments of this chunk that were kept, already on the global timeline.
+        """
+        kept = []
+        for segment in result.get("segments", []):
+            start = segment["start"] + chunk["offset"]
+            end = segment["end"] + chunk["offset"]
+            if end <= chunk["start"] or start >= chunk["end"]:
+                continue
+            text = segment.get("text", "")
+            stitched = dict(segment)
+            if self.segments:
+                previous = self.segments[-1]
+                if text.strip() and text.strip() == previous["text"].strip():
+                    continue
+                if start < previous["end"] - STITCH_TOLERANCE_SECONDS:
+                    text = _trim_overlap(previous, stitched, chunk["offset"])
+                    if not text.strip():
+                        continue
+                    stitched["text"] = text
+                    start = min(max(start, previous["end"]), end)
+            stitched["start"] = start
+            stitched["end"] = end
+            stitched["id"] = len(self.segments)
+            self.segments.append(stitched)
+            kept.append(stitched)
+        return kept
+
+    def result(self):
+        return {"text": "".join(segment["text"] for segment in self.segments), "segments": self.segments}
+
+def stitch_segments(chunks, chunk_results):
+    """
+    Stitches all chunk results at once, see SegmentStitcher.
+    """
+    stitcher = SegmentStitcher()
+    for chunk, result in zip(chunks, chunk_results):
+        stitcher.add(chunk, result)
+    return stitcher.result()
+
+def _transcribe_chunked(audio, backend, logger, duration, chunk_workers, on_segment=None, chunk_seconds=CHUNK_SECONDS):
+    chunks = split_audio(audio, SAMPLE_RATE, chunk_seconds=chunk_seconds, overlap_seconds=CHUNK_OVERLAP_SECONDS)
+    logger.info(f"Split audio into {len(chunks)} chunks at silences, transcribing with {chunk_workers} workers...")
+
+    progress = TranscriptionProgress(logger, duration)
+
+    def transcribe_chunk(index):
+        chunk = chunks[index]
+        # Progress counts only the part of the timeline this chunk is responsible for
+        lead = chunk["start"] - chunk["offset"]
+        length = chunk["end"] - chunk["start"]
+        def on_chunk_segment(segment):
+            progress.update(index, min(length, max(0.0, segment["end"] - lead)))
+        result = backend.transcribe(chunk["audio"], DECODE_OPTIONS, on_segment=on_chunk_segment)
+        progress.update(index, length)
+        return result
+
+    stitcher = SegmentStitcher()
+    with ThreadPoolExecutor(max_workers=chunk_workers) as executor:
+        futures = [executor.submit(transcribe_chunk, index) for index in range(len(chunks))]
+        # Chunks are released in order, so `on_segment` sees one monotonic timeline.
+        # Logging stays on this thread; the workers only record progress.
+        for index, (chunk, future) in enumerate(zip(chunks, futures)):
+            while not wait([future], timeout=PROGRESS_LOG_INTERVAL).done:
+                progress.report()
+            kept = stitcher.add(chunk, future.result())
+            logger.info(f"Transcribed chunk {index + 1}/{len(chunks)} ({chunk['start']:.1f}-{chunk['end']:.1f}s of {duration:.1f}s)")
+            if on_segment:
+                for segment in kept:
+                    on_segment(SegmentEvent.from_segment(segment))
+    return stitcher.result()
+
+def _transcribe_single(audio, backend, logger, duration, on_segment=None):
+    progress = TranscriptionProgress(logger, duration)
+    count = {"segments": 0}
+
+    def on_backend_segment(segment):
+        progress.update(0, segment["end"])
+        progress.report()
+        if on_segment:
+            on_segment(SegmentEvent(count["segments"], segment["start"], segment["end"], segment.get("text", ""), segment.get("avg_logprob")))
+        count["segments"] += 1
+
+    if backend.reports_segments:
+        return backend.transcribe(audio, DECODE_OPTIONS, on_segment=on_backend_segment)
+
+    # Nothing is heard from the backend until the whole decode returns, so the
+    # decode runs on a helper thread while this one logs that it is still going
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(backend.transcribe, audio, DECODE_OPTIONS)
+        while not wait([future], timeout=PROGRESS_LOG_INTERVAL).done:
+            logger.info(f"Transcribing: still decoding {duration:.1f} seconds of audio ({time.monotonic() - started:.0f}s elapsed)")
+        result = future.result()
+    for segment in result.get("segments", []):
+        on_backend_segment(segment)
+    return result
+
+def transcribe(audio_path, model_name, logger, chunk_workers=DEFAULT_CHUNK_WORKERS, backend=None, on_segment=None):
+    """
+    Transcribes audio with the selected Whisper backend (see transcription_backends;
+    `backend` is a backend name, an instance, or None for the platform default).
+    `audio_path` may also be a 16 kHz mono float32 array (see audio.load_audio); a
+    file is decoded to one first, so the backend always gets samples and the
+    duration comes from the sample count.
+    Audio longer than CHUNKED_MIN_DURATION is split at silences and the chunks are
+    transcribed by `chunk_workers` threads, then stitched back together. A backend
+    without a segment hook (see TranscriptionBackend.reports_segments) gets chunks of
+    SEGMENTLESS_CHUNK_SECONDS from that length on, so its segments and progress still
+    arrive while the rest of the audio is decoded.
+    `on_segment`, if given, is called on the calling thread with a SegmentEvent for
+    every final segment, in timeline order, while transcription is still running.
+    Returns a dict with the transcript 'text' and the timed 'segments',
+    or None if transcription failed.
+    """
+    is_array = isinstance(audio_path, np.ndarray)
+    logger.info(f"Transcribing {'audio buffer' if is_array else audio_path} using {model_name}...")
+
     try:
-        # mlx_whisper automatically handles model downloading if not present
-        # We capture stdout to parse progress
-        with ProgressCapturer(logger, duration):
-            result = mlx_whisper.transcribe(
-                audio_path, 
-                path_or_hf_repo=model_name, 
-                verbose=True, 
-                temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0), 
-                compression_ratio_threshold=2.4
-                )
+        audio = audio_path if is_array else load_audio(audio_path)
+        duration = len(audio) / SAMPLE_RATE
+        logger.info(f"Audio duration: {duration:.2f} seconds")
+
+        if backend is None or isinstance(backend, str):
+            backend = get_backend(backend, model_name)
+        # The model is loaded once per process and reused for every later video
+        backend.load()
+
+        if backend.reports_segments:
+            chunked, chunk_seconds = duration > CHUNKED_MIN_DURATION, CHUNK_SECONDS
+        else:
+            chunked, chunk_seconds = duration > SEGMENTLESS_CHUNK_SECONDS, SEGMENTLESS_CHUNK_SECONDS
+        if duration and chunked:
+            result = _transcribe_chunked(audio, backend, logger, duration, chunk_workers, on_segment, chunk_seconds)
+        else:
+            result = _transcribe_single(audio, backend, logger, duration, on_segment)
             
         text = result.get("text", "")
         logger.info(f"Transcription complete (length: {len(text)} chars)")
-        return text
+        return {"text": text, "segments": result.get("segments", [])}
     except Exception as e:
         logger.critical(f"Error during transcription: {e}")
-        return ""
\ No newline at end of file
+        return None
+
+class TranscriptionStream:
+    """
+    Iterator form of transcribe(): runs the transcription on a background thread
+    and yields SegmentEvents as they are finalized, in timeline order. Once the
+    iteration ends, `result` holds what transcribe() returned.
+    """
+    def __init__(self, audio_path, model_name, logger, chunk_workers=DEFAULT_CHUNK_WORKERS, backend=None):
+        self.result = None
+        self._events = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, args=(audio_path, model_name, logger, chunk_workers, backend),
+            name="transcription-stream", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, audio_path, model_name, logger, chunk_workers, backend):
+        try:
+            self.result = transcribe(audio_path, model_name, logger, chunk_workers=chunk_workers,
+                                     backend=backend, on_segment=self._events.put)
+        finally:
+            self._events.put(None)
+
+    def __iter__(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            yield event
+        self._thread.join()
+
+def stream_transcription(audio_path, model_name, logger, chunk_workers=DEFAULT_CHUNK_WORKERS, backend=None):
+    """
+    Returns a TranscriptionStream of the finalized segments of `audio_path`.
+    """
+    return TranscriptionStream(audio_path, model_name, logger, chunk_workers=chunk_workers, backend=backend)
+
+def transcribe_audio(audio_path, model_name, logger, backend=None, on_segment=None):
+    """
+    Transcribes audio using the selected Whisper backend (mlx-whisper on Apple Silicon by default).
+    `on_segment` receives each finalized SegmentEvent while transcription runs.
+    Returns the transcript text.
+    """
+    result = transcribe(audio_path, model_name, logger, backend=backend, on_segment=on_segment)
+    return result["text"] if result else ""
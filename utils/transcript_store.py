@@ -0,0 +1,47 @@
+import os
+from utils.disk_cache import DiskCache, make_key
+
+TRANSCRIPT_CACHE_DIR = os.path.join("cache", "transcripts")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+def compact_segments(segments):
+    """
+    The JSON-safe fields of Whisper segments that later stages use.
+    """
+    return [
+        {
+            "start": segment.get("start"),
+            "end": segment.get("end"),
+            "text": segment.get("text", ""),
+            "avg_logprob": segment.get("avg_logprob"),
+        }
+        for segment in segments
+    ]
+
+class TranscriptStore:
+    """
+    Persistent transcripts keyed by (video_id, model_name, decode options),
+    so a re-run can skip both the download and Whisper.
+    """
+    def __init__(self, root=TRANSCRIPT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache = DiskCache(root, max_bytes)
+
+    def get(self, video_id, model_name, decode_options):
+        """
+        Returns {'text': str, 'segments': [...]} or None.
+        """
+        if not video_id:
+            return None
+        return self.cache.get(make_key("transcript", video_id, model_name, decode_options))
+
+    def put(self, video_id, model_name, decode_options, result):
+        if not video_id:
+            return
+        segments = compact_segments(result.get("segments", []))
+        self.cache.put(
+            make_key("transcript", video_id, model_name, decode_options),
+            {"video_id": video_id, "model_name": model_name, "text": result.get("text", ""), "segments": segments},
+        )
+
+    def stats(self):
+        return self.cache.stats()
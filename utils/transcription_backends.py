@@ -0,0 +1,215 @@
+import os
+import sys
+import platform
+import threading
+import time
+import numpy as np
+from utils.audio import load_audio, SAMPLE_RATE
+
+class TranscriptionBackend:
+    """
+    Interface for a Whisper implementation. A backend instance owns one model,
+    loaded once by load() and kept warm for every later transcribe() call.
+    transcribe() takes a file path or a 16 kHz mono float32 array and returns
+    {'text': str, 'segments': [{'id', 'start', 'end', 'text', 'avg_logprob', ...}], 'language': str}.
+    If `on_segment` is given it is called with each segment dict (times relative
+    to `audio`) as soon as the backend has it, on the calling thread.
+    Backends that only have the segments once the whole decode returns set
+    `reports_segments` to False; transcriber.transcribe then decodes their audio in
+    short chunks, and logs a heartbeat while it waits on one.
+    """
+    name = "base"
+    reports_segments = True
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+        return self
+
+    def _load(self):
+        raise NotImplementedError
+
+    def transcribe(self, audio, decode_options, on_segment=None):
+        raise NotImplementedError
+
+class MLXBackend(TranscriptionBackend):
+    """
+    mlx-whisper on Apple Silicon. mlx_whisper is imported on first use only, so
+    this module can be imported on machines without it.
+    mlx_whisper has no per-segment hook (only verbose printing to stdout), so
+    segments are reported once the decode returns. transcribe() therefore hands it
+    audio in short chunks, so segments and progress arrive chunk by chunk.
+    """
+    name = "mlx"
+    reports_segments = False
+
+    def _load(self):
+        import mlx.core as mx
+        import mlx_whisper
+        from mlx_whisper.transcribe import ModelHolder
+        self._mlx_whisper = mlx_whisper
+        # mlx_whisper keeps the last loaded model in ModelHolder; loading it here
+        # (with the dtype transcribe() will ask for) makes every later call reuse it
+        ModelHolder.get_model(self.model_name, mx.float16)
+
+    def transcribe(self, audio, decode_options, on_segment=None):
+        self.load()
+        result = self._mlx_whisper.transcribe(
+            audio,
+            path_or_hf_repo=self.model_name,
+            verbose=None,
+            **decode_options
+            )
+        if on_segment:
+            for segment in result.get("segments", []):
+                on_segment(segment)
+        return result
+
+def ctranslate2_model_name(model_name):
+    """
+    Maps the app's mlx-community repo names to faster-whisper model sizes,
+    e.g. "mlx-community/whisper-large-v3-turbo" -> "large-v3-turbo".
+    Anything else (a local path or another HF repo) is passed through.
+    """
+    if not model_name.startswith("mlx-community/whisper-"):
+        return model_name
+    size = model_name[len("mlx-community/whisper-"):]
+    for suffix in ("-mlx", "-mlp"):
+        if size.endswith(suffix):
+            size = size[:-len(suffix)]
+    return size
+
+class CTranslate2Backend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) on CPU with int8 weights, for Linux workers.
+    """
+    name = "ctranslate2"
+
+    def __init__(self, model_name, compute_type="int8", cpu_threads=0, num_workers=4):
+        super().__init__(model_name)
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        # Number of transcribe() calls the model serves in parallel (chunk workers)
+        self.num_workers = num_workers
+
+    def _load(self):
+        from faster_whisper import WhisperModel
+        self._model = WhisperModel(
+            ctranslate2_model_name(self.model_name),
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+            num_workers=self.num_workers,
+        )
+
+    def transcribe(self, audio, decode_options, on_segment=None):
+        self.load()
+        options = dict(decode_options)
+        if "temperature" in options:
+            options["temperature"] = list(options["temperature"])
+        segment_iter, info = self._model.transcribe(audio, **options)
+
+        # faster-whisper decodes lazily while the generator is consumed
+        segments = []
+        for segment in segment_iter:
+            segments.append({
+                "id": len(segments),
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+                "temperature": segment.temperature,
+            })
+            if on_segment:
+                on_segment(segments[-1])
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": info.language}
+
+class FakeBackend(TranscriptionBackend):
+    """
+    Deterministic stand-in for tests and benchmarks: one segment every
+    `segment_seconds` of audio, text derived from the segment position.
+    `seconds_per_audio_second` simulates decode time (a real-time factor).
+    """
+    name = "fake"
+
+    def __init__(self, model_name, segment_seconds=5.0, seconds_per_audio_second=0.0):
+        super().__init__(model_name)
+        self.segment_seconds = segment_seconds
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.calls = 0
+
+    def _load(self):
+        pass
+
+    def transcribe(self, audio, decode_options, on_segment=None):
+        self.load()
+        if isinstance(audio, str):
+            audio = load_audio(audio)
+        duration = len(audio) / SAMPLE_RATE
+        self.calls += 1
+        if self.seconds_per_audio_second:
+            time.sleep(duration * self.seconds_per_audio_second)
+
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + self.segment_seconds)
+            # Quiet stretches produce no text, like Whisper on silence
+            level = float(np.sqrt(np.mean(np.square(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])))) if end > start else 0.0
+            if level > 1e-3:
+                segments.append({
+                    "id": len(segments),
+                    "start": start,
+                    "end": end,
+                    "text": f" segment {int(start * 1000)}",
+                    "avg_logprob": -0.1,
+                })
+                if on_segment:
+                    on_segment(segments[-1])
+            start = end
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": "zh"}
+
+BACKENDS = {
+    "mlx": MLXBackend,
+    "ctranslate2": CTranslate2Backend,
+    "fake": FakeBackend,
+}
+
+def default_backend_name():
+    """
+    TRANSCRIPTION_BACKEND from the environment, else MLX on Apple Silicon and CTranslate2 elsewhere.
+    """
+    name = os.getenv("TRANSCRIPTION_BACKEND")
+    if name:
+        return name
+    if sys.platform == "darwin" and platform.machine() == "arm64":
+        return "mlx"
+    return "ctranslate2"
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name, model_name, **kwargs):
+    """
+    Returns the process-wide backend instance for (name, model_name), so the
+    model is loaded once and stays warm across videos and runs.
+    name "auto" (or None) picks default_backend_name().
+    """
+    if not name or name == "auto":
+        name = default_backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {name}")
+    key = (name, model_name)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = BACKENDS[name](model_name, **kwargs)
+        return _backends[key]